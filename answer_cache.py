@@ -0,0 +1,84 @@
+import json
+import logging
+import uuid
+from datetime import datetime
+from typing import Dict, Optional
+from config import Config
+from embedding_scheduler import collection_suffix
+from concurrency import offload
+
+class AnswerCache:
+    """Semantic cache of previous answers, one vector collection per user.
+
+    Questions are embedded and compared by cosine similarity; an answer is
+    reused only if it was produced against the current version of the user's
+    document collection. Any change to the collection drops the cache.
+    """
+
+    def __init__(self, vector_store):
+        self.vector_store = vector_store
+        self.threshold = Config.ANSWER_CACHE_SIMILARITY_THRESHOLD
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def collection_name(user_id: int) -> str:
+        return f"user_{user_id}_answers{collection_suffix()}"
+
+    @classmethod
+    def invalidate(cls, backend, user_id: int):
+        """Drop all cached answers for a user"""
+        try:
+            offload(backend.drop, cls.collection_name(user_id))
+        except Exception:
+            pass  # Nothing cached yet
+
+    def lookup(self, user_id: int, question: str, collection_version: int) -> Optional[Dict]:
+        """Return a cached response for a similar question, if there is one"""
+        try:
+            hits = offload(
+                self.vector_store.backend.query,
+                self.collection_name(user_id),
+                self.vector_store.embeddings.embed_query(question),
+                1,
+                where={"collection_version": collection_version}
+            )
+            if not hits:
+                return None
+
+            similarity = 1 - hits[0]["distance"]
+            if similarity < self.threshold:
+                return None
+
+            metadata = hits[0]["metadata"]
+            self.logger.info(f"Answer cache hit for user {user_id} (similarity {similarity:.3f})")
+            return {
+                "answer": metadata["answer"],
+                "metadata": {
+                    "sources": json.loads(metadata["sources"]),
+                    "cached": True
+                }
+            }
+
+        except Exception as e:
+            self.logger.error(f"Answer cache lookup failed: {str(e)}")
+            return None
+
+    def store(self, user_id: int, question: str, response: Dict, collection_version: int):
+        """Cache a successful response"""
+        try:
+            offload(
+                self.vector_store.backend.add,
+                self.collection_name(user_id),
+                ids=[str(uuid.uuid4())],
+                embeddings=[self.vector_store.embeddings.embed_query(question)],
+                documents=[question],
+                metadatas=[{
+                    "answer": response["answer"],
+                    "sources": json.dumps(response["metadata"].get("sources", [])),
+                    "collection_version": collection_version,
+                    "created_at": datetime.utcnow().isoformat()
+                }],
+                space="cosine"
+            )
+        except Exception as e:
+            self.logger.error(f"Answer cache store failed: {str(e)}")
@@ -1,8 +1,10 @@
 # Apply eventlet monkey patching before any other imports
+# (background workers that serve no sockets opt out to use real threads and processes)
+import os
 import eventlet
-eventlet.monkey_patch()
+if not os.environ.get("DISABLE_EVENTLET_MONKEY_PATCH"):
+    eventlet.monkey_patch()
 
-import os
 import json
 import logging
 from flask import Flask
@@ -47,13 +49,16 @@ def create_app():
     # Initialize extensions with app
     db.init_app(app)
     # Use eventlet for WebSocket support with increased timeouts
+    # (a message queue lets several workers share rooms and broadcasts)
     socketio.init_app(
         app,
         cors_allowed_origins="*",
         async_mode='eventlet',
         manage_session=False,
         ping_timeout=60,
-        ping_interval=25
+        ping_interval=25,
+        message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'],
+        channel=app.config['SOCKETIO_CHANNEL']
     )
     logger.info("Socket.IO initialized with eventlet mode")
     
@@ -65,10 +70,12 @@ def create_app():
     
     with app.app_context():
         # Import models to ensure they are registered with SQLAlchemy
-        from models import User, Role, Document, ChatHistory, DocumentChunk
+        from models import User, Role, Document, ChatHistory, DocumentChunk, IngestionJob, CollectionState, LexicalPosting
         
-        # Create database tables if they don't exist
-        db.create_all()
+        # Create or upgrade database tables (see migrations.py)
+        if app.config['AUTO_MIGRATE']:
+            from migrations import SchemaMigrator
+            SchemaMigrator(db.engine).upgrade()
         
         # Check if roles exist, if not create default roles
         from models import Role
@@ -87,6 +94,10 @@ def create_app():
         app.register_blueprint(auth_bp)
         app.register_blueprint(chat_bp)
         
+        # Register maintenance commands
+        from cli import register_commands
+        register_commands(app)
+        
         # Register routes
         @app.route('/')
         def index():
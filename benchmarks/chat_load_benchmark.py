@@ -0,0 +1,166 @@
+# Load test of the eventlet worker: concurrent chat sessions while a document
+# is ingested in the same process. Each session embeds its question through
+# CachedEmbeddings (SQLite embedding cache, stub embedding API with a green
+# sleep as latency), searches a FAISS collection and waits for a stub LLM.
+# Meanwhile the document is chunked, embedded and added to the index, and a
+# heartbeat green thread measures how long the hub goes without running it.
+# With --inline every offloaded call runs on the hub, as before offloading.
+# Usage: python benchmarks/chat_load_benchmark.py [--sessions 50] [--turns 20] [--inline]
+import os
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import logging
+import tempfile
+import numpy as np
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402,F401  Applies eventlet monkey patching
+import eventlet  # noqa: E402
+from langchain_core.embeddings import Embeddings  # noqa: E402
+import concurrency  # noqa: E402
+from concurrency import offload, offload_iter  # noqa: E402
+from chunking import TokenChunker  # noqa: E402
+from embedding_cache import CachedEmbeddings, EmbeddingCache  # noqa: E402
+from vector_store import FaissBackend  # noqa: E402
+
+COLLECTION = "user_1_docs"
+
+
+class StubEmbeddings(Embeddings):
+    """Deterministic vectors per text after a green sleep, like an embedding API call"""
+
+    def __init__(self, dimension: int, latency: float):
+        self.dimension = dimension
+        self.latency = latency
+
+    def _vector(self, text: str):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimension).astype("float32")
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        eventlet.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        eventlet.sleep(self.latency)
+        return self._vector(text)
+
+
+def document_text(paragraphs: int, seed: int = 7) -> str:
+    rng = np.random.default_rng(seed)
+    words = "contract payment invoice delivery term party clause amount schedule notice".split()
+    return "\n\n".join(
+        " ".join(rng.choice(words, size=int(rng.integers(40, 120)))) + "." for _ in range(paragraphs)
+    )
+
+
+def ingest(backend, embeddings, text: str, batch: int, stats: dict):
+    started = time.perf_counter()
+    chunk_texts, chunk_id = [], 0
+    backend.defer_writes(COLLECTION)
+
+    def add(texts):
+        nonlocal chunk_id
+        vectors = embeddings.embed_documents(texts)
+        ids = range(chunk_id, chunk_id + len(texts))
+        offload(backend.add, COLLECTION, ids=[f"chunk_{i}" for i in ids], embeddings=vectors,
+                metadatas=[{"chunk_id": i, "document_id": 1} for i in ids], documents=texts)
+        chunk_id += len(texts)
+
+    # Chunked page by page in real threads, as DocumentProcessor does
+    pages = (text[start:start + 4000] for start in range(0, len(text), 4000))
+    for chunk_text in offload_iter(TokenChunker().iter_chunks(pages)):
+        chunk_texts.append(chunk_text)
+        if len(chunk_texts) == batch:
+            add(chunk_texts)
+            chunk_texts = []
+    if chunk_texts:
+        add(chunk_texts)
+    offload(backend.flush, COLLECTION)
+    stats["chunks"] = chunk_id
+    stats["seconds"] = time.perf_counter() - started
+
+
+def chat_session(backend, embeddings, questions, turns: int, llm_latency: float, rng, latencies: list):
+    for _ in range(turns):
+        started = time.perf_counter()
+        vector = embeddings.embed_query(questions[int(rng.integers(len(questions)))])
+        offload(backend.query, COLLECTION, vector, 4)
+        eventlet.sleep(llm_latency)  # Answer generation on a green socket
+        latencies.append(time.perf_counter() - started - llm_latency)
+
+
+def heartbeat(interval: float, lags: list, running: list):
+    while running:
+        started = time.perf_counter()
+        eventlet.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test chat sessions against the cached embedding path during an ingest")
+    parser.add_argument("--sessions", type=int, default=50, help="Concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=20, help="Questions per session")
+    parser.add_argument("--questions", type=int, default=200, help="Distinct questions; repeats hit the embedding cache")
+    parser.add_argument("--paragraphs", type=int, default=20000, help="Paragraphs of the ingested document")
+    parser.add_argument("--batch", type=int, default=64, help="Chunks embedded and added at a time")
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--api-latency", type=float, default=0.05, help="Seconds per stub embedding call")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds per stub answer")
+    parser.add_argument("--inline", action="store_true", help="Run offloaded calls on the hub instead")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.inline:
+        concurrency.is_green = lambda: False
+
+    directory = tempfile.mkdtemp(prefix="chat_load_")
+    try:
+        backend = FaissBackend(os.path.join(directory, "faiss"), factory="HNSW32")
+        cache = EmbeddingCache(path=os.path.join(directory, "embedding_cache.sqlite"))
+        embeddings = CachedEmbeddings(StubEmbeddings(args.dimension, args.api_latency), "stub", cache)
+        questions = [f"What does clause {i} say about payment terms?" for i in range(args.questions)]
+        # A first document, so sessions have an index to search while the next one is ingested
+        ingest(backend, embeddings, document_text(200, seed=1), args.batch, {})
+        text = document_text(args.paragraphs)
+
+        latencies, lags, running, ingest_stats = [], [], [True], {}
+        pool = eventlet.GreenPool(args.sessions + 2)
+        beat = pool.spawn(heartbeat, 0.01, lags, running)
+        started = time.perf_counter()
+        ingestion = pool.spawn(ingest, backend, embeddings, text, args.batch, ingest_stats)
+        sessions = [
+            pool.spawn(chat_session, backend, embeddings, questions, args.turns, args.llm_latency,
+                       np.random.default_rng(seed), latencies)
+            for seed in range(args.sessions)
+        ]
+        for session in sessions:
+            session.wait()
+        chat_seconds = time.perf_counter() - started
+        ingestion.wait()
+        running.clear()
+        beat.wait()
+
+        print(f"{'inline' if args.inline else 'offloaded'}: {args.sessions} sessions x {args.turns} turns, "
+              f"{ingest_stats['chunks']} chunks ingested in {ingest_stats['seconds']:.1f} s")
+        print(f"  chat turns: {len(latencies) / chat_seconds:7.1f} per s  "
+              f"retrieval p50 {percentile(latencies, 0.5) * 1000:7.1f} ms  "
+              f"p95 {percentile(latencies, 0.95) * 1000:7.1f} ms  max {max(latencies) * 1000:7.1f} ms")
+        print(f"  hub stalls: p99 {percentile(lags, 0.99) * 1000:7.1f} ms  max {max(lags) * 1000:7.1f} ms")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# Chunking micro-benchmark: throughput and chunk statistics of each strategy
+# on a synthetic document, streamed page by page like a PDF.
+# Usage: python benchmarks/chunking_benchmark.py [--pages N]
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import CHUNKERS, count_tokens  # noqa: E402
+
+WORDS = ("contract payment invoice delivery term party clause amount schedule notice "
+         "agreement period service customer supplier obligation liability").split()
+
+
+def synthetic_pages(pages: int, seed: int = 7):
+    """Pages of headings, prose paragraphs and table-like lines without punctuation"""
+    rng = random.Random(seed)
+    for page in range(pages):
+        parts = [f"{page + 1}. SECTION {page + 1}"]
+        for _ in range(rng.randint(3, 6)):
+            sentences = [
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 30))).capitalize() + "."
+                for _ in range(rng.randint(2, 8))
+            ]
+            parts.append(" ".join(sentences))
+        parts.append("\n".join(
+            " ".join(str(rng.randint(1, 99999)) for _ in range(8)) for _ in range(rng.randint(0, 20))
+        ))
+        yield "\n\n".join(parts)
+
+
+def run(name: str, pages: list, repeat: int):
+    chunker = CHUNKERS[name]()
+    best = float("inf")
+    chunks = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunks = list(chunker.iter_chunks(pages))
+        best = min(best, time.perf_counter() - started)
+
+    sizes = sorted(count_tokens(chunk) for chunk in chunks)
+    characters = sum(len(page) for page in pages)
+    print(
+        f"{name:>8}: {best * 1000:8.1f} ms  {characters / best / 1e6:6.2f} MB/s  "
+        f"{len(chunks):5d} chunks  tokens p50={sizes[len(sizes) // 2]} max={sizes[-1]}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunking strategies")
+    parser.add_argument("--pages", type=int, default=500, help="Synthetic pages to chunk")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per strategy; the best is reported")
+    args = parser.parse_args()
+
+    pages = list(synthetic_pages(args.pages))
+    print(f"{args.pages} pages, {sum(len(page) for page in pages) / 1e6:.1f} MB")
+    for name in CHUNKERS:
+        run(name, pages, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# Embedding scheduler benchmark against a local stub of the OpenAI embeddings
+# endpoint that enforces a token budget per window and answers with the
+# x-ratelimit-* headers and 429s the real API sends. No network or API key.
+# Compares one scheduler for all documents (the rate-limit state persists)
+# with a new scheduler per document (every document starts from scratch).
+# Usage: python benchmarks/embedding_benchmark.py [--documents N] [--chunks N]
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import OpenAI  # noqa: E402
+from chunking import count_tokens  # noqa: E402
+from embedding_scheduler import EmbeddingScheduler  # noqa: E402
+
+
+class TokenBudget:
+    """Tokens allowed per window, shared by all requests like an account limit"""
+
+    def __init__(self, tokens: int, window: float):
+        self.tokens = tokens
+        self.window = window
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.used = 0
+        self.throttled = 0
+
+    def take(self, tokens: int):
+        """Remaining tokens and seconds until reset, or None if the request is throttled"""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.started >= self.window:
+                self.started, self.used = now, 0
+            reset = self.window - (now - self.started)
+            if self.used + tokens > self.tokens:
+                self.throttled += 1
+                return None, reset
+            self.used += tokens
+            return self.tokens - self.used, reset
+
+
+def stub_handler(budget: TokenBudget, dimensions: int, latency: float):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            inputs = body["input"]
+            remaining, reset = budget.take(sum(count_tokens(text) for text in inputs))
+            time.sleep(latency)
+            if remaining is None:
+                payload = {"error": {"message": "Rate limit reached", "type": "tokens", "code": "rate_limit_exceeded"}}
+                self._reply(429, payload, {"retry-after-ms": str(int(reset * 1000))})
+                return
+            payload = {
+                "object": "list",
+                "model": body["model"],
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": [random.random() for _ in range(dimensions)]}
+                    for i in range(len(inputs))
+                ],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0}
+            }
+            self._reply(200, payload, {
+                "x-ratelimit-remaining-tokens": str(remaining),
+                "x-ratelimit-reset-tokens": f"{int(reset * 1000)}ms"
+            })
+
+        def _reply(self, status, payload, headers):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def documents(count: int, chunks: int, seed: int = 7):
+    rng = random.Random(seed)
+    words = "contract payment invoice delivery term party clause amount schedule notice".split()
+    return [
+        [" ".join(rng.choice(words) for _ in range(rng.randint(150, 400))) for _ in range(chunks)]
+        for _ in range(count)
+    ]
+
+
+def run(name: str, docs, make_scheduler, budget: TokenBudget):
+    throttled_before = budget.throttled
+    scheduler = None
+    started = time.perf_counter()
+    for texts in docs:
+        scheduler = make_scheduler(scheduler)
+        scheduler.embed_documents(texts)
+    elapsed = time.perf_counter() - started
+    chunks = sum(len(texts) for texts in docs)
+    print(
+        f"{name:>22}: {elapsed:7.2f} s  {chunks / elapsed:8.1f} chunks/s  "
+        f"{budget.throttled - throttled_before:4d} throttled requests"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the embedding scheduler against a rate-limited stub server")
+    parser.add_argument("--documents", type=int, default=20, help="Documents embedded one after another")
+    parser.add_argument("--chunks", type=int, default=64, help="Chunks per document")
+    parser.add_argument("--budget", type=int, default=60000, help="Tokens the stub allows per window")
+    parser.add_argument("--window", type=float, default=2.0, help="Length of the stub's rate-limit window in seconds")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the stub takes per request")
+    parser.add_argument("--concurrency", type=int, default=8, help="Scheduler concurrency")
+    args = parser.parse_args()
+
+    budget = TokenBudget(args.budget, args.window)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), stub_handler(budget, 64, args.latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = OpenAI(api_key="stub", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", max_retries=0)
+
+    def scheduler():
+        return EmbeddingScheduler(model="text-embedding-3-small", client=client, batch_tokens=8000,
+                                  concurrency=args.concurrency, max_retries=20, dimensions=64)
+
+    docs = documents(args.documents, args.chunks)
+    print(f"{args.documents} documents x {args.chunks} chunks, budget {args.budget} tokens per {args.window}s")
+    run("scheduler per document", docs, lambda previous: scheduler(), budget)
+    time.sleep(args.window)
+    run("shared scheduler", docs, lambda previous: previous or scheduler(), budget)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
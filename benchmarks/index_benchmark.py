@@ -0,0 +1,185 @@
+# Hot-path query benchmark for the composite indexes of migration 2.
+# Seeds a scratch database with users, documents, chunks, conversations and
+# messages, then times each hot query and prints its plan, with the indexes
+# and (with --compare) without them.
+# Only point it at a scratch database: it adds rows and drops indexes.
+# Usage: DATABASE_URL=postgresql://... python benchmarks/index_benchmark.py [--users N] [--compare]
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DISABLE_EVENTLET_MONKEY_PATCH", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+from app import app, db  # noqa: E402
+from models import User, Document, DocumentChunk, ChatHistory, ChatMessage  # noqa: E402
+from migrations import _hot_path_indexes  # noqa: E402
+
+INSERT_BATCH = 5000
+
+# Created by migration 2 (and re-created from it after --compare)
+HOT_INDEXES = (
+    "ix_chat_message_history_timestamp",
+    "ix_document_chunk_document_index",
+    "ix_document_user_upload_date",
+    "ix_chat_history_session_user",
+    "ix_chat_history_user_active_updated",
+)
+
+# Hot queries of the app, as issued by chat.py and conversation_memory.py
+QUERIES = {
+    "context window": (
+        "SELECT * FROM chat_message WHERE chat_history_id = :chat_history_id "
+        "ORDER BY timestamp DESC, id DESC LIMIT 20"
+    ),
+    "document preview": (
+        "SELECT * FROM document_chunk WHERE document_id = :document_id "
+        "ORDER BY chunk_index LIMIT 3"
+    ),
+    "document page": (
+        "SELECT * FROM document WHERE user_id = :user_id AND upload_date IS NOT NULL "
+        "ORDER BY upload_date DESC, id DESC LIMIT 21"
+    ),
+    "session lookup": (
+        "SELECT * FROM chat_history WHERE session_id = :session_id AND user_id = :user_id"
+    ),
+    "conversation page": (
+        "SELECT * FROM chat_history WHERE user_id = :user_id AND is_active "
+        "AND updated_at IS NOT NULL ORDER BY updated_at DESC, id DESC LIMIT 21"
+    ),
+}
+
+
+def insert(table, rows):
+    for start in range(0, len(rows), INSERT_BATCH):
+        db.session.execute(table.insert(), rows[start:start + INSERT_BATCH])
+
+
+def seed(users: int, documents: int, chunks: int, sessions: int, messages: int, seed_value: int = 7):
+    """Insert the rows; returns parameters pointing at seeded rows"""
+    rng = random.Random(seed_value)
+    tag = f"bench{int(time.time())}"
+    start = datetime.utcnow() - timedelta(days=365)
+
+    insert(User.__table__, [
+        {"username": f"{tag}_{i}", "email": f"{tag}_{i}@example.com", "password_hash": "-", "is_active": True}
+        for i in range(users)
+    ])
+    user_ids = [row[0] for row in db.session.execute(
+        text("SELECT id FROM \"user\" WHERE username LIKE :tag"), {"tag": f"{tag}_%"}
+    )]
+
+    insert(Document.__table__, [
+        {
+            "filename": f"{tag}_{user_id}_{i}.txt", "original_filename": f"{i}.txt", "file_type": "txt",
+            "file_size": 1000, "upload_date": start + timedelta(minutes=rng.randint(0, 525600)),
+            "processed": True, "user_id": user_id
+        }
+        for user_id in user_ids for i in range(documents)
+    ])
+    document_ids = [row[0] for row in db.session.execute(
+        text("SELECT id FROM document WHERE filename LIKE :tag"), {"tag": f"{tag}_%"}
+    )]
+    insert(DocumentChunk.__table__, [
+        {"document_id": document_id, "chunk_index": i, "chunk_text": f"Chunk {i} of document {document_id}"}
+        for document_id in document_ids for i in range(chunks)
+    ])
+
+    insert(ChatHistory.__table__, [
+        {
+            "session_id": f"{tag}-{user_id}-{i}", "user_id": user_id, "is_active": rng.random() < 0.8,
+            "created_at": start, "updated_at": start + timedelta(minutes=rng.randint(0, 525600))
+        }
+        for user_id in user_ids for i in range(sessions)
+    ])
+    chat_ids = [row[0] for row in db.session.execute(
+        text("SELECT id FROM chat_history WHERE session_id LIKE :tag"), {"tag": f"{tag}-%"}
+    )]
+    for start_index in range(0, len(chat_ids), 100):
+        insert(ChatMessage.__table__, [
+            {
+                "chat_history_id": chat_id, "content": f"Message {i}", "is_user": i % 2 == 0,
+                "timestamp": start + timedelta(seconds=i * 30)
+            }
+            for chat_id in chat_ids[start_index:start_index + 100] for i in range(messages)
+        ])
+    db.session.commit()
+
+    user_id = rng.choice(user_ids)
+    chat_id = rng.choice(chat_ids)
+    session_id = db.session.execute(
+        text("SELECT session_id FROM chat_history WHERE id = :id"), {"id": chat_id}
+    ).scalar()
+    return {
+        "user_id": user_id,
+        "document_id": rng.choice(document_ids),
+        "chat_history_id": chat_id,
+        "session_id": session_id
+    }
+
+
+def explain(sql: str, parameters) -> str:
+    if db.engine.dialect.name == "postgresql":
+        rows = db.session.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}"), parameters)
+    else:
+        rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}"), parameters)
+    return "\n".join("    " + " ".join(str(value) for value in row) for row in rows)
+
+
+def measure(parameters, repeat: int, plans: bool):
+    for name, sql in QUERIES.items():
+        statement = text(sql)
+        db.session.execute(statement, parameters).all()  # Warm up
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            db.session.execute(statement, parameters).all()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        print(f"  {name:>18}: p50 {timings[len(timings) // 2] * 1000:7.3f} ms  max {timings[-1] * 1000:7.3f} ms")
+        if plans:
+            print(explain(sql, parameters))
+    db.session.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a scratch database and time the hot-path queries")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--documents", type=int, default=50, help="Documents per user")
+    parser.add_argument("--chunks", type=int, default=40, help="Chunks per document")
+    parser.add_argument("--sessions", type=int, default=30, help="Conversations per user")
+    parser.add_argument("--messages", type=int, default=60, help="Messages per conversation")
+    parser.add_argument("--repeat", type=int, default=50, help="Runs per query")
+    parser.add_argument("--compare", action="store_true", help="Also measure without the composite indexes")
+    parser.add_argument("--plans", action="store_true", help="Print query plans")
+    args = parser.parse_args()
+
+    with app.app_context():
+        started = time.perf_counter()
+        parameters = seed(args.users, args.documents, args.chunks, args.sessions, args.messages)
+        for table in ("user", "document", "document_chunk", "chat_history", "chat_message"):
+            db.session.execute(text(f'ANALYZE "{table}"'))
+        db.session.commit()
+        print(f"Seeded in {time.perf_counter() - started:.1f}s, querying {parameters}")
+
+        print("With indexes:")
+        measure(parameters, args.repeat, args.plans)
+
+        if args.compare:
+            for index in HOT_INDEXES:
+                db.session.execute(text(f"DROP INDEX IF EXISTS {index}"))
+            db.session.commit()
+            try:
+                print("Without indexes:")
+                measure(parameters, args.repeat, args.plans)
+            finally:
+                with db.engine.begin() as connection:
+                    _hot_path_indexes(connection)
+
+
+if __name__ == "__main__":
+    main()
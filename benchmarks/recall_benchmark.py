@@ -0,0 +1,105 @@
+# Retrieval quality of shortened embeddings (EMBEDDING_REQUEST_DIMENSIONS).
+# Chunks text files the way ingestion does, embeds them once at the model's
+# full size and measures, for each shorter size, how many of the top-k
+# chunks found with full-size vectors are still found (recall@k).
+# text-embedding-3 models are trained so that a shortened embedding equals
+# the full one truncated and re-normalized, which is what the API returns
+# for "dimensions"; one embedding run therefore covers every size.
+# Embeddings are saved to --cache, so later runs need no API key or network.
+# Usage: python benchmarks/recall_benchmark.py --input DIR [--queries FILE] [--sizes 256,512,1024]
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from chunking import get_chunker  # noqa: E402
+
+
+def load_chunks(directory: str):
+    chunker = get_chunker()
+    chunks = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith((".txt", ".md")):
+            with open(os.path.join(directory, name), encoding="utf-8", errors="replace") as f:
+                chunks.extend(chunker.iter_chunks([f.read()]))
+    return chunks
+
+
+def embed(texts, model: str):
+    from embedding_scheduler import EmbeddingScheduler
+    scheduler = EmbeddingScheduler(model=model, dimensions=Config.EMBEDDINGS_DIMENSION)
+    vectors = np.asarray(scheduler.embed_documents(texts), dtype="float32")
+    print(f"Embedded {len(texts)} texts: {scheduler.last_stats}")
+    return vectors
+
+
+def shorten(vectors: np.ndarray, size: int) -> np.ndarray:
+    shortened = vectors[:, :size]
+    return shortened / np.linalg.norm(shortened, axis=1, keepdims=True)
+
+
+def top_k(queries: np.ndarray, corpus: np.ndarray, k: int, exclude=None) -> np.ndarray:
+    scores = queries @ corpus.T
+    if exclude is not None:
+        scores[np.arange(len(queries)), exclude] = -np.inf  # A chunk used as query doesn't find itself
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure recall@k of shortened embeddings against full-size ones")
+    parser.add_argument("--input", help="Directory of .txt/.md files to chunk")
+    parser.add_argument("--queries", help="File with one query per line (default: sampled chunks)")
+    parser.add_argument("--sample", type=int, default=200, help="Chunks used as queries without --queries")
+    parser.add_argument("--sizes", default="256,512,1024,1536", help="Comma-separated sizes to compare")
+    parser.add_argument("--k", type=int, default=Config.RETRIEVAL_TOP_K, help="Chunks retrieved per query")
+    parser.add_argument("--model", default=Config.EMBEDDING_MODEL)
+    parser.add_argument("--cache", default="recall_embeddings.npz", help="Where embeddings are saved and reused")
+    args = parser.parse_args()
+
+    if os.path.exists(args.cache):
+        cached = np.load(args.cache)
+        corpus, queries, exclude = cached["corpus"], cached["queries"], cached["exclude"]
+        exclude = exclude if exclude.size else None
+        print(f"Loaded {len(corpus)} chunk and {len(queries)} query embeddings from {args.cache}")
+    else:
+        if not args.input:
+            parser.error("--input is required until embeddings are cached")
+        chunks = load_chunks(args.input)
+        corpus = embed(chunks, args.model)
+        if args.queries:
+            with open(args.queries, encoding="utf-8") as f:
+                queries = embed([line.strip() for line in f if line.strip()], args.model)
+            exclude = None
+        else:
+            exclude = np.random.default_rng(7).choice(len(chunks), size=min(args.sample, len(chunks)), replace=False)
+            queries = corpus[exclude]
+        np.savez(args.cache, corpus=corpus, queries=queries,
+                 exclude=exclude if exclude is not None else np.empty(0, dtype="int64"))
+        print(f"Saved embeddings to {args.cache}")
+
+    full = shorten(corpus, corpus.shape[1])
+    full_queries = shorten(queries, queries.shape[1])
+    expected = top_k(full_queries, full, args.k, exclude)
+    print(f"{len(corpus)} chunks, {len(queries)} queries, recall@{args.k} against {corpus.shape[1]} dimensions")
+
+    for size in sorted(int(value) for value in args.sizes.split(",")):
+        if size > corpus.shape[1]:
+            continue
+        vectors = shorten(corpus, size)
+        shortened_queries = shorten(queries, size)
+        started = time.perf_counter()
+        found = top_k(shortened_queries, vectors, args.k, exclude)
+        elapsed = time.perf_counter() - started
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(found, expected)])
+        print(
+            f"{size:>6} dims: recall@{args.k} {recall:.3f}  "
+            f"{size * 4 / 1024:5.1f} KiB per vector  search {elapsed / len(queries) * 1000:.3f} ms per query"
+        )
+
+
+if __name__ == "__main__":
+    main()
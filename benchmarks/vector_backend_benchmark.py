@@ -0,0 +1,108 @@
+# Vector backend benchmark: ingestion time, query latency and recall@k of
+# ChromaBackend and FaissBackend (one or more index factories) on synthetic
+# clustered vectors, at several collection sizes. Recall is measured against
+# exact brute-force neighbours, so no embedding API or dataset is needed.
+# Usage: python benchmarks/vector_backend_benchmark.py [--sizes 10000,100000,1000000]
+#        [--factories "HNSW32;HNSW32,SQfp16;IVF1024,PQ64"] [--dimension 256]
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+os.environ.setdefault("DISABLE_EVENTLET_MONKEY_PATCH", "1")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402,F401  Models import the app, so it goes first
+from vector_store import ChromaBackend, FaissBackend  # noqa: E402
+
+COLLECTION = "user_1_docs"
+ADD_BATCH = 5000
+
+
+def clustered_vectors(count: int, dimension: int, clusters: int, rng) -> np.ndarray:
+    """Unit vectors drawn around random centroids, like embeddings of related chunks"""
+    centroids = rng.standard_normal((clusters, dimension)).astype("float32")
+    vectors = centroids[rng.integers(0, clusters, count)] + 0.5 * rng.standard_normal((count, dimension)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_neighbours(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Nearest neighbours by L2 distance (inner product, since vectors are normalized)"""
+    best = []
+    for start in range(0, len(queries), 64):
+        scores = queries[start:start + 64] @ corpus.T
+        best.append(np.argsort(-scores, axis=1)[:, :k])
+    return np.vstack(best)
+
+
+def run(name: str, backend, corpus: np.ndarray, queries: np.ndarray, expected: np.ndarray, k: int):
+    started = time.perf_counter()
+    backend.defer_writes(COLLECTION)
+    for start in range(0, len(corpus), ADD_BATCH):
+        batch = corpus[start:start + ADD_BATCH]
+        backend.add(
+            COLLECTION,
+            ids=[f"chunk_{i}" for i in range(start, start + len(batch))],
+            embeddings=batch.tolist(),
+            metadatas=[{"chunk_id": i, "document_id": i // 50} for i in range(start, start + len(batch))]
+        )
+    backend.flush(COLLECTION)
+    ingest = time.perf_counter() - started
+
+    backend.query(COLLECTION, queries[0].tolist(), k)  # Open the index
+    latencies, recalls = [], []
+    for query, truth in zip(queries, expected):
+        started = time.perf_counter()
+        hits = backend.query(COLLECTION, query.tolist(), k)
+        latencies.append(time.perf_counter() - started)
+        found = {hit["metadata"]["chunk_id"] for hit in hits}
+        recalls.append(len(found & set(truth.tolist())) / k)
+
+    latencies.sort()
+    print(
+        f"  {name:>22}: ingest {ingest:8.1f} s ({len(corpus) / ingest:8.0f} vectors/s)  "
+        f"query p50 {latencies[len(latencies) // 2] * 1000:7.2f} ms  "
+        f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:7.2f} ms  recall@{k} {np.mean(recalls):.3f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the Chroma and FAISS vector backends on synthetic vectors")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated collection sizes")
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=200, help="Clusters the synthetic vectors are drawn around")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--factories", default="HNSW32", help="FAISS index factories, separated by ';'")
+    parser.add_argument("--skip-chroma", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    for size in (int(value) for value in args.sizes.split(",")):
+        corpus = clustered_vectors(size, args.dimension, args.clusters, rng)
+        # Queries near stored vectors, like questions about indexed chunks
+        queries = corpus[rng.choice(size, args.queries, replace=False)]
+        queries = queries + 0.05 * rng.standard_normal(queries.shape).astype("float32")
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        expected = exact_neighbours(corpus, queries, args.k)
+        print(f"{size} vectors, {args.dimension} dimensions")
+
+        backends = [] if args.skip_chroma else [("chroma", lambda directory: ChromaBackend(directory))]
+        backends += [
+            (f"faiss {factory}", lambda directory, factory=factory: FaissBackend(directory, factory=factory))
+            for factory in args.factories.split(";")
+        ]
+        for name, make_backend in backends:
+            directory = tempfile.mkdtemp(prefix="vector_benchmark_")
+            try:
+                run(name, make_backend(directory), corpus, queries, expected, args.k)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,70 +4,71 @@ import logging
 import json
 from flask import Blueprint, render_template, request, redirect, url_for, jsonify, flash, current_app
 from flask_login import login_required, current_user
-from flask_socketio import emit
+from flask_socketio import emit, join_room
+from sqlalchemy import func, select
 from app import db, socketio
-from models import ChatHistory, ChatMessage, Document, DocumentChunk, User
-from rag_engine import RAGEngine
-from document_processor import DocumentProcessor
+from models import ChatHistory, ChatMessage, Document, DocumentChunk, IngestionJob, User
+from services import get_rag_engine, get_document_processor, get_conversation_memory
+from concurrency import CallCancelled, cancellable, cancel, deadline
+from pagination import keyset_page, row_cursor
 
 # Create Blueprint
 chat_bp = Blueprint('chat', __name__)
 
-# Initialize services
-rag_engine = RAGEngine()
-document_processor = DocumentProcessor()
 logger = logging.getLogger(__name__)
 
+# Sort keys of paginated listings (newest first), matching the composite indexes
+DOCUMENT_ORDER = (Document.upload_date, Document.id)
+CONVERSATION_ORDER = (ChatHistory.updated_at, ChatHistory.id)
+
 # Routes
 @chat_bp.route('/dashboard')
 @login_required
 def dashboard():
     """Display user dashboard with chat sessions."""
     # Get active chat sessions - limit to recent sessions for dashboard
-    active_sessions = ChatHistory.query.filter_by(
-        user_id=current_user.id,
-        is_active=True
-    ).order_by(ChatHistory.updated_at.desc()).limit(3).all()
+    active_sessions, more_sessions = keyset_page(
+        ChatHistory.query.filter_by(user_id=current_user.id, is_active=True),
+        CONVERSATION_ORDER,
+        limit=3
+    )
 
-    # Get recent messages for each session
+    # Message counts of all sessions at once
+    message_counts = _message_counts([session.id for session in active_sessions])
     for session in active_sessions:
-        session.recent_messages = ChatMessage.query.filter_by(
-            chat_history_id=session.id
-        ).order_by(ChatMessage.timestamp.desc()).limit(3).all()
-        # Reverse to show in chronological order
-        session.recent_messages.reverse()
+        session.message_count = message_counts.get(session.id, 0)
+        session.cursor = row_cursor(session, CONVERSATION_ORDER)
 
     # Get most recent user documents for dashboard
-    recent_documents = Document.query.filter_by(
-        user_id=current_user.id
-    ).order_by(Document.upload_date.desc()).limit(3).all()
-
-    # Get all documents for reference
-    all_documents = Document.query.filter_by(
-        user_id=current_user.id
-    ).order_by(Document.upload_date.desc()).all()
+    recent_documents, more_documents = keyset_page(
+        Document.query.filter_by(user_id=current_user.id),
+        DOCUMENT_ORDER,
+        limit=3
+    )
+    for doc in recent_documents:
+        doc.cursor = row_cursor(doc, DOCUMENT_ORDER)
 
-    # Generate statistics for dashboard
-    total_documents = len(all_documents)
-    total_conversations = ChatHistory.query.filter_by(user_id=current_user.id).count()
-    last_activity = None
+    # Generate statistics for dashboard in one round trip
+    def user_stat(column, user_column):
+        return select(column).where(user_column == current_user.id).scalar_subquery()
 
-    # Get last activity time (from either document upload or chat)
-    latest_doc = Document.query.filter_by(user_id=current_user.id).order_by(Document.upload_date.desc()).first()
-    latest_chat = ChatHistory.query.filter_by(user_id=current_user.id).order_by(ChatHistory.updated_at.desc()).first()
+    total_documents, latest_upload, total_conversations, latest_chat = db.session.execute(select(
+        user_stat(func.count(Document.id), Document.user_id),
+        user_stat(func.max(Document.upload_date), Document.user_id),
+        user_stat(func.count(ChatHistory.id), ChatHistory.user_id),
+        user_stat(func.max(ChatHistory.updated_at), ChatHistory.user_id)
+    )).one()
 
-    if latest_doc and latest_chat:
-        last_activity = max(latest_doc.upload_date, latest_chat.updated_at)
-    elif latest_doc:
-        last_activity = latest_doc.upload_date
-    elif latest_chat:
-        last_activity = latest_chat.updated_at
+    # Last activity time (from either document upload or chat)
+    activity = [moment for moment in (latest_upload, latest_chat) if moment]
+    last_activity = max(activity) if activity else None
 
     return render_template(
         'dashboard.html',
         active_sessions=active_sessions,
         recent_documents=recent_documents,
-        all_documents=all_documents,
+        more_sessions=more_sessions is not None,
+        more_documents=more_documents is not None,
         total_documents=total_documents,
         total_conversations=total_conversations,
         last_activity=last_activity
@@ -160,10 +161,15 @@ def upload_document():
         flash('No file selected', 'danger')
         return redirect(request.referrer or url_for('chat.documents_page'))
 
-    # Process the uploaded file
-    result = document_processor.process_uploaded_file(file, current_user.id)
+    # Save the file and queue it for processing
+    result = get_document_processor().process_uploaded_file(file, current_user.id)
 
-    if result['success']:
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return jsonify(result)
+
+    if result['success'] and result.get('queued'):
+        flash(f'Document "{result["document_name"]}" uploaded and queued for processing', 'success')
+    elif result['success']:
         flash(f'Document "{result["document_name"]}" uploaded and processed successfully', 'success')
     else:
         flash(f'Error processing document: {result.get("error", "Unknown error")}', 'danger')
@@ -171,6 +177,25 @@ def upload_document():
     # Return to referring page or documents page
     return redirect(request.referrer or url_for('chat.documents_page'))
 
+@chat_bp.route('/documents/jobs/<int:job_id>')
+@login_required
+def ingestion_job_status(job_id):
+    """Report the progress of a background ingestion job."""
+    job = IngestionJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'document_id': job.document_id,
+        'status': job.status,
+        'stage': job.stage,
+        'attempts': job.attempts,
+        'error': job.error
+    })
+
 @chat_bp.route('/documents/preview/<int:document_id>')
 @login_required
 def preview_document(document_id):
@@ -212,28 +237,16 @@ def delete_document(document_id):
         flash('Document not found', 'danger')
         return redirect(url_for('chat.documents_page'))
 
-    try:
-        # Delete file from disk if it exists
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], document.filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
+    # Delete vectors, database rows and file together
+    result = get_document_processor().delete_document(document)
 
-        # Delete document from database
-        db.session.delete(document)
-        db.session.commit()
-
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            return jsonify({'success': True})
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return jsonify(result)
 
+    if result['success']:
         flash('Document deleted successfully', 'success')
-    except Exception as e:
-        db.session.rollback()
-        logger.error(f"Error deleting document: {str(e)}", exc_info=True)
-
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            return jsonify({'success': False, 'error': str(e)})
-
-        flash(f'Error deleting document: {str(e)}', 'danger')
+    else:
+        flash(f'Error deleting document: {result["error"]}', 'danger')
 
     return redirect(url_for('chat.documents_page'))
 
@@ -253,10 +266,9 @@ def delete_chat(chat_id):
         db.session.delete(chat)
         db.session.commit()
 
-        # Emit a socket event to notify clients about the deletion
+        # Notify the user's clients on every worker about the deletion
         try:
-            from app import socketio
-            socketio.emit('chat_deleted', {'chat_id': chat_id, 'session_id': session_id})
+            socketio.emit('chat_deleted', {'chat_id': chat_id, 'session_id': session_id}, to=_user_room(current_user.id))
         except Exception as socket_err:
             logger.error(f"Error emitting socket event for chat deletion: {str(socket_err)}")
 
@@ -320,26 +332,27 @@ def handle_message(data):
         db.session.add(user_msg)
         db.session.flush()
 
-        # Get recent messages for context
-        recent_messages = ChatMessage.query.filter_by(
-            chat_history_id=chat_history.id
-        ).order_by(ChatMessage.timestamp).all()
-
-        context = []
-        for msg in recent_messages[-10:]:  # Last 10 messages
-            context.append({
-                'content': msg.content,
-                'is_user': msg.is_user,
-                'timestamp': msg.timestamp.isoformat()
-            })
-
-        # Process query with RAG engine
-        response = rag_engine.process_query(
-            query=message,
-            user_id=user_id,
-            session_id=session_id,
-            chat_context=context
-        )
+        # Latest messages for context (bounded), plus the summary of older ones
+        memory = get_conversation_memory()
+        context = memory.window(chat_history)
+        conversation_summary = chat_history.summary
+        message_count = memory.message_count(chat_history)
+
+        # Process query with RAG engine; abandoned if the client disconnects
+        with cancellable(request.sid), deadline(current_app.config['LLM_DEADLINE_SECONDS']):
+            if data.get('stream'):
+                # Commit the user message so the transaction isn't held open while streaming
+                db.session.commit()
+                response = _stream_response(message, user_id, session_id, context, conversation_summary, message_count)
+            else:
+                response = get_rag_engine().process_query(
+                    query=message,
+                    user_id=user_id,
+                    session_id=session_id,
+                    chat_context=context,
+                    conversation_summary=conversation_summary,
+                    message_count=message_count
+                )
 
         # Save AI response
         ai_msg = ChatMessage(
@@ -361,18 +374,84 @@ def handle_message(data):
             'sources': response.get('metadata', {}).get('sources', []),
             'user_message_id': user_msg.id,
             'ai_message_id': ai_msg.id,
-            'session_id': session_id  # Send back the session ID
+            'session_id': session_id,  # Send back the session ID
+            'streamed': bool(data.get('stream'))
         })
 
+        # Fold turns that left the context window into the summary, off the request path
+        memory.fold_in_background(chat_history.id)
+
+    except CallCancelled:
+        db.session.rollback()
+        logger.info(f"Client disconnected, abandoned message in session {session_id}")
+
     except Exception as e:
         db.session.rollback()
         logger.error(f"Error processing message: {str(e)}", exc_info=True)
         emit('error', {'message': f'Error processing message: {str(e)}'})
 
+def _stream_response(message, user_id, session_id, context, conversation_summary=None, message_count=None):
+    """Emit sources and answer tokens as they arrive and return the final response."""
+    response = None
+    for event in get_rag_engine().stream_query(
+        query=message,
+        user_id=user_id,
+        session_id=session_id,
+        chat_context=context,
+        conversation_summary=conversation_summary,
+        message_count=message_count
+    ):
+        if event['type'] == 'sources':
+            emit('message_sources', {'sources': event['sources'], 'session_id': session_id})
+        elif event['type'] == 'token':
+            emit('message_chunk', {'content': event['content'], 'session_id': session_id})
+        elif event['type'] == 'done':
+            response = event
+        socketio.sleep(0)  # Let eventlet flush the event to the client
+    return response
+
+def _latest_messages(session_ids, per_session):
+    """Latest messages of each chat session in chronological order, keyed by session id"""
+    if not session_ids:
+        return {}
+    position = func.row_number().over(
+        partition_by=ChatMessage.chat_history_id,
+        order_by=(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+    ).label('position')
+    ranked = db.session.query(ChatMessage.id, position).filter(
+        ChatMessage.chat_history_id.in_(session_ids)
+    ).subquery()
+    messages = ChatMessage.query.join(ranked, ChatMessage.id == ranked.c.id).filter(
+        ranked.c.position <= per_session
+    ).order_by(ChatMessage.timestamp, ChatMessage.id).all()
+
+    latest = {}
+    for message in messages:
+        latest.setdefault(message.chat_history_id, []).append(message)
+    return latest
+
+def _message_counts(session_ids):
+    """Number of messages of each chat session, keyed by session id"""
+    if not session_ids:
+        return {}
+    return dict(db.session.query(ChatMessage.chat_history_id, func.count(ChatMessage.id)).filter(
+        ChatMessage.chat_history_id.in_(session_ids)
+    ).group_by(ChatMessage.chat_history_id).all())
+
+def _user_room(user_id):
+    """Socket.IO room joined by all connections of a user"""
+    return f"user_{user_id}"
+
 @socketio.on('connect')
 def handle_connect():
     if not current_user.is_authenticated:
         return False  # Reject connection if not authenticated
+    join_room(_user_room(current_user.id))
+
+@socketio.on('disconnect')
+def handle_disconnect(*args):
+    # Stop LLM calls whose answers can no longer be delivered
+    cancel(request.sid)
 
 # Admin routes - restricted to admin users
 @chat_bp.route('/admin')
@@ -434,20 +513,17 @@ def get_chat_messages(session_id):
 @chat_bp.route('/documents/more')
 @login_required
 def load_more_documents():
-    """Load more documents for pagination."""
+    """Load more documents for pagination, after the document the cursor points to."""
     try:
-        offset = int(request.args.get('offset', 0))
-        limit = int(request.args.get('limit', 5))
-        
-        # Get additional documents
-        documents = Document.query.filter_by(
-            user_id=current_user.id
-        ).order_by(Document.upload_date.desc()).offset(offset).limit(limit+1).all()
+        limit = max(1, min(int(request.args.get('limit', 5)), 50))
         
-        # Check if there are more documents beyond this batch
-        has_more = len(documents) > limit
-        if has_more:
-            documents = documents[:limit]  # Remove the extra document we fetched
+        # Get the next batch of documents
+        documents, next_cursor = keyset_page(
+            Document.query.filter_by(user_id=current_user.id),
+            DOCUMENT_ORDER,
+            cursor=request.args.get('cursor'),
+            limit=limit
+        )
         
         # Format document data
         documents_data = []
@@ -457,14 +533,21 @@ def load_more_documents():
                 'original_filename': doc.original_filename,
                 'file_type': doc.file_type,
                 'file_size': doc.file_size,
-                'upload_date': doc.upload_date.strftime('%Y-%m-%d %H:%M')
+                'upload_date': doc.upload_date.strftime('%Y-%m-%d %H:%M'),
+                'cursor': row_cursor(doc, DOCUMENT_ORDER)
             })
         
         return jsonify({
             'success': True,
             'documents': documents_data,
-            'has_more': has_more
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
         })
+    except ValueError as e:  # Malformed cursor (InvalidCursor) or limit
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Error loading more documents: {str(e)}", exc_info=True)
         return jsonify({
@@ -475,45 +558,45 @@ def load_more_documents():
 @chat_bp.route('/chat/more_conversations')
 @login_required
 def load_more_conversations():
-    """Load more conversations for pagination."""
+    """Load more conversations for pagination, after the conversation the cursor points to."""
     try:
-        offset = int(request.args.get('offset', 0))
-        limit = int(request.args.get('limit', 5))
+        limit = max(1, min(int(request.args.get('limit', 5)), 50))
         
-        # Get additional conversations
-        conversations = ChatHistory.query.filter_by(
-            user_id=current_user.id,
-            is_active=True
-        ).order_by(ChatHistory.updated_at.desc()).offset(offset).limit(limit+1).all()
-        
-        # Check if there are more conversations beyond this batch
-        has_more = len(conversations) > limit
-        if has_more:
-            conversations = conversations[:limit]  # Remove the extra conversation we fetched
+        # Get the next batch of conversations
+        conversations, next_cursor = keyset_page(
+            ChatHistory.query.filter_by(user_id=current_user.id, is_active=True),
+            CONVERSATION_ORDER,
+            cursor=request.args.get('cursor'),
+            limit=limit
+        )
         
-        # Format conversation data
+        # Format conversation data, with the latest messages fetched in one query
+        latest_messages = _latest_messages([convo.id for convo in conversations], per_session=1)
         conversations_data = []
         for convo in conversations:
-            # Get the most recent message
-            recent_message = ChatMessage.query.filter_by(
-                chat_history_id=convo.id
-            ).order_by(ChatMessage.timestamp.desc()).first()
-            
-            message_content = recent_message.content if recent_message else ""
+            recent_message = latest_messages.get(convo.id)
+            message_content = recent_message[0].content if recent_message else ""
             
             conversations_data.append({
                 'id': convo.id,
                 'session_id': convo.session_id,
                 'date': convo.updated_at.strftime('%d %b'),
                 'time': convo.updated_at.strftime('%H:%M'),
-                'recent_message': message_content
+                'recent_message': message_content,
+                'cursor': row_cursor(convo, CONVERSATION_ORDER)
             })
         
         return jsonify({
             'success': True,
             'conversations': conversations_data,
-            'has_more': has_more
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
         })
+    except ValueError as e:  # Malformed cursor (InvalidCursor) or limit
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Error loading more conversations: {str(e)}", exc_info=True)
         return jsonify({
@@ -527,27 +610,26 @@ def get_recent_conversations():
     """Get recent conversations for real-time updates."""
     try:
         # Get recent conversations (first 5)
-        conversations = ChatHistory.query.filter_by(
-            user_id=current_user.id,
-            is_active=True
-        ).order_by(ChatHistory.updated_at.desc()).limit(5).all()
+        conversations, _ = keyset_page(
+            ChatHistory.query.filter_by(user_id=current_user.id, is_active=True),
+            CONVERSATION_ORDER,
+            limit=5
+        )
         
-        # Format conversation data
+        # Format conversation data, with the latest messages fetched in one query
+        latest_messages = _latest_messages([convo.id for convo in conversations], per_session=1)
         conversations_data = []
         for convo in conversations:
-            # Get the most recent message
-            recent_message = ChatMessage.query.filter_by(
-                chat_history_id=convo.id
-            ).order_by(ChatMessage.timestamp.desc()).first()
-            
-            message_content = recent_message.content if recent_message else ""
+            recent_message = latest_messages.get(convo.id)
+            message_content = recent_message[0].content if recent_message else ""
             
             conversations_data.append({
                 'id': convo.id,
                 'session_id': convo.session_id,
                 'date': convo.updated_at.strftime('%d %b'),
                 'time': convo.updated_at.strftime('%H:%M'),
-                'recent_message': message_content
+                'recent_message': message_content,
+                'cursor': row_cursor(convo, CONVERSATION_ORDER)
             })
         
         return jsonify({
@@ -0,0 +1,257 @@
+import re
+import logging
+from typing import Iterable, Iterator, List, Tuple
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken missing or encoding not downloadable
+    _encoding = None
+
+
+def encode(text: str) -> List[int]:
+    return _encoding.encode(text, disallowed_special=())
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken, or estimate them if it is unavailable"""
+    if _encoding:
+        return len(encode(text))
+    return len(text) // 4 + 1
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to at most ``max_tokens`` tokens"""
+    if _encoding:
+        return _encoding.decode(encode(text)[:max_tokens])
+    return text[:max_tokens * 4]
+
+
+class Chunker:
+    """Base class for chunking strategies."""
+
+    def split(self, text: str) -> List[str]:
+        """Split a complete text into chunks"""
+        return list(self.iter_chunks([text]))
+
+    def iter_chunks(self, segments: Iterable[str]) -> Iterator[str]:
+        """Chunk a stream of text segments (e.g. PDF pages) as they arrive"""
+        raise NotImplementedError
+
+
+class SentenceChunker(Chunker):
+    """Original strategy: sentences packed into chunks of ``chunk_size`` characters, no overlap."""
+
+    def __init__(self, chunk_size: int = 1000):
+        self.chunk_size = chunk_size
+
+    def iter_chunks(self, segments: Iterable[str]) -> Iterator[str]:
+        carry = ""
+        for segment in segments:
+            if not segment:
+                continue
+            text = f"{carry}\n{segment}" if carry else segment
+            chunks = self._create_chunks(text)
+            carry = chunks.pop() if chunks else ""
+            for chunk in chunks:
+                if chunk.strip():
+                    yield chunk
+
+        if carry.strip():
+            yield carry
+
+    def _create_chunks(self, text: str) -> List[str]:
+        sentences = re.split(r'(?<=[.!?])\s+', text)
+        chunks = []
+        current_chunk = []
+        current_size = 0
+
+        for sentence in sentences:
+            sentence_size = len(sentence)
+
+            if current_size + sentence_size > self.chunk_size and current_chunk:
+                chunks.append(" ".join(current_chunk))
+                current_chunk = []
+                current_size = 0
+
+            current_chunk.append(sentence)
+            current_size += sentence_size + 1
+
+        if current_chunk:
+            chunks.append(" ".join(current_chunk))
+
+        return chunks
+
+
+class _ChunkRun:
+    """State of one ``TokenChunker.iter_chunks`` call, so calls can run concurrently"""
+
+    def __init__(self):
+        self.units: List[Tuple[str, int]] = []
+        self.tokens = 0
+        self.carried = 0  # Leading units repeated from the previous chunk
+
+
+class TokenChunker(Chunker):
+    """
+    Token-sized chunker with overlap and structure-aware boundaries.
+
+    Text is split into paragraphs (blank lines), then into lines and sentences.
+    Units are packed until ``chunk_tokens`` is reached; the next chunk starts
+    with up to ``overlap_tokens`` of trailing units. Headings always start a new
+    chunk, and a paragraph that doesn't fit is moved to the next chunk when the
+    current one is at least half full. No unit exceeds ``max_tokens``: longer
+    sentences (common in PDF tables without punctuation) are hard split.
+
+    Every character is tokenized once and only the bounded overlap is revisited,
+    so run time is linear in the input size.
+    """
+
+    _PARAGRAPH_BREAK = re.compile(r'\n[ \t]*\n')
+    _UNIT = re.compile(r'[^\n.!?…]*(?:[.!?…]+(?=\s|$)|\n|$)|[^\n]+')
+    _HEADING = re.compile(
+        r'^\s*(?:#{1,6}\s+\S.*'
+        r'|\d+(?:\.\d+)*\.\s+\S[^.!?]{0,100}'
+        r'|\d+(?:\.\d+)+\s+\S[^.!?]{0,100}'
+        r'|[A-ZА-ЯЁ][A-ZА-ЯЁ0-9 ,:()\-–—]{2,100})\s*$'
+    )
+
+    def __init__(self, chunk_tokens: int = None, overlap_tokens: int = None, max_tokens: int = None):
+        self.chunk_tokens = chunk_tokens or Config.CHUNK_SIZE_TOKENS
+        self.overlap_tokens = overlap_tokens if overlap_tokens is not None else Config.CHUNK_OVERLAP_TOKENS
+        self.max_tokens = max(max_tokens or Config.CHUNK_MAX_TOKENS, self.chunk_tokens)
+        # Pending text kept between segments before it is cut at a line break anyway
+        self.max_pending_chars = self.max_tokens * 16
+
+    def iter_chunks(self, segments: Iterable[str]) -> Iterator[str]:
+        run = _ChunkRun()
+        pending = ""
+
+        for segment in segments:
+            if not segment:
+                continue
+            pending = f"{pending}\n{segment}" if pending else segment
+
+            # Hand over every complete paragraph; keep the last one open
+            parts = self._PARAGRAPH_BREAK.split(pending)
+            pending = parts.pop()
+            for paragraph in parts:
+                yield from self._add_paragraph(run, paragraph)
+
+            # A paragraph without blank lines can be the whole document; cut it
+            # at its last line break so pending text stays bounded
+            if len(pending) > self.max_pending_chars:
+                cut = pending.rfind("\n", 0, len(pending) - 1)
+                if cut <= 0:
+                    cut = len(pending) - self.max_pending_chars // 2
+                yield from self._add_paragraph(run, pending[:cut], continued=True)
+                pending = pending[cut:].lstrip("\n")
+
+        if pending.strip():
+            yield from self._add_paragraph(run, pending)
+        yield from self._flush(run, carry_overlap=False)
+
+    def _add_paragraph(self, run: _ChunkRun, paragraph: str, continued: bool = False) -> Iterator[str]:
+        units = [unit for unit in self._split_units(paragraph) if unit[0].strip()]
+        if not units:
+            return
+
+        if run.units and self._is_heading(units[0][0]):
+            yield from self._flush(run, carry_overlap=False)
+        elif not continued and run.units:
+            paragraph_tokens = sum(tokens for _, tokens in units)
+            if run.tokens + paragraph_tokens > self.chunk_tokens and run.tokens >= self.chunk_tokens // 2:
+                yield from self._flush(run, carry_overlap=True)
+
+        for index, (text, tokens) in enumerate(units):
+            if index and self._is_heading(text) and run.units:
+                yield from self._flush(run, carry_overlap=False)
+            if run.units and run.tokens + tokens > self.chunk_tokens:
+                yield from self._flush(run, carry_overlap=True)
+            run.units.append((text, tokens))
+            run.tokens += tokens
+
+        # Keep paragraphs apart inside a chunk
+        last_text, last_tokens = run.units[-1]
+        if not last_text.endswith("\n"):
+            run.units[-1] = (last_text + "\n", last_tokens)
+
+    def _flush(self, run: _ChunkRun, carry_overlap: bool) -> Iterator[str]:
+        """Emit the current chunk unless it holds nothing but overlap of the previous one"""
+        if len(run.units) > run.carried:
+            yield self._emit(run, carry_overlap)
+        else:
+            run.units, run.tokens, run.carried = [], 0, 0
+
+    def _emit(self, run: _ChunkRun, carry_overlap: bool) -> str:
+        """Return the current chunk and start the next one, optionally with overlap"""
+        chunk = self._join(run.units)
+
+        carried, carried_tokens = [], 0
+        if carry_overlap and self.overlap_tokens:
+            for text, tokens in reversed(run.units):
+                if carried_tokens + tokens > self.overlap_tokens:
+                    break
+                carried.append((text, tokens))
+                carried_tokens += tokens
+            carried.reverse()
+            # Overlap must leave room for progress
+            if len(carried) == len(run.units):
+                carried, carried_tokens = [], 0
+
+        run.units, run.tokens, run.carried = carried, carried_tokens, len(carried)
+        return chunk
+
+    def _split_units(self, paragraph: str) -> Iterator[Tuple[str, int]]:
+        """Split a paragraph into sentence/line units no longer than ``max_tokens``"""
+        for match in self._UNIT.finditer(paragraph):
+            unit = match.group(0)
+            if not unit:
+                continue
+            # Tokenizers are superlinear on huge whitespace-free runs; cut by characters first
+            for start in range(0, len(unit), self.max_tokens * 4):
+                yield from self._split_oversized(unit[start:start + self.max_tokens * 4])
+
+    def _split_oversized(self, text: str) -> Iterator[Tuple[str, int]]:
+        if not _encoding:
+            tokens = count_tokens(text)
+            yield text, tokens
+            return
+
+        token_ids = encode(text)
+        if len(token_ids) <= self.max_tokens:
+            yield text, len(token_ids)
+            return
+        for start in range(0, len(token_ids), self.max_tokens):
+            window = token_ids[start:start + self.max_tokens]
+            yield _encoding.decode(window), len(window)
+
+    def _is_heading(self, text: str) -> bool:
+        stripped = text.strip()
+        return len(stripped) <= 120 and bool(self._HEADING.match(stripped))
+
+    @staticmethod
+    def _join(units: List[Tuple[str, int]]) -> str:
+        parts = []
+        for text, _ in units:
+            if parts and not parts[-1].endswith(("\n", " ")) and not text.startswith((" ", "\n")):
+                parts.append(" ")
+            parts.append(text)
+        return "".join(parts).strip()
+
+
+CHUNKERS = {
+    "sentence": SentenceChunker,
+    "token": TokenChunker,
+}
+
+
+def get_chunker(name: str = None) -> Chunker:
+    """Create the configured chunking strategy"""
+    name = name or Config.CHUNKER
+    if name not in CHUNKERS:
+        raise ValueError(f"Unknown chunker: {name}")
+    return CHUNKERS[name]()
@@ -0,0 +1,84 @@
+import click
+
+def register_commands(app):
+    """Register maintenance commands, run as ``flask --app main <command>``."""
+
+    @app.cli.command('rebuild-lexical-index')
+    @click.option('--user-id', type=int, default=None, help='Only rebuild for this user')
+    def rebuild_lexical_index(user_id):
+        """Build BM25 postings for documents ingested before hybrid search existed."""
+        from lexical_index import LexicalIndex
+        chunk_total = LexicalIndex().rebuild(user_id)
+        click.echo(f"Indexed {chunk_total} chunks")
+
+    @app.cli.command('migrate-legacy-vectors')
+    @click.option('--user-id', type=int, default=None, help='Only migrate this user')
+    @click.option('--batch-size', type=int, default=1000, show_default=True, help='Vectors per batch')
+    @click.option('--restart', is_flag=True, help='Ignore recorded progress and start over')
+    @click.option('--dry-run', is_flag=True, help='Verify mappings without writing anything')
+    def migrate_legacy_vectors(user_id, batch_size, restart, dry_run):
+        """Copy vectors from legacy user_N_index files into the active vector backend."""
+        from services import get_vector_store
+        from legacy_migration import LegacyVectorMigrator, LegacyMigrationError
+        migrator = LegacyVectorMigrator(get_vector_store(), batch_size=batch_size)
+
+        user_ids = [user_id] if user_id is not None else migrator.find_legacy_users()
+        if not user_ids:
+            click.echo("No legacy vector stores found")
+        for legacy_user_id in user_ids:
+            try:
+                stats = migrator.migrate_user(legacy_user_id, restart=restart, dry_run=dry_run)
+            except LegacyMigrationError as e:
+                click.echo(f"User {legacy_user_id}: {e}", err=True)
+                continue
+            click.echo(
+                f"User {legacy_user_id}: {stats['migrated']} vectors migrated, "
+                f"{stats['skipped']} skipped of {stats['total']}"
+            )
+
+    @app.cli.command('compact-vectors')
+    @click.option('--user-id', type=int, default=None, help='Only reconcile this user')
+    def compact_vectors(user_id):
+        """Delete vectors without chunk rows and compact vector collections."""
+        from services import get_vector_store
+        from vector_gc import VectorGarbageCollector
+        stats = VectorGarbageCollector(get_vector_store()).run(user_id)
+        click.echo(
+            f"{stats['collections']} collections checked: {stats['orphans_deleted']} orphaned vectors deleted, "
+            f"{stats['collections_dropped']} collections dropped, {stats['skipped']} skipped (ingestion in progress)"
+        )
+
+    @app.cli.command('migrate-schema')
+    def migrate_schema():
+        """Apply pending database schema migrations."""
+        from migrations import SchemaMigrator
+        applied = SchemaMigrator().upgrade()
+        click.echo(f"Applied migrations {applied}" if applied else "Schema is up to date")
+
+    @app.cli.command('schema-status')
+    def schema_status():
+        """Show the schema version and pending migrations."""
+        from migrations import SchemaMigrator
+        migrator = SchemaMigrator()
+        click.echo(f"Schema version: {migrator.current_version()}")
+        for migration in migrator.pending():
+            click.echo(f"Pending: {migration.version} {migration.description}")
+
+    @app.cli.command('import-profile')
+    @click.option('--module', default='main', show_default=True, help='Module to import, as the server does')
+    @click.option('--with-services', is_flag=True, help='Also create the lazily initialized services')
+    @click.option('--top', type=int, default=20, show_default=True, help='Number of slowest modules to list')
+    def import_profile(module, with_services, top):
+        """Report cold-start import times, measured in a fresh interpreter."""
+        from import_profile import profile_imports
+        code = f"import {module}"
+        if with_services:
+            code += "\nimport services\nservices.get_rag_engine()\nservices.get_document_processor()"
+        report = profile_imports(code)
+        if not report["success"]:
+            click.echo(f"Import failed: {report['error']}", err=True)
+
+        click.echo(f"Total import time: {report['total_ms']:.0f} ms ({len(report['modules'])} modules)")
+        slowest = sorted(report["modules"], key=lambda m: m["cumulative_ms"], reverse=True)[:top]
+        for entry in slowest:
+            click.echo(f"{entry['cumulative_ms']:9.1f} ms  {entry['self_ms']:8.1f} ms self  {entry['module']}")
@@ -0,0 +1,155 @@
+import os
+import time
+import logging
+import functools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Set
+import eventlet
+from eventlet import patcher, tpool
+from eventlet.semaphore import BoundedSemaphore
+from config import Config
+
+# Size of eventlet's pool of real OS threads; read when tpool starts
+os.environ.setdefault("EVENTLET_THREADPOOL_SIZE", str(Config.OFFLOAD_THREADS))
+
+logger = logging.getLogger(__name__)
+
+
+class CallCancelled(BaseException):
+    """Raised inside a green thread whose Socket.IO client disconnected.
+
+    Derives from BaseException so that ``except Exception`` blocks in library
+    code don't swallow it and carry on with an answer nobody will read.
+    """
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call runs past its deadline."""
+
+
+def is_green() -> bool:
+    """Whether this process runs on eventlet's monkey-patched threads"""
+    return patcher.is_monkey_patched("thread")
+
+
+# Green threads working on behalf of a Socket.IO client, keyed by its sid
+_tracked: Dict[str, Set] = {}
+_tracked_lock = threading.Lock()
+
+
+@contextmanager
+def cancellable(owner: str):
+    """Register the current green thread so that ``cancel(owner)`` can interrupt it"""
+    if not owner or not is_green():
+        yield
+        return
+
+    current = eventlet.getcurrent()
+    with _tracked_lock:
+        _tracked.setdefault(owner, set()).add(current)
+    try:
+        yield
+    finally:
+        with _tracked_lock:
+            threads = _tracked.get(owner)
+            if threads is not None:
+                threads.discard(current)
+                if not threads:
+                    del _tracked[owner]
+
+
+def cancel(owner: str) -> int:
+    """Interrupt every green thread registered for ``owner``; returns how many"""
+    with _tracked_lock:
+        threads = _tracked.pop(owner, set())
+    for thread in threads:
+        eventlet.kill(thread, CallCancelled)
+    if threads:
+        logger.info(f"Cancelled {len(threads)} calls for {owner}")
+    return len(threads)
+
+
+@contextmanager
+def deadline(seconds: float = None):
+    """Abort the block with DeadlineExceeded after ``seconds``.
+
+    Enforced by eventlet in green threads; elsewhere only the HTTP timeouts apply.
+    """
+    if not seconds or not is_green():
+        yield
+        return
+    with eventlet.Timeout(seconds, DeadlineExceeded(f"Deadline of {seconds}s exceeded")):
+        yield
+
+
+def fan_out(calls: List[Callable], timeout: float = None) -> List:
+    """Run callables concurrently and return their results in order.
+
+    Under eventlet each call gets a green thread (OpenAI requests use green
+    sockets, so they overlap); otherwise a thread pool is used. The first
+    exception is raised, and calls still running when the caller fails, is
+    cancelled or hits ``timeout`` are stopped where possible. Each call runs
+    in a copy of the caller's context, so the Flask/app context travels along.
+    """
+    calls = [functools.partial(contextvars.copy_context().run, call) for call in calls]
+    if is_green():
+        threads = [eventlet.spawn(call) for call in calls]
+        try:
+            with deadline(timeout):
+                return [thread.wait() for thread in threads]
+        finally:
+            for thread in threads:
+                thread.kill()  # No-op for finished threads
+
+    executor = ThreadPoolExecutor(max_workers=max(1, len(calls)))
+    try:
+        futures = [executor.submit(call) for call in calls]
+        expires_at = time.monotonic() + timeout if timeout else None
+        return [
+            future.result(timeout=max(0.0, expires_at - time.monotonic()) if expires_at else None)
+            for future in futures
+        ]
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Offloaded calls queued or running at once; further callers wait in their green thread
+_offload_slots = BoundedSemaphore(Config.OFFLOAD_MAX_PENDING)
+
+
+# Set inside offloaded calls, which are already off the hub
+_offloaded = contextvars.ContextVar("offloaded", default=False)
+
+
+def offload(fn: Callable, *args, **kwargs):
+    """Run blocking, non-green code in a real OS thread.
+
+    C extensions (Chroma, FAISS, PyPDF2, pandas) and CPU-bound Python never
+    yield to eventlet, so one long call would freeze every socket of the
+    worker. Under eventlet the call goes to ``eventlet.tpool`` while the
+    calling green thread waits cooperatively; the Flask/app context travels
+    along. Outside eventlet, or when already offloaded, the call simply runs
+    in place.
+    """
+    if not is_green() or _offloaded.get():
+        return fn(*args, **kwargs)
+    context = contextvars.copy_context()
+    context.run(_offloaded.set, True)
+    with _offload_slots:
+        return tpool.execute(context.run, fn, *args, **kwargs)
+
+
+def offload_iter(iterator: Iterator) -> Iterator:
+    """Advance a blocking iterator (e.g. extraction and chunking) in real threads, item by item"""
+    if not is_green():
+        yield from iterator
+        return
+    done = object()
+    while True:
+        item = offload(next, iterator, done)
+        if item is done:
+            return
+        yield item
@@ -11,17 +11,90 @@ class Config:
         "pool_recycle": 300,
         "pool_pre_ping": True,
     }
+    # Apply pending schema migrations at startup; disable to run `flask migrate-schema` during deploys
+    AUTO_MIGRATE = os.environ.get("AUTO_MIGRATE", "true").lower() == "true"
     
     # File upload configuration
     UPLOAD_FOLDER = "uploads"
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB max upload
     
+    # Background ingestion configuration
+    INGESTION_ASYNC = os.environ.get("INGESTION_ASYNC", "true").lower() == "true"
+    # Re-uploading a file updates its document, re-embedding only changed chunks
+    DOCUMENT_VERSIONING = os.environ.get("DOCUMENT_VERSIONING", "true").lower() == "true"
+    INGESTION_MAX_ATTEMPTS = 3  # Attempts before a job is marked as failed
+    INGESTION_LEASE_SECONDS = 15 * 60  # Running jobs are reclaimed after this
+    INGESTION_RETRY_DELAY_SECONDS = 30  # Base delay, doubled on each retry
+    INGESTION_POLL_INTERVAL = 2  # Seconds between queue polls when idle
+    VECTOR_GC_INTERVAL_SECONDS = 6 * 60 * 60  # Idle workers reconcile vectors with chunks (0 disables)
+    CHUNK_BATCH_SIZE = 128  # Chunks embedded and committed together
+    CHUNKER = os.environ.get("CHUNKER", "token")  # "token" or legacy "sentence"
+    CHUNK_SIZE_TOKENS = 400  # Target chunk size
+    CHUNK_OVERLAP_TOKENS = 50  # Tokens repeated at the start of the next chunk
+    CHUNK_MAX_TOKENS = 512  # Hard limit; longer sentences are split
+    PDF_EXTRACTION_WORKERS = min(4, os.cpu_count() or 1)  # Processes for page-parallel extraction
+    PDF_PAGES_PER_TASK = 10  # Pages extracted per process pool task
+    PDF_PARALLEL_MIN_PAGES = 50  # Smaller PDFs are extracted in-process
+    SPREADSHEET_ROWS_PER_READ = 5000  # CSV rows held in memory at once
+    
+    # Multi-worker deployment. The message queue relays Socket.IO events between
+    # workers and nodes, e.g. "redis://localhost:6379/0" (requires the redis
+    # package); unset, events stay in-process, which suits a single worker and tests.
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get("SOCKETIO_MESSAGE_QUEUE") or None
+    SOCKETIO_CHANNEL = os.environ.get("SOCKETIO_CHANNEL", "flask-socketio")
+    # Chroma server shared by all processes; unset, each process opens vector_db directly
+    CHROMA_HOST = os.environ.get("CHROMA_HOST") or None
+    CHROMA_PORT = int(os.environ.get("CHROMA_PORT", "8000"))
+    
     # Chat configuration
     MAX_CHAT_HISTORY = 50  # Maximum number of messages to store per chat
+    CONVERSATION_WINDOW_MESSAGES = 10  # Latest messages given to the LLM with each question
+    CONVERSATION_WINDOW_TOKENS = 2000  # Token budget of those messages; the oldest are dropped first
+    CONVERSATION_FOLD_BATCH = 50  # Older messages folded into the session summary at a time
     
     # Vector database configuration
     VECTOR_DB_PATH = "vector_db"
     EMBEDDINGS_DIMENSION = 3072  # text-embedding-3-large dimension
+    # Size requested from the API ("dimensions" parameter) to shorten embeddings,
+    # e.g. 1024 or 256; EMBEDDINGS_DIMENSION is the model's full size.
+    # Collections are kept per size, so changing it requires reprocessing documents.
+    EMBEDDING_REQUEST_DIMENSIONS = int(os.environ.get("EMBEDDING_REQUEST_DIMENSIONS", EMBEDDINGS_DIMENSION))
+    RAG_CHAIN_CACHE_SIZE = 64  # Per-user retrieval chains kept in memory (LRU)
+    RETRIEVAL_TOP_K = 4  # Chunks passed to the LLM
+    HYBRID_SEARCH_ENABLED = True  # Fuse BM25 with vector results
+    HYBRID_CANDIDATES = 20  # Candidates taken from each retriever before fusion
+    HYBRID_RRF_K = 60  # Reciprocal rank fusion constant
+    EMBEDDING_MODEL = "text-embedding-3-large"
+    EMBEDDING_CACHE_PATH = os.path.join(VECTOR_DB_PATH, "embedding_cache.sqlite3")
+    EMBEDDING_CACHE_MAX_BYTES = 1024 * 1024 * 1024  # 1GB of float32 vectors
+    EMBEDDING_BATCH_TOKENS = 50000  # Token budget per embeddings request
+    EMBEDDING_MAX_BATCH_SIZE = 512  # Inputs per embeddings request
+    EMBEDDING_CONCURRENCY = 4  # Parallel embeddings requests
+    EMBEDDING_MAX_RETRIES = 6  # Retries per batch on rate limits and transient errors
+    
+    # Vector index engine: "chroma" or "faiss"
+    VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")
+    # FAISS index factory, e.g. "HNSW32", "HNSW32,SQfp16" (float16 storage) or "IVF1024,PQ64"
+    FAISS_INDEX_FACTORY = os.environ.get("FAISS_INDEX_FACTORY", "HNSW32")
+    FAISS_USE_MMAP = True  # Memory-map index files for queries
+    FAISS_EF_SEARCH = 64  # HNSW search depth
+    FAISS_NPROBE = 16  # IVF lists probed per query
+    FAISS_TRAIN_MIN_VECTORS = 20000  # Factories that need training stay flat until this size
+    FAISS_RERANK_FACTOR = 4  # SQ/PQ indexes: candidates per result re-ranked with float32 vectors (0 disables)
+    
+    # OpenAI HTTP connection pool, shared by all clients of a process
+    OPENAI_MAX_CONNECTIONS = 20
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS = 10
+    OPENAI_TIMEOUT = 120  # Seconds per API request
+    LLM_DEADLINE_SECONDS = 90  # Time allowed for answering one chat message
+    
+    # Blocking work (vector search, extraction) run off the eventlet hub in real threads
+    OFFLOAD_THREADS = 8  # OS threads in eventlet's tpool
+    OFFLOAD_MAX_PENDING = 16  # Offloaded calls queued or running at once
+    
+    # Semantic answer cache (opt-in)
+    ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+    ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.95  # Cosine similarity needed to reuse an answer
     
     # Security configuration
     WTF_CSRF_ENABLED = True
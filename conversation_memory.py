@@ -0,0 +1,137 @@
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+from flask import current_app
+from models import ChatHistory, ChatMessage
+from chunking import count_tokens
+from config import Config
+from app import db, socketio
+
+class ConversationMemory:
+    """
+    Bounded conversation context for a chat session.
+
+    Each answer gets the latest messages of the session, fetched newest first
+    with a LIMIT and trimmed to a token budget, plus the rolling summary
+    stored in ``ChatHistory.summary``. Messages that fall out of the window
+    are folded into that summary; ``ChatHistory.summarized_message_id`` marks
+    the last message folded in, so each fold only sends the summary and the
+    messages after the mark to the LLM. Folding runs in a background task
+    after each answer. The cost per message therefore stays the same however
+    long a session grows.
+    """
+
+    def __init__(self, summarize: Callable[[Optional[str], List[ChatMessage]], str],
+                 window_messages: int = None, window_tokens: int = None, fold_batch: int = None):
+        self.summarize = summarize
+        self.window_messages = window_messages or Config.CONVERSATION_WINDOW_MESSAGES
+        self.window_tokens = window_tokens or Config.CONVERSATION_WINDOW_TOKENS
+        self.fold_batch = fold_batch or Config.CONVERSATION_FOLD_BATCH
+        self.logger = logging.getLogger(__name__)
+        # Chats with a background fold running in this process
+        self._folding = set()
+        self._lock = threading.Lock()
+
+    def window(self, chat_history: ChatHistory) -> List[Dict]:
+        """Latest messages in chronological order, as chat context for the RAG engine.
+
+        The newest message is always included; older ones are added while the
+        token budget allows.
+        """
+        return [{
+            'content': message.content,
+            'is_user': message.is_user,
+            'timestamp': message.timestamp.isoformat()
+        } for message in reversed(self._window_messages(chat_history))]
+
+    def message_count(self, chat_history: ChatHistory) -> int:
+        """Number of messages in the session, including folded ones"""
+        return ChatMessage.query.filter_by(chat_history_id=chat_history.id).count()
+
+    def _window_messages(self, chat_history: ChatHistory) -> List[ChatMessage]:
+        """Messages in the window, newest first"""
+        latest = ChatMessage.query.filter_by(
+            chat_history_id=chat_history.id
+        ).order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).limit(self.window_messages).all()
+
+        kept = []
+        tokens = 0
+        for message in latest:
+            tokens += count_tokens(message.content)
+            if kept and tokens > self.window_tokens:
+                break
+            kept.append(message)
+        return kept
+
+    def unsummarized(self, chat_history: ChatHistory, limit: int = None) -> List[ChatMessage]:
+        """Latest messages after the high-water mark in chronological order, at most ``limit``"""
+        messages = ChatMessage.query.filter(
+            ChatMessage.chat_history_id == chat_history.id,
+            ChatMessage.id > (chat_history.summarized_message_id or 0)
+        ).order_by(ChatMessage.id.desc()).limit(limit or self.window_messages + self.fold_batch).all()
+        messages.reverse()
+        return messages
+
+    def fold_in_background(self, chat_history_id: int):
+        """Fold older messages of a chat in a background task, one task per chat at a time"""
+        with self._lock:
+            if chat_history_id in self._folding:
+                return
+            self._folding.add(chat_history_id)
+        socketio.start_background_task(self._fold_task, current_app._get_current_object(), chat_history_id)
+
+    def _fold_task(self, app, chat_history_id: int):
+        try:
+            with app.app_context():
+                try:
+                    # Sessions that predate the summary catch up batch by batch
+                    while True:
+                        chat_history = db.session.get(ChatHistory, chat_history_id)
+                        if not chat_history or self.fold(chat_history) < self.fold_batch:
+                            break
+                except Exception as e:
+                    db.session.rollback()
+                    self.logger.error(f"Error updating summary of chat {chat_history_id}: {str(e)}", exc_info=True)
+        finally:
+            with self._lock:
+                self._folding.discard(chat_history_id)
+
+    def fold(self, chat_history: ChatHistory) -> int:
+        """Fold messages older than the window into the session summary; returns how many.
+
+        The boundary is the oldest message ``window`` keeps, so messages
+        trimmed for the token budget are folded too. At most ``fold_batch``
+        messages are folded per call. If another process folded the same
+        messages meanwhile, nothing is stored.
+        """
+        kept = self._window_messages(chat_history)
+        if not kept:
+            return 0
+
+        mark = chat_history.summarized_message_id
+        pending = ChatMessage.query.filter(
+            ChatMessage.chat_history_id == chat_history.id,
+            ChatMessage.id > (mark or 0),
+            ChatMessage.id < kept[-1].id
+        ).order_by(ChatMessage.id).limit(self.fold_batch).all()
+        if not pending:
+            return 0
+
+        summary = self.summarize(chat_history.summary, pending)
+        if not summary:
+            return 0
+
+        # Store only if the mark hasn't moved; keeps updated_at so lists don't reorder
+        stored = ChatHistory.query.filter(
+            ChatHistory.id == chat_history.id,
+            ChatHistory.summarized_message_id == mark if mark else ChatHistory.summarized_message_id.is_(None)
+        ).update({
+            "summary": summary,
+            "summarized_message_id": pending[-1].id,
+            "updated_at": ChatHistory.updated_at
+        }, synchronize_session=False)
+        db.session.commit()
+        if not stored:
+            return 0
+        self.logger.info(f"Folded {len(pending)} messages into the summary of chat {chat_history.id}")
+        return len(pending)
@@ -1,24 +1,46 @@
 import os
+import hashlib
 import logging
+import uuid
+import shutil
 import tempfile
-from typing import List, Dict
-import PyPDF2
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, Iterator, List
+import eventlet
 import docx
 import pandas as pd
+import openpyxl
+from datetime import datetime
+from sqlalchemy import insert, update
 from werkzeug.utils import secure_filename
 from flask import current_app
 from models import Document, DocumentChunk
 from app import db
 from vector_store import VectorStore
+from ingestion_queue import IngestionQueue
+from pdf_extraction import iter_pdf_pages
+from chunking import get_chunker
+from lexical_index import LexicalIndex
 from openai_integration import OpenAIService
+from concurrency import offload_iter
+
+# Lightweight stand-in for a DocumentChunk row inserted in bulk
+ChunkRecord = namedtuple('ChunkRecord', ['id', 'chunk_index', 'chunk_text'])
+
+
+class ExtractionError(Exception):
+    """Raised when text cannot be extracted from an uploaded file."""
+
 
 class DocumentProcessor:
-    def __init__(self):
-        self.vector_store = VectorStore()
+    def __init__(self, vector_store: VectorStore = None):
+        self.vector_store = vector_store or VectorStore()
+        self.chunker = get_chunker()
+        self.lexical_index = LexicalIndex()
         self.logger = logging.getLogger(__name__)
 
     def process_uploaded_file(self, file, user_id: int) -> Dict:
-        """Process uploaded file and store in vector database"""
+        """Save uploaded file and queue it for ingestion (or process it inline)"""
         try:
             if not self._is_allowed_file(file.filename):
                 return {"success": False, "error": "File type not supported"}
@@ -28,34 +50,163 @@ class DocumentProcessor:
             if not file_info["success"]:
                 return file_info
 
-            # Create document record
-            document = self._create_document_record(file_info, user_id)
+            # Create document record, or reuse it for a new version of the file
+            document = None
+            if current_app.config.get('DOCUMENT_VERSIONING'):
+                document = self._update_document_record(file_info, user_id)
+            if not document:
+                document = self._create_document_record(file_info, user_id)
+
+            if current_app.config.get('INGESTION_ASYNC'):
+                job = IngestionQueue().enqueue(document)
+                return {
+                    "success": True,
+                    "queued": True,
+                    "document_id": document.id,
+                    "job_id": job.id,
+                    "document_name": file_info["original_filename"]
+                }
+
+            result = self.process_document(document)
+            if result["success"]:
+                result["document_name"] = file_info["original_filename"]
+            return result
+
+        except Exception as e:
+            self.logger.error(f"Document processing error: {str(e)}", exc_info=True)
+            return {"success": False, "error": str(e)}
+
+    def process_document(self, document: Document, on_stage: Callable[[str], None] = None) -> Dict:
+        """Run extraction, chunking and indexing for a saved document.
 
-            # Extract and process text
-            text = self._extract_text(file_info["file_path"], file_info["file_type"])
-            if not text:
-                return self._handle_extraction_error(document)
+        Safe to call again for the same document: chunks left over from an
+        earlier, interrupted run are removed before new ones are stored.
+        """
+        def stage(name):
+            if on_stage:
+                on_stage(name)
+
+        snapshot_path = None
+        try:
+            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], document.filename)
+            # A new version may be uploaded meanwhile, and parallel PDF
+            # extraction reopens the file per page range; all of it reads
+            # from a snapshot of the version this run started with
+            if os.path.exists(file_path):
+                snapshot_path = file_path = self._snapshot_file(file_path)
+
+            # Extraction is lazy: pages are chunked and embedded while later
+            # pages are still being extracted. In the web process it runs in
+            # real threads so sockets keep being served.
+            stage('extracting')
+            chunk_texts = offload_iter(self._iter_document_chunks(file_path, document.file_type))
 
             # Create and store chunks
-            chunks = self._process_chunks(text, document.id, user_id)
+            stage('chunking')
+            with self.vector_store.deferred_writes(document.user_id):
+                if current_app.config.get('DOCUMENT_VERSIONING') and document.chunks.first():
+                    chunks = self._sync_chunks(chunk_texts, document, on_batch=lambda: stage('chunking'))
+                else:
+                    self._clear_chunks(document)
+                    chunks = self._process_chunks(
+                        chunk_texts, document.id, document.user_id,
+                        on_batch=lambda: stage('chunking')
+                    )
+            if chunks.get("extraction_error") or (chunks["success"] and not chunks["chunks_count"]):
+                self.logger.error(f"Text extraction error: {chunks.get('error', 'no text found')}")
+                result = self._handle_extraction_error(document)
+                result["retryable"] = False
+                return result
             if not chunks["success"]:
                 return self._handle_chunking_error(document, chunks["error"])
 
             # Update document status
             document.processed = True
+            document.processing_error = None
             db.session.commit()
 
             return {
                 "success": True,
                 "document_id": document.id,
-                "chunks_count": len(chunks["chunks"]),
-                "document_name": file_info["original_filename"]
+                "chunks_count": chunks["chunks_count"]
             }
 
         except Exception as e:
+            db.session.rollback()
             self.logger.error(f"Document processing error: {str(e)}", exc_info=True)
+            return {"success": False, "error": str(e), "document_id": document.id}
+
+        finally:
+            if snapshot_path:
+                try:
+                    os.remove(snapshot_path)
+                except OSError as e:
+                    self.logger.warning(f"Could not remove file snapshot {snapshot_path}: {str(e)}")
+
+    @staticmethod
+    def _snapshot_file(file_path: str) -> str:
+        """Pin the current version of an upload under a private name.
+
+        Uploads are swapped in with os.replace, so a hard link keeps the
+        version it was taken from; a copy is made where links aren't supported.
+        The extension is kept for readers that check it (openpyxl).
+        """
+        root, extension = os.path.splitext(file_path)
+        snapshot_path = f"{root}.{uuid.uuid4().hex}.snapshot{extension}"
+        try:
+            os.link(file_path, snapshot_path)
+        except OSError:
+            shutil.copyfile(file_path, snapshot_path)
+        return snapshot_path
+
+    def delete_document(self, document: Document) -> Dict:
+        """Delete a document together with its vectors, postings, chunks and file.
+
+        The rows are deleted and committed first; if that fails nothing is
+        deleted and the user can try again. Vectors are removed afterwards,
+        and any left behind (their chunk rows are gone) are reclaimed by the
+        vector garbage collector.
+        """
+        document_id, user_id, filename = document.id, document.user_id, document.filename
+        try:
+            self.lexical_index.delete_document(document_id)
+            db.session.delete(document)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.logger.error(f"Error deleting document {document_id}: {str(e)}", exc_info=True)
             return {"success": False, "error": str(e)}
 
+        try:
+            if not self.vector_store.delete_document(document_id, user_id):
+                raise Exception("Failed to delete document from vector database")
+            db.session.commit()  # The collection version bump
+        except Exception as e:
+            db.session.rollback()
+            self.logger.warning(f"Vectors of document {document_id} left for garbage collection: {str(e)}")
+
+        # The file goes last; while the rows exist it is needed to re-index
+        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except OSError as e:
+            self.logger.warning(f"Could not remove file {file_path}: {str(e)}")
+
+        return {"success": True}
+
+    def _clear_chunks(self, document: Document):
+        """Remove chunks stored by a previous attempt to process the document"""
+        if document.chunks.first():
+            self._remove_chunks(document.id, document.user_id)
+
+    def _remove_chunks(self, document_id: int, user_id: int):
+        """Delete a document's chunks from the vector store and the database"""
+        self.vector_store.delete_document(document_id, user_id)
+        self.lexical_index.delete_document(document_id)
+        DocumentChunk.query.filter_by(document_id=document_id).delete()
+        db.session.commit()
+
     def _save_file(self, file, user_id: int) -> Dict:
         """Save uploaded file and return file info"""
         try:
@@ -64,7 +215,15 @@ class DocumentProcessor:
             filename = f"{user_id}_{secure_name}"
             file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
 
-            file.save(file_path)
+            # Write a temporary file and swap it in, so a job still reading the
+            # previous version of this file never sees a half-written one
+            temp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+            try:
+                file.save(temp_path)
+                os.replace(temp_path, file_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
 
             return {
                 "success": True,
@@ -91,42 +250,195 @@ class DocumentProcessor:
         db.session.commit()
         return document
 
-    def _process_chunks(self, text: str, document_id: int, user_id: int) -> Dict:
-        """Process text into chunks and store in vector database"""
+    def _update_document_record(self, file_info: Dict, user_id: int) -> Document:
+        """Point the user's existing document for this file at the new upload"""
+        document = Document.query.filter_by(
+            user_id=user_id,
+            filename=file_info["filename"]
+        ).order_by(Document.id.desc()).first()
+        if not document:
+            return None
+
+        document.original_filename = file_info["original_filename"]
+        document.file_type = file_info["file_type"]
+        document.file_size = file_info["file_size"]
+        document.upload_date = datetime.utcnow()
+        document.processed = False
+        document.processing_error = None
+        db.session.commit()
+        self.logger.info(f"New version of document {document.id} uploaded")
+        return document
+
+    def _process_chunks(self, chunk_texts: Iterable[str], document_id: int, user_id: int,
+                        on_batch: Callable[[], None] = None) -> Dict:
+        """Store a stream of chunks in batches in the database and vector store.
+
+        Each batch is committed once its vectors are stored, so chunking and
+        embedding keep pace with extraction instead of waiting for the whole
+        document. If anything fails, chunks stored so far are removed again.
+        """
+        batch_size = current_app.config['CHUNK_BATCH_SIZE']
+        chunks_count = 0
+        batch = []
+
         try:
-            # Create chunks
-            chunks = self._create_chunks(text)
-            chunk_objects = []
-
-            # Create chunk records
-            for i, chunk_text in enumerate(chunks):
-                chunk = DocumentChunk(
-                    document_id=document_id,
-                    chunk_text=chunk_text,
-                    chunk_index=i
-                )
-                db.session.add(chunk)
-                chunk_objects.append(chunk)
-
-            db.session.flush()
-
-            # Prepare metadata for vector store
-            metadata_list = [{
-                "chunk_id": chunk.id,
-                "document_id": document_id,
-                "chunk_index": chunk.chunk_index
-            } for chunk in chunk_objects]
+            for chunk_text in chunk_texts:
+                batch.append((chunks_count, chunk_text))
+                chunks_count += 1
+                if len(batch) >= batch_size:
+                    self._store_chunk_batch(batch, document_id, user_id)
+                    batch = []
+                    if on_batch:
+                        on_batch()
+
+            if batch:
+                self._store_chunk_batch(batch, document_id, user_id)
 
-            # Store in vector database
-            if not self.vector_store.add_document_chunks(chunk_objects, metadata_list, user_id):
-                raise Exception("Failed to store chunks in vector database")
+            return {"success": True, "chunks_count": chunks_count}
 
+        except Exception as e:
+            db.session.rollback()
+            try:
+                self._remove_chunks(document_id, user_id)
+            except Exception as cleanup_error:
+                db.session.rollback()
+                self.logger.error(f"Failed to clean up partial chunks: {str(cleanup_error)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "extraction_error": isinstance(e, ExtractionError)
+            }
+
+    def _sync_chunks(self, chunk_texts: Iterable[str], document: Document,
+                     on_batch: Callable[[], None] = None) -> Dict:
+        """Bring the stored chunks of a re-uploaded document in line with its new content.
+
+        New chunks are matched to stored ones by content hash. Unchanged chunks
+        keep their rows and vectors (only their position is updated), new ones
+        are embedded and stored in batches, and chunks that no longer occur are
+        deleted from all indexes at the end. Until then the previous version
+        stays searchable; an interrupted run is finished by running it again.
+        """
+        batch_size = current_app.config['CHUNK_BATCH_SIZE']
+        stored = {}
+        for chunk_id, chunk_index, chunk_text in db.session.query(
+            DocumentChunk.id, DocumentChunk.chunk_index, DocumentChunk.chunk_text
+        ).filter(DocumentChunk.document_id == document.id).order_by(DocumentChunk.chunk_index).yield_per(1000):
+            stored.setdefault(self._chunk_hash(chunk_text), []).append((chunk_id, chunk_index))
+
+        chunks_count = reused = added = 0
+        batch, moved = [], []
+
+        try:
+            for chunk_text in chunk_texts:
+                chunk_hash = self._chunk_hash(chunk_text)
+                if stored.get(chunk_hash):
+                    chunk_id, chunk_index = stored[chunk_hash].pop(0)
+                    if chunk_index != chunks_count:
+                        moved.append({"id": chunk_id, "chunk_index": chunks_count})
+                    reused += 1
+                else:
+                    batch.append((chunks_count, chunk_text))
+                chunks_count += 1
+
+                if len(batch) >= batch_size:
+                    self._store_chunk_batch(batch, document.id, document.user_id)
+                    added += len(batch)
+                    batch = []
+                    if on_batch:
+                        on_batch()
+
+            if batch:
+                self._store_chunk_batch(batch, document.id, document.user_id)
+                added += len(batch)
+
+            removed = [chunk_id for matches in stored.values() for chunk_id, _ in matches]
+            self._move_chunks(moved, document.id, document.user_id)
+            self._delete_chunks(removed, document.user_id)
             db.session.commit()
-            return {"success": True, "chunks": chunk_objects}
+
+            self.logger.info(
+                f"Document {document.id} updated: {reused} chunks reused, {added} added, {len(removed)} removed"
+            )
+            return {"success": True, "chunks_count": chunks_count}
 
         except Exception as e:
+            # Chunks of both versions are kept; a retry reconciles them
             db.session.rollback()
-            return {"success": False, "error": str(e)}
+            return {
+                "success": False,
+                "error": str(e),
+                "extraction_error": isinstance(e, ExtractionError)
+            }
+
+    @staticmethod
+    def _chunk_hash(chunk_text: str) -> str:
+        return hashlib.sha256(chunk_text.encode("utf-8")).hexdigest()
+
+    def _move_chunks(self, moved: List[Dict], document_id: int, user_id: int):
+        """Update positions of reused chunks in the database and vector store"""
+        if not moved:
+            return
+        for start in range(0, len(moved), 500):
+            db.session.execute(update(DocumentChunk), moved[start:start + 500])
+
+        metadata_list = [{
+            "chunk_id": chunk["id"],
+            "document_id": document_id,
+            "chunk_index": chunk["chunk_index"]
+        } for chunk in moved]
+        if not self.vector_store.update_chunk_metadata(metadata_list, user_id):
+            raise Exception("Failed to update chunks in vector database")
+
+    def _delete_chunks(self, chunk_ids: List[int], user_id: int):
+        """Delete individual chunks from the vector store and, in the current transaction, the database"""
+        if not chunk_ids:
+            return
+        if not self.vector_store.delete_chunks(chunk_ids, user_id):
+            raise Exception("Failed to delete chunks from vector database")
+        self.lexical_index.delete_chunks(chunk_ids)
+        for start in range(0, len(chunk_ids), 500):
+            DocumentChunk.query.filter(
+                DocumentChunk.id.in_(chunk_ids[start:start + 500])
+            ).delete(synchronize_session=False)
+
+    def _store_chunk_batch(self, batch: List[tuple], document_id: int, user_id: int):
+        """Bulk insert a batch of (chunk_index, chunk_text) pairs and add them to the vector store.
+
+        Rows are written with a single multi-row INSERT ... RETURNING, which
+        yields ids in parameter order without building ORM objects. The vector
+        insert happens before the commit; if either fails the caller rolls back
+        and removes the document's vectors, so both stores stay in step.
+        """
+        chunk_ids = db.session.scalars(
+            insert(DocumentChunk).returning(DocumentChunk.id, sort_by_parameter_order=True),
+            [{
+                "document_id": document_id,
+                "chunk_index": chunk_index,
+                "chunk_text": chunk_text
+            } for chunk_index, chunk_text in batch]
+        ).all()
+
+        chunk_records = [
+            ChunkRecord(id=chunk_id, chunk_index=chunk_index, chunk_text=chunk_text)
+            for chunk_id, (chunk_index, chunk_text) in zip(chunk_ids, batch)
+        ]
+
+        # Prepare metadata for vector store
+        metadata_list = [{
+            "chunk_id": chunk.id,
+            "document_id": document_id,
+            "chunk_index": chunk.chunk_index
+        } for chunk in chunk_records]
+
+        # Index terms for lexical (BM25) retrieval in the same transaction
+        self.lexical_index.add_chunks(user_id, document_id, chunk_records)
+
+        # Store in vector database
+        if not self.vector_store.add_document_chunks(chunk_records, metadata_list, user_id):
+            raise Exception("Failed to store chunks in vector database")
+
+        db.session.commit()
 
     def _is_allowed_file(self, filename: str) -> bool:
         """Check if file type is allowed"""
@@ -154,10 +466,48 @@ class DocumentProcessor:
             self.logger.error(f"Text extraction error: {str(e)}")
             return None
 
+    def _iter_document_chunks(self, file_path: str, file_type: str) -> Iterator[str]:
+        """Yield the chunks of a document as extraction progresses"""
+        if file_type in ('xlsx', 'csv'):
+            # Row groups are already sized as chunks and carry their own header
+            try:
+                yield from self._iter_spreadsheet_row_groups(file_path, file_type)
+            except Exception as e:
+                raise ExtractionError(str(e)) from e
+            return
+
+        yield from self._iter_chunks(self._iter_text(file_path, file_type))
+
+    def _iter_text(self, file_path: str, file_type: str) -> Iterator[str]:
+        """Yield document text in segments (pages for PDFs) as it is extracted"""
+        try:
+            if file_type == 'pdf':
+                yield from self._iter_pdf_pages(file_path)
+                return
+
+            text = self._extract_text(file_path, file_type)
+            if text is None:
+                raise ExtractionError(f"Failed to extract text from {file_type} file")
+            yield text
+
+        except ExtractionError:
+            raise
+        except Exception as e:
+            raise ExtractionError(str(e)) from e
+
+    def _iter_pdf_pages(self, file_path: str) -> Iterator[str]:
+        # Process pools don't mix with eventlet's green threads, so fan out
+        # only in the (unpatched) ingestion worker processes
+        workers = 1 if eventlet.patcher.is_monkey_patched('thread') else current_app.config['PDF_EXTRACTION_WORKERS']
+        return iter_pdf_pages(
+            file_path,
+            workers=workers,
+            pages_per_task=current_app.config['PDF_PAGES_PER_TASK'],
+            parallel_min_pages=current_app.config['PDF_PARALLEL_MIN_PAGES']
+        )
+
     def _extract_from_pdf(self, file_path: str) -> str:
-        with open(file_path, 'rb') as f:
-            reader = PyPDF2.PdfReader(f)
-            return "\n".join(page.extract_text() for page in reader.pages)
+        return "\n".join(self._iter_pdf_pages(file_path))
 
     def _extract_from_txt(self, file_path: str) -> str:
         with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
@@ -168,36 +518,91 @@ class DocumentProcessor:
         return "\n".join(para.text for para in doc.paragraphs)
 
     def _extract_from_spreadsheet(self, file_path: str, file_type: str) -> str:
-        df = pd.read_excel(file_path) if file_type == 'xlsx' else pd.read_csv(file_path)
-        return df.to_string(index=False)
-
-    def _create_chunks(self, text: str, chunk_size: int = 1000) -> List[str]:
-        """Create chunks from text using smart splitting"""
-        import re
-
-        def split_into_sentences(text):
-            return re.split(r'(?<=[.!?])\s+', text)
-
-        sentences = split_into_sentences(text)
-        chunks = []
-        current_chunk = []
-        current_size = 0
-
-        for sentence in sentences:
-            sentence_size = len(sentence)
-
-            if current_size + sentence_size > chunk_size and current_chunk:
-                chunks.append(" ".join(current_chunk))
-                current_chunk = []
-                current_size = 0
-
-            current_chunk.append(sentence)
-            current_size += sentence_size + 1
-
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
-
-        return chunks
+        return "\n\n".join(self._iter_spreadsheet_row_groups(file_path, file_type))
+
+    def _iter_spreadsheet_row_groups(self, file_path: str, file_type: str, chunk_size: int = 1000) -> Iterator[str]:
+        """Yield groups of rows, each prefixed with the header row, of up to ``chunk_size`` characters.
+
+        Rows are streamed (csv in chunks, xlsx in read-only mode), so memory
+        stays bounded regardless of file size. A row too long for one group
+        is split between cells into several, each with the header again.
+        """
+        rows = self._iter_csv_rows(file_path) if file_type == 'csv' else self._iter_xlsx_rows(file_path)
+        header = next(rows, None)
+        if header is None:
+            return
+        header_line = " | ".join(header)
+        # Room for rows beside the header; a very wide header still leaves some
+        row_limit = max(chunk_size - len(header_line) - 1, chunk_size // 2)
+
+        group, group_size = [], len(header_line)
+        for row in rows:
+            for line in self._split_row(row, row_limit):
+                if group and group_size + len(line) + 1 > chunk_size:
+                    yield "\n".join([header_line] + group)
+                    group, group_size = [], len(header_line)
+                group.append(line)
+                group_size += len(line) + 1
+
+        if group:
+            yield "\n".join([header_line] + group)
+
+    @staticmethod
+    def _split_row(row: List[str], limit: int) -> Iterator[str]:
+        """Join a row's cells into lines of up to ``limit`` characters, cutting only cells longer than that"""
+        line = " | ".join(row)
+        if len(line) <= limit:
+            yield line
+            return
+
+        cells, size = [], 0
+        for cell in row:
+            for start in range(0, max(len(cell), 1), limit):
+                piece = cell[start:start + limit]
+                if cells and size + len(piece) + 3 > limit:
+                    yield " | ".join(cells)
+                    cells, size = [], 0
+                size += len(piece) + (3 if cells else 0)
+                cells.append(piece)
+        if cells:
+            yield " | ".join(cells)
+
+    def _iter_csv_rows(self, file_path: str) -> Iterator[List[str]]:
+        """Yield the header and then each non-empty row of a CSV file as strings"""
+        reader = pd.read_csv(
+            file_path,
+            dtype=str,
+            keep_default_na=False,
+            chunksize=current_app.config['SPREADSHEET_ROWS_PER_READ']
+        )
+        header_sent = False
+        for frame in reader:
+            if not header_sent:
+                yield [str(column) for column in frame.columns]
+                header_sent = True
+            for row in frame.itertuples(index=False, name=None):
+                if any(value.strip() for value in row):
+                    yield [value.strip() for value in row]
+
+    def _iter_xlsx_rows(self, file_path: str) -> Iterator[List[str]]:
+        """Yield the header and then each non-empty row of the first worksheet as strings"""
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            sheet = workbook.worksheets[0]
+            for row in sheet.iter_rows(values_only=True):
+                values = ["" if value is None else str(value).strip() for value in row]
+                if any(values):
+                    yield values
+        finally:
+            workbook.close()
+
+    def _create_chunks(self, text: str) -> List[str]:
+        """Create chunks from text using the configured chunker"""
+        return self.chunker.split(text)
+
+    def _iter_chunks(self, segments: Iterable[str]) -> Iterator[str]:
+        """Chunk a stream of text segments as they are extracted"""
+        return self.chunker.iter_chunks(segments)
 
     def _handle_extraction_error(self, document: Document) -> Dict:
         """Handle text extraction error"""
@@ -0,0 +1,166 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+from typing import List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from config import Config
+from concurrency import offload
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed cache of embedding vectors.
+
+    Entries are keyed by a hash of the model name plus the normalized text and
+    stored as float32 blobs in a SQLite file next to the vector database. When
+    the cache grows past its byte budget, the least recently used entries are
+    evicted. SQLite runs in WAL mode, so web and ingestion worker processes can
+    share the same file.
+    """
+
+    def __init__(self, path=None, max_bytes=None):
+        self.path = path or Config.EMBEDDING_CACHE_PATH
+        self.max_bytes = max_bytes or Config.EMBEDDING_CACHE_MAX_BYTES
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache_stats (id INTEGER PRIMARY KEY CHECK (id = 1), total_bytes INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO cache_stats (id, total_bytes) VALUES (1, 0)")
+
+    @staticmethod
+    def normalize(text) -> str:
+        """Normalize text so trivially different copies share a cache entry"""
+        return re.sub(r'\s+', ' ', str(text or "")).strip()
+
+    @classmethod
+    def make_key(cls, model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\n{cls.normalize(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up cached vectors; returns None for each text that is not cached"""
+        # sqlite3 blocks (up to its 30 s busy timeout) without yielding to eventlet
+        return offload(self._get_many, model, texts)
+
+    def _get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        keys = [self.make_key(model, text) for text in texts]
+        found = {}
+        try:
+            with self._connect() as conn:
+                unique_keys = list(dict.fromkeys(keys))
+                for start in range(0, len(unique_keys), 500):  # Stay under SQLite's variable limit
+                    batch = unique_keys[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                    ).fetchall()
+                    found.update((key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows)
+
+                if found:
+                    now = time.time()
+                    conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(now, key) for key in found]
+                    )
+        except sqlite3.Error as e:
+            logger.error(f"Embedding cache lookup failed: {str(e)}")
+
+        return [found.get(key) for key in keys]
+
+    def put_many(self, model: str, texts: List[str], vectors):
+        """Store vectors for texts and evict old entries if over budget"""
+        offload(self._put_many, model, texts, vectors)
+
+    def _put_many(self, model: str, texts: List[str], vectors):
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((self.make_key(model, text), model, len(blob) // 4, blob, now))
+
+        try:
+            with self._connect() as conn:
+                added_bytes = 0
+                for row in rows:
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO embeddings (key, model, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                        row
+                    )
+                    if cursor.rowcount:
+                        added_bytes += len(row[3])
+                conn.execute("UPDATE cache_stats SET total_bytes = total_bytes + ? WHERE id = 1", (added_bytes,))
+                self._evict(conn, rows[0][2] * 4 if rows else 0)
+        except sqlite3.Error as e:
+            logger.error(f"Embedding cache store failed: {str(e)}")
+
+    def _evict(self, conn, entry_bytes: int):
+        """Drop least recently used entries until the cache is back under 90% of its budget"""
+        total_bytes = conn.execute("SELECT total_bytes FROM cache_stats WHERE id = 1").fetchone()[0]
+        if total_bytes <= self.max_bytes or not entry_bytes:
+            return
+
+        excess_entries = (total_bytes - int(self.max_bytes * 0.9)) // entry_bytes + 1
+        freed = conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM (SELECT vector FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess_entries,)
+        ).fetchone()[0]
+        conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess_entries,)
+        )
+        conn.execute("UPDATE cache_stats SET total_bytes = MAX(total_bytes - ?, 0) WHERE id = 1", (freed,))
+        logger.info(f"Evicted {excess_entries} entries from the embedding cache")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain embeddings wrapper that consults the embedding cache before calling the API."""
+
+    def __init__(self, embeddings: Embeddings, model: str, cache: EmbeddingCache = None):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache or EmbeddingCache()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.get_many(self.model, texts)
+
+        # Embed each distinct missing text once, even if it repeats within the batch
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(EmbeddingCache.normalize(texts[i]), []).append(i)
+
+        if missing:
+            pending = [texts[indexes[0]] for indexes in missing.values()]
+            new_vectors = self.embeddings.embed_documents(pending)
+            self.cache.put_many(self.model, pending, new_vectors)
+            for indexes, vector in zip(missing.values(), new_vectors):
+                for i in indexes:
+                    vectors[i] = vector
+
+        logger.debug(f"Embedding cache: {len(texts) - sum(len(i) for i in missing.values())}/{len(texts)} hits")
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get_many(self.model, [text])[0]
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put_many(self.model, [text], [vector])
+        return np.asarray(vector, dtype=np.float32).tolist()
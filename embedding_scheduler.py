@@ -0,0 +1,226 @@
+import re
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from openai import OpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+from langchain_core.embeddings import Embeddings
+from config import Config
+from chunking import count_tokens, truncate_tokens
+from http_pool import get_http_client
+
+logger = logging.getLogger(__name__)
+
+# Per-input limit of the OpenAI embedding models
+MAX_INPUT_TOKENS = 8191
+
+
+def requested_dimensions() -> Optional[int]:
+    """The ``dimensions`` to request from the API, or None for the model's full size"""
+    if Config.EMBEDDING_REQUEST_DIMENSIONS < Config.EMBEDDINGS_DIMENSION:
+        return Config.EMBEDDING_REQUEST_DIMENSIONS
+    return None
+
+
+def embedding_id(model: str) -> str:
+    """Name vectors are cached under: the model, plus the size if shortened"""
+    dimensions = requested_dimensions()
+    return f"{model}@{dimensions}" if dimensions else model
+
+
+def collection_suffix() -> str:
+    """Suffix of vector collection names; vectors of different sizes can't share one"""
+    dimensions = requested_dimensions()
+    return f"_{dimensions}d" if dimensions else ""
+
+
+def _parse_duration(value: str) -> float:
+    """Parse OpenAI reset headers such as '1s', '250ms' or '6m0s' into seconds"""
+    if not value:
+        return 0.0
+    seconds = 0.0
+    for amount, unit in re.findall(r'([\d.]+)(ms|s|m|h)', value):
+        seconds += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return seconds
+
+
+class RateLimitState:
+    """Tracks the token budget reported by OpenAI rate-limit headers and the allowed concurrency."""
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.in_flight = 0
+        self.remaining_tokens = None
+        self.reset_at = 0.0
+        self.successes = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, tokens: int):
+        """Block until a request slot is free and the token budget allows the batch"""
+        with self.condition:
+            while self.in_flight >= self.concurrency:
+                self.condition.wait()
+            self.in_flight += 1
+            wait = 0.0
+            if self.remaining_tokens is not None and tokens > self.remaining_tokens:
+                wait = max(0.0, self.reset_at - time.monotonic())
+            if self.remaining_tokens is not None:
+                self.remaining_tokens -= tokens
+        if wait:
+            logger.info(f"Embedding token budget exhausted, waiting {wait:.1f}s")
+            time.sleep(wait)
+
+    def release(self, headers=None, throttled=False):
+        """Free a request slot and adapt to the latest rate-limit information"""
+        with self.condition:
+            self.in_flight -= 1
+            if headers is not None:
+                remaining = headers.get("x-ratelimit-remaining-tokens")
+                if remaining is not None:
+                    self.remaining_tokens = int(remaining)
+                    self.reset_at = time.monotonic() + _parse_duration(headers.get("x-ratelimit-reset-tokens"))
+            if throttled:
+                # Back off multiplicatively, recover additively
+                self.concurrency = max(1, self.concurrency // 2)
+                self.successes = 0
+            else:
+                self.successes += 1
+                if self.concurrency < self.max_concurrency and self.successes >= self.concurrency:
+                    self.concurrency += 1
+                    self.successes = 0
+            self.condition.notify_all()
+
+
+class EmbeddingScheduler(Embeddings):
+    """
+    Embeds large sets of texts in token-budgeted batches with bounded concurrency.
+
+    Batches are sized by token count rather than item count, run through a small
+    thread pool, and throttled using the x-ratelimit-* headers OpenAI returns.
+    429 responses halve the concurrency and are retried after the advertised
+    delay. The rate-limit state lives as long as the scheduler, so every call
+    (and concurrent callers) start from the budget and concurrency learned so
+    far instead of hitting the limit again. Statistics of the last run are
+    kept in ``last_stats``.
+    """
+
+    def __init__(self, model: str = None, client: OpenAI = None, batch_tokens: int = None,
+                 max_batch_size: int = None, concurrency: int = None, max_retries: int = None,
+                 dimensions: int = None):
+        self.model = model or Config.EMBEDDING_MODEL
+        self.dimensions = dimensions or requested_dimensions()
+        # Retries are handled here so that rate limits feed back into scheduling
+        self.client = client or OpenAI(max_retries=0, timeout=120.0, http_client=get_http_client())
+        self.batch_tokens = batch_tokens or Config.EMBEDDING_BATCH_TOKENS
+        self.max_batch_size = max_batch_size or Config.EMBEDDING_MAX_BATCH_SIZE
+        self.concurrency = concurrency or Config.EMBEDDING_CONCURRENCY
+        self.max_retries = max_retries if max_retries is not None else Config.EMBEDDING_MAX_RETRIES
+        self.rate_limit = RateLimitState(self.concurrency)
+        self.last_stats: Dict = {}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        started = time.monotonic()
+        inputs, token_counts = self._prepare_inputs(texts)
+        batches = self._make_batches(token_counts)
+        retries = [0]
+
+        def run(batch):
+            return self._embed_batch([inputs[i] for i in batch], sum(token_counts[i] for i in batch), retries)
+
+        vectors: List[List[float]] = [None] * len(texts)
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as executor:
+            for batch, batch_vectors in zip(batches, executor.map(run, batches)):
+                for i, vector in zip(batch, batch_vectors):
+                    vectors[i] = vector
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.last_stats = {
+            "chunks": len(texts),
+            "tokens": sum(token_counts),
+            "batches": len(batches),
+            "retries": retries[0],
+            "seconds": round(elapsed, 3),
+            "chunks_per_second": round(len(texts) / elapsed, 2)
+        }
+        logger.info(
+            f"Embedded {len(texts)} chunks in {elapsed:.2f}s "
+            f"({self.last_stats['chunks_per_second']} chunks/s, {len(batches)} batches, {retries[0]} retries)"
+        )
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def _prepare_inputs(self, texts: List[str]):
+        """Count tokens and truncate inputs the API would reject"""
+        inputs, token_counts = [], []
+        for text in texts:
+            text = text or " "
+            tokens = count_tokens(text)
+            if tokens > MAX_INPUT_TOKENS:
+                logger.warning(f"Truncating embedding input of {tokens} tokens to {MAX_INPUT_TOKENS}")
+                text = truncate_tokens(text, MAX_INPUT_TOKENS)
+                tokens = MAX_INPUT_TOKENS
+            inputs.append(text)
+            token_counts.append(tokens)
+        return inputs, token_counts
+
+    def _make_batches(self, token_counts: List[int]) -> List[List[int]]:
+        """Group input indexes into batches under the token and size budgets"""
+        batches, current, current_tokens = [], [], 0
+        for i, tokens in enumerate(token_counts):
+            if current and (current_tokens + tokens > self.batch_tokens or len(current) >= self.max_batch_size):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, inputs: List[str], tokens: int, retries: List[int]) -> List[List[float]]:
+        state = self.rate_limit
+        for attempt in range(self.max_retries + 1):
+            state.acquire(tokens)
+            try:
+                raw = self.client.embeddings.with_raw_response.create(
+                    input=inputs,
+                    model=self.model,
+                    encoding_format="float",
+                    **({"dimensions": self.dimensions} if self.dimensions else {})
+                )
+            except RateLimitError as e:
+                state.release(e.response.headers, throttled=True)
+                delay = _parse_duration(e.response.headers.get("retry-after-ms", "") + "ms") \
+                    or float(e.response.headers.get("retry-after") or 0) \
+                    or 2 ** attempt
+                self._record_retry(retries, attempt, delay, "rate limited")
+                time.sleep(delay + random.uniform(0, 0.5))
+                continue
+            except (APIConnectionError, APITimeoutError, InternalServerError) as e:
+                state.release()
+                if attempt == self.max_retries:
+                    raise
+                delay = 2 ** attempt
+                self._record_retry(retries, attempt, delay, str(e))
+                time.sleep(delay + random.uniform(0, 0.5))
+                continue
+            except Exception:
+                state.release()
+                raise
+
+            state.release(raw.headers)
+            response = raw.parse()
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+        raise RuntimeError(f"Embedding batch still rate limited after {self.max_retries} retries")
+
+    def _record_retry(self, retries: List[int], attempt: int, delay: float, reason: str):
+        retries[0] += 1
+        logger.warning(f"Embedding batch attempt {attempt + 1} failed ({reason}), retrying in {delay:.1f}s")
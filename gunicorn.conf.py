@@ -1,5 +1,36 @@
 # Gunicorn configuration
+import os
+import sys
+import subprocess
+
 worker_class = "eventlet"
-workers = 1
-bind = "0.0.0.0:5000"
-reload = True
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+reload = os.environ.get("GUNICORN_RELOAD", "true").lower() == "true"
+
+# Scaling out: Socket.IO's long-polling transport needs every request of a
+# session to reach the same worker, and gunicorn's own balancing isn't sticky.
+# Keep one worker per gunicorn instance and run several instances (PORT=5001,
+# 5002, ...) behind a load balancer with sticky sessions, e.g. nginx:
+#
+#     upstream app { ip_hash; server 127.0.0.1:5001; server 127.0.0.1:5002; }
+#
+# and set SOCKETIO_MESSAGE_QUEUE (e.g. redis://localhost:6379/0) so events
+# reach clients connected to other instances. More than one worker per
+# instance only works when clients use the websocket transport exclusively.
+# With several writers, also point CHROMA_HOST at a Chroma server or use
+# VECTOR_BACKEND=faiss, whose index files are safe to share between processes.
+workers = int(os.environ.get("GUNICORN_WORKERS", "1"))
+
+# Uploads are queued for the background ingestion worker (INGESTION_ASYNC), so
+# start one next to the server; deployments that run the worker separately set
+# START_INGESTION_WORKER=false. Several workers may share the queue.
+def on_starting(server):
+    if os.environ.get("START_INGESTION_WORKER", "true").lower() == "true":
+        server.ingestion_worker = subprocess.Popen([sys.executable, "-u", "ingestion_worker.py"])
+        server.log.info(f"Started ingestion worker (pid {server.ingestion_worker.pid})")
+
+def on_exit(server):
+    worker = getattr(server, "ingestion_worker", None)
+    if worker and worker.poll() is None:
+        worker.terminate()
+        worker.wait(timeout=30)
@@ -0,0 +1,33 @@
+import threading
+import httpx
+from config import Config
+
+# One connection pool per process for every synchronous OpenAI client
+# (OpenAIService, the embedding scheduler and LangChain's ChatOpenAI)
+_http_client = None
+_lock = threading.Lock()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=Config.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=Config.OPENAI_MAX_KEEPALIVE_CONNECTIONS
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(Config.OPENAI_TIMEOUT, connect=10.0)
+
+
+def get_http_client() -> httpx.Client:
+    """Get the process-wide pooled HTTP client for OpenAI requests"""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(limits=_limits(), timeout=_timeout())
+        return _http_client
+
+
+def new_async_http_client() -> httpx.AsyncClient:
+    """Create a pooled async HTTP client; async pools are bound to one event loop"""
+    return httpx.AsyncClient(limits=_limits(), timeout=_timeout())
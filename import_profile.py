@@ -0,0 +1,49 @@
+import os
+import re
+import sys
+import subprocess
+from typing import Dict
+
+# Line format of ``python -X importtime``:
+# "import time:       412 |       1520 |   langchain_core.documents"
+_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def profile_imports(code: str = "import main", cwd: str = None) -> Dict:
+    """
+    Run ``code`` in a fresh interpreter with ``-X importtime`` and summarize.
+
+    Returns the total import time and, per module, its own and cumulative
+    time in milliseconds plus its nesting depth (0 for imports made directly
+    by ``code``). A fresh process is needed because modules import only once.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd or os.getcwd(),
+        capture_output=True,
+        text=True
+    )
+
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        modules.append({
+            "module": name,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+            "depth": (len(indent) - 1) // 2
+        })
+
+    error = None
+    if result.returncode != 0:
+        error = (result.stderr.strip().splitlines() or ["Import failed"])[-1]
+
+    return {
+        "success": error is None,
+        "error": error,
+        "total_ms": sum(module["cumulative_ms"] for module in modules if module["depth"] == 0),
+        "modules": modules
+    }
@@ -0,0 +1,165 @@
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+from flask import current_app
+from sqlalchemy import and_, exists, or_
+from sqlalchemy.orm import aliased
+from models import Document, IngestionJob
+from app import db
+
+class IngestionQueue:
+    """Database-backed job queue for background document ingestion.
+
+    Jobs live in the ``ingestion_job`` table, so they survive restarts. A worker
+    claims a job with ``SELECT ... FOR UPDATE SKIP LOCKED`` and holds a lease on
+    it; jobs whose lease expired (worker crashed or was restarted) are picked up
+    again. Processing a document is idempotent, so a retried job simply redoes
+    the stages that did not finish.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    def enqueue(self, document: Document) -> IngestionJob:
+        """Queue a document for ingestion, reusing a pending job if one exists.
+
+        A running job is not reused: it may be indexing the previous version of
+        a re-uploaded file, so the new version gets its own job, which waits
+        until the running one finishes.
+        """
+        job = IngestionJob.query.filter(
+            IngestionJob.document_id == document.id,
+            IngestionJob.status == 'pending'
+        ).first()
+        if job:
+            return job
+
+        job = IngestionJob(
+            document_id=document.id,
+            user_id=document.user_id,
+            status='pending',
+            stage='queued',
+            run_after=datetime.utcnow()
+        )
+        db.session.add(job)
+        db.session.commit()
+        self.logger.info(f"Queued ingestion job {job.id} for document {document.id}")
+        return job
+
+    def claim_next(self) -> Optional[IngestionJob]:
+        """Claim the next runnable job, including jobs with an expired lease"""
+        now = datetime.utcnow()
+        # One job per document at a time; a pending job waits for a running one
+        running = aliased(IngestionJob)
+        document_busy = exists().where(
+            running.document_id == IngestionJob.document_id,
+            running.status == 'running',
+            running.lease_expires_at >= now
+        )
+        job = IngestionJob.query.filter(
+            or_(
+                and_(IngestionJob.status == 'pending', IngestionJob.run_after <= now, ~document_busy),
+                and_(IngestionJob.status == 'running', IngestionJob.lease_expires_at < now)
+            )
+        ).order_by(IngestionJob.id).with_for_update(skip_locked=True).first()
+
+        if not job:
+            db.session.commit()  # End the transaction opened by the poll
+            return None
+
+        if job.status == 'running':
+            self.logger.warning(f"Reclaiming ingestion job {job.id} after expired lease")
+            if job.attempts >= current_app.config['INGESTION_MAX_ATTEMPTS']:
+                self._mark_failed(job, job.error or "Worker stopped while processing the document")
+                db.session.commit()
+                return None
+
+        job.status = 'running'
+        job.attempts += 1
+        job.lease_expires_at = now + timedelta(seconds=current_app.config['INGESTION_LEASE_SECONDS'])
+        db.session.commit()
+        return job
+
+    def run_job(self, job: IngestionJob, document_processor) -> Dict:
+        """Run all ingestion stages for a claimed job and record the outcome"""
+        document = Document.query.get(job.document_id)
+        if not document:
+            self._mark_failed(job, "Document no longer exists")
+            db.session.commit()
+            return {"success": False, "error": job.error}
+
+        result = document_processor.process_document(
+            document,
+            on_stage=lambda stage: self._heartbeat(job, stage)
+        )
+
+        if result["success"]:
+            job.status = 'completed'
+            job.stage = 'completed'
+            job.error = None
+            job.lease_expires_at = None
+        elif result.get("retryable", True) and job.attempts < current_app.config['INGESTION_MAX_ATTEMPTS']:
+            delay = current_app.config['INGESTION_RETRY_DELAY_SECONDS'] * 2 ** (job.attempts - 1)
+            job.status = 'pending'
+            job.error = result.get("error")
+            job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+            job.lease_expires_at = None
+            self.logger.warning(f"Ingestion job {job.id} failed, retrying in {delay}s: {job.error}")
+        else:
+            self._mark_failed(job, result.get("error"))
+
+        db.session.commit()
+        return result
+
+    def work(self, document_processor, max_jobs: int = None, on_idle: Callable[[], None] = None):
+        """Process jobs until interrupted (or until ``max_jobs`` have run).
+
+        ``on_idle`` is called whenever the queue is empty, for maintenance tasks.
+        """
+        poll_interval = current_app.config['INGESTION_POLL_INTERVAL']
+        processed = 0
+        self.logger.info("Ingestion worker started")
+
+        while max_jobs is None or processed < max_jobs:
+            try:
+                job = self.claim_next()
+            except Exception as e:
+                db.session.rollback()
+                self.logger.error(f"Error polling ingestion queue: {str(e)}", exc_info=True)
+                time.sleep(poll_interval)
+                continue
+
+            if not job:
+                if on_idle:
+                    try:
+                        on_idle()
+                    except Exception as e:
+                        db.session.rollback()
+                        self.logger.error(f"Idle task failed: {str(e)}", exc_info=True)
+                time.sleep(poll_interval)
+                continue
+
+            try:
+                self.run_job(job, document_processor)
+            except Exception as e:
+                db.session.rollback()
+                self.logger.error(f"Ingestion job {job.id} crashed: {str(e)}", exc_info=True)
+                # Leave the job running; its lease expires and it is retried
+            processed += 1
+
+    def _heartbeat(self, job: IngestionJob, stage: str):
+        """Record stage progress and extend the lease"""
+        job.stage = stage
+        job.lease_expires_at = datetime.utcnow() + timedelta(seconds=current_app.config['INGESTION_LEASE_SECONDS'])
+        db.session.commit()
+
+    def _mark_failed(self, job: IngestionJob, error: str):
+        job.status = 'failed'
+        job.error = error
+        job.lease_expires_at = None
+        # Surface the failure on the document, as the processing error paths do
+        document = Document.query.get(job.document_id)
+        if document and not document.processed:
+            document.processing_error = error or "Document processing failed"
+        self.logger.error(f"Ingestion job {job.id} failed permanently: {error}")
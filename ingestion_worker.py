@@ -0,0 +1,50 @@
+# Background ingestion worker
+# Usage: python ingestion_worker.py [--processes N]
+# Heavy imports happen inside run_worker() so spawned child processes start clean.
+import os
+import argparse
+import logging
+import multiprocessing
+
+# Workers serve no sockets; keep real threads so PDF extraction can use a process pool
+os.environ.setdefault("DISABLE_EVENTLET_MONKEY_PATCH", "1")
+
+logger = logging.getLogger(__name__)
+
+def run_worker(max_jobs=None):
+    """Process ingestion jobs in this process until interrupted."""
+    from app import app
+    from ingestion_queue import IngestionQueue
+    from services import get_document_processor
+    from vector_gc import VectorGarbageCollector
+
+    with app.app_context():
+        document_processor = get_document_processor()
+        garbage_collector = VectorGarbageCollector(document_processor.vector_store)
+        IngestionQueue().work(document_processor, max_jobs=max_jobs, on_idle=garbage_collector.run_if_due)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background document ingestion workers")
+    parser.add_argument("--processes", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--max-jobs", type=int, default=None, help="Exit after this many jobs (per process)")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_worker(args.max_jobs)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=run_worker, args=(args.max_jobs,), name=f"ingestion-worker-{i}")
+        for i in range(args.processes)
+    ]
+    for worker in workers:
+        worker.start()
+    logger.info(f"Started {len(workers)} ingestion worker processes")
+
+    for worker in workers:
+        worker.join()
+
+# For direct execution with python
+if __name__ == "__main__":
+    main()
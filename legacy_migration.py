@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import logging
+import numpy as np
+from typing import Dict, List
+from models import Document, DocumentChunk
+from config import Config
+from app import db
+
+class LegacyMigrationError(Exception):
+    """Raised when a legacy store can't be migrated as is."""
+
+
+class LegacyVectorMigrator:
+    """
+    Moves vectors from the old FAISS layout (``user_N_index`` plus
+    ``user_N_mapping.json`` in the vector database directory) into the active
+    vector backend without re-embedding.
+
+    Vectors are read from the index in batches. Every mapping entry is checked
+    against DocumentChunk: the chunk must still exist and belong to the mapped
+    document of the same user, otherwise it is skipped. Progress is recorded in
+    ``user_N_migration.json`` after each batch, so an interrupted run resumes
+    where it stopped.
+    """
+
+    _INDEX_FILE = re.compile(r'^user_(\d+)_index$')
+
+    def __init__(self, vector_store, directory: str = None, batch_size: int = 1000):
+        self.vector_store = vector_store
+        self.directory = directory or Config.VECTOR_DB_PATH
+        self.batch_size = batch_size
+        self.logger = logging.getLogger(__name__)
+
+    def find_legacy_users(self) -> List[int]:
+        """Users that have a legacy index with a mapping next to it"""
+        user_ids = []
+        for name in sorted(os.listdir(self.directory)):
+            match = self._INDEX_FILE.match(name)
+            if match and os.path.exists(self._path(int(match.group(1)), "mapping.json")):
+                user_ids.append(int(match.group(1)))
+        return user_ids
+
+    def migrate_user(self, user_id: int, restart: bool = False, dry_run: bool = False) -> Dict:
+        """Migrate one user's legacy store; returns counters of the run"""
+        import faiss
+
+        index = faiss.read_index(self._path(user_id, "index"))
+        if index.d not in (Config.EMBEDDINGS_DIMENSION, Config.EMBEDDING_REQUEST_DIMENSIONS):
+            raise LegacyMigrationError(
+                f"Legacy index of user {user_id} has {index.d}-dimensional vectors, but "
+                f"{Config.EMBEDDING_MODEL} produces {Config.EMBEDDINGS_DIMENSION}. They come from a "
+                f"different embedding model and can't be searched with it; reprocess these documents instead."
+            )
+
+        with open(self._path(user_id, "mapping.json"), encoding="utf-8") as f:
+            mapping = json.load(f)
+
+        progress = {} if restart else self._load_progress(user_id)
+        if progress.get("completed"):
+            self.logger.info(f"Legacy store of user {user_id} already migrated")
+            return progress
+
+        stats = {
+            "next_position": progress.get("next_position", 0),
+            "migrated": progress.get("migrated", 0),
+            "skipped": progress.get("skipped", 0),
+            "total": index.ntotal,
+            "completed": False
+        }
+
+        while stats["next_position"] < index.ntotal:
+            start = stats["next_position"]
+            count = min(self.batch_size, index.ntotal - start)
+            vectors = self._fit_dimensions(index.reconstruct_n(start, count))
+            migrated, skipped = self._migrate_batch(user_id, start, vectors, mapping, dry_run)
+
+            stats["next_position"] = start + count
+            stats["migrated"] += migrated
+            stats["skipped"] += skipped
+            if not dry_run:
+                self._save_progress(user_id, stats)
+            self.logger.info(f"User {user_id}: {stats['next_position']}/{index.ntotal} legacy vectors processed")
+
+        stats["completed"] = True
+        if not dry_run:
+            self._save_progress(user_id, stats)
+        return stats
+
+    def _migrate_batch(self, user_id: int, start: int, vectors, mapping: Dict, dry_run: bool):
+        entries = {}
+        for offset in range(len(vectors)):
+            entry = mapping.get(str(start + offset))
+            if entry:
+                entries[offset] = entry
+
+        chunks = {
+            chunk.id: chunk for chunk in DocumentChunk.query
+            .join(Document, DocumentChunk.document_id == Document.id)
+            .filter(
+                DocumentChunk.id.in_([entry["doc_chunk_id"] for entry in entries.values()]),
+                Document.user_id == user_id
+            ).all()
+        } if entries else {}
+
+        ids, embeddings, metadatas, documents = [], [], [], []
+        for offset, entry in entries.items():
+            chunk = chunks.get(entry["doc_chunk_id"])
+            if not chunk or chunk.document_id != entry["document_id"]:
+                self.logger.warning(
+                    f"Skipping legacy vector {start + offset} of user {user_id}: "
+                    f"chunk {entry['doc_chunk_id']} of document {entry['document_id']} not found"
+                )
+                continue
+            ids.append(f"chunk_{chunk.id}")
+            embeddings.append(vectors[offset].tolist())
+            metadatas.append({
+                "chunk_id": chunk.id,
+                "document_id": chunk.document_id,
+                "chunk_index": chunk.chunk_index
+            })
+            documents.append(chunk.chunk_text)
+
+        skipped = len(vectors) - len(ids)
+        if ids and not dry_run:
+            self.vector_store.lock_collection(user_id)
+            self.vector_store.backend.add(
+                self.vector_store.collection_name(user_id),
+                ids=ids,
+                embeddings=embeddings,
+                metadatas=metadatas,
+                documents=documents
+            )
+            self.vector_store.bump_collection_version(user_id)
+            db.session.commit()
+        return len(ids), skipped
+
+    @staticmethod
+    def _fit_dimensions(vectors):
+        """Shorten full-size vectors when shortened embeddings are configured.
+
+        text-embedding-3 vectors can be cut to their leading dimensions and
+        renormalized; that is what the API does for the ``dimensions`` parameter.
+        """
+        if vectors.shape[1] == Config.EMBEDDING_REQUEST_DIMENSIONS:
+            return vectors
+        vectors = vectors[:, :Config.EMBEDDING_REQUEST_DIMENSIONS]
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+
+    def _path(self, user_id: int, suffix: str) -> str:
+        return os.path.join(self.directory, f"user_{user_id}_{suffix}")
+
+    def _load_progress(self, user_id: int) -> Dict:
+        try:
+            with open(self._path(user_id, "migration.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_progress(self, user_id: int, stats: Dict):
+        path = self._path(user_id, "migration.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+        os.replace(f"{path}.tmp", path)
@@ -0,0 +1,165 @@
+import math
+import re
+import logging
+from collections import Counter
+from typing import Dict, List, Tuple
+from sqlalchemy import func, insert
+from langchain_core.documents import Document as LangchainDocument
+from models import Document, DocumentChunk, LexicalPosting
+from app import db
+
+class LexicalIndex:
+    """
+    Per-user BM25 index over document chunks, stored as postings in the database.
+
+    Postings are written at ingestion time alongside the chunk rows. Tokens keep
+    identifiers such as contract numbers, city codes and dates intact
+    ("28.03", "МСК-2024/15") and also index their parts, so exact identifiers
+    match even though dense embeddings blur them.
+    """
+
+    _TOKEN = re.compile(r'\w+(?:[./\-]\w+)*')
+    _PART_SEPARATOR = re.compile(r'[./\-]')
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.logger = logging.getLogger(__name__)
+        # (user_id, collection_version) -> (chunk count, average chunk length)
+        self._stats_cache: Dict[Tuple[int, int], Tuple[int, float]] = {}
+
+    @classmethod
+    def tokenize(cls, text: str) -> List[str]:
+        """Split text into lowercase terms, keeping compound identifiers and their parts"""
+        terms = []
+        for match in cls._TOKEN.finditer((text or "").lower().replace("ё", "е")):
+            token = match.group(0)[:100]
+            terms.append(token)
+            if cls._PART_SEPARATOR.search(token):
+                terms.extend(part for part in cls._PART_SEPARATOR.split(token) if part)
+        return terms
+
+    @classmethod
+    def is_identifier(cls, term: str) -> bool:
+        """Identifier-like terms: codes, numbers and dates rather than words"""
+        return any(ch.isdigit() for ch in term) and (len(term) >= 3 or bool(cls._PART_SEPARATOR.search(term)))
+
+    def add_chunks(self, user_id: int, document_id: int, chunks):
+        """Write postings for chunks in the current transaction"""
+        rows = []
+        for chunk in chunks:
+            counts = Counter(self.tokenize(chunk.chunk_text))
+            length = sum(counts.values())
+            rows.extend({
+                "user_id": user_id,
+                "document_id": document_id,
+                "chunk_id": chunk.id,
+                "term": term,
+                "term_frequency": frequency,
+                "chunk_length": length
+            } for term, frequency in counts.items())
+
+        if rows:
+            db.session.execute(insert(LexicalPosting), rows)
+
+    def delete_document(self, document_id: int):
+        """Remove postings of a document in the current transaction"""
+        LexicalPosting.query.filter_by(document_id=document_id).delete()
+
+    def delete_chunks(self, chunk_ids: List[int]):
+        """Remove postings of individual chunks in the current transaction"""
+        for start in range(0, len(chunk_ids), 500):
+            LexicalPosting.query.filter(
+                LexicalPosting.chunk_id.in_(chunk_ids[start:start + 500])
+            ).delete(synchronize_session=False)
+
+    def search(self, user_id: int, query: str, limit: int = 20, collection_version: int = None) -> List[Tuple[int, float]]:
+        """Return (chunk_id, BM25 score) pairs, best first"""
+        terms = list(dict.fromkeys(self.tokenize(query)))
+        if not terms:
+            return []
+
+        chunk_count, average_length = self._get_stats(user_id, collection_version)
+        if not chunk_count:
+            return []
+
+        document_frequencies = dict(
+            db.session.query(LexicalPosting.term, func.count(LexicalPosting.id))
+            .filter(LexicalPosting.user_id == user_id, LexicalPosting.term.in_(terms))
+            .group_by(LexicalPosting.term)
+            .all()
+        )
+        # Terms found in most chunks barely affect ranking but have huge posting lists
+        selective = [term for term, df in document_frequencies.items() if df <= chunk_count * 0.5]
+        terms = selective or list(document_frequencies)
+        if not terms:
+            return []
+
+        scores = Counter()
+        postings = db.session.query(
+            LexicalPosting.chunk_id,
+            LexicalPosting.term,
+            LexicalPosting.term_frequency,
+            LexicalPosting.chunk_length
+        ).filter(LexicalPosting.user_id == user_id, LexicalPosting.term.in_(terms))
+
+        for chunk_id, term, frequency, length in postings:
+            df = document_frequencies[term]
+            idf = math.log(1 + (chunk_count - df + 0.5) / (df + 0.5))
+            norm = frequency + self.k1 * (1 - self.b + self.b * length / average_length)
+            scores[chunk_id] += idf * frequency * (self.k1 + 1) / norm
+
+        return scores.most_common(limit)
+
+    def get_documents(self, chunk_ids: List[int]) -> Dict[int, LangchainDocument]:
+        """Load chunks as LangChain documents with the same metadata as the vector store"""
+        if not chunk_ids:
+            return {}
+        chunks = DocumentChunk.query.filter(DocumentChunk.id.in_(chunk_ids)).all()
+        return {
+            chunk.id: LangchainDocument(
+                page_content=chunk.chunk_text,
+                metadata={
+                    "chunk_id": chunk.id,
+                    "document_id": chunk.document_id,
+                    "chunk_index": chunk.chunk_index
+                }
+            ) for chunk in chunks
+        }
+
+    def rebuild(self, user_id: int = None) -> int:
+        """(Re)build postings from stored chunks, for documents ingested before the index existed"""
+        documents = Document.query
+        if user_id is not None:
+            documents = documents.filter_by(user_id=user_id)
+
+        chunk_total = 0
+        for document in documents.all():
+            self.delete_document(document.id)
+            chunks = DocumentChunk.query.filter_by(document_id=document.id).all()
+            self.add_chunks(document.user_id, document.id, chunks)
+            db.session.commit()
+            chunk_total += len(chunks)
+        self._stats_cache.clear()
+        return chunk_total
+
+    def _get_stats(self, user_id: int, collection_version: int = None) -> Tuple[int, float]:
+        key = (user_id, collection_version)
+        if collection_version is not None and key in self._stats_cache:
+            return self._stats_cache[key]
+
+        lengths = db.session.query(
+            LexicalPosting.chunk_id,
+            LexicalPosting.chunk_length
+        ).filter(LexicalPosting.user_id == user_id).distinct().subquery()
+        chunk_count, average_length = db.session.query(
+            func.count(lengths.c.chunk_id),
+            func.avg(lengths.c.chunk_length)
+        ).one()
+        stats = (chunk_count or 0, float(average_length or 1.0) or 1.0)
+
+        if collection_version is not None:
+            if len(self._stats_cache) > 1024:
+                self._stats_cache.clear()
+            self._stats_cache[key] = stats
+        return stats
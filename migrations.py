@@ -0,0 +1,132 @@
+import logging
+from collections import namedtuple
+from datetime import datetime
+from typing import List
+from sqlalchemy import inspect, text
+from app import db
+
+# A numbered schema change; ``apply`` receives a connection inside a transaction
+Migration = namedtuple('Migration', ['version', 'description', 'apply'])
+
+
+def _initial_schema(connection):
+    # Creates missing tables from the current models and leaves existing ones
+    # alone, so it adopts databases built by db.create_all(). On a fresh
+    # database this already yields the latest tables, which is why later
+    # migrations must be idempotent (IF NOT EXISTS, _add_column).
+    db.metadata.create_all(bind=connection)
+
+
+def _hot_path_indexes(connection):
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS ix_chat_message_history_timestamp ON chat_message (chat_history_id, timestamp, id)",
+        "CREATE INDEX IF NOT EXISTS ix_document_chunk_document_index ON document_chunk (document_id, chunk_index)",
+        "CREATE INDEX IF NOT EXISTS ix_document_user_upload_date ON document (user_id, upload_date, id)",
+        "CREATE INDEX IF NOT EXISTS ix_chat_history_session_user ON chat_history (session_id, user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_chat_history_user_active_updated ON chat_history (user_id, is_active, updated_at, id)",
+        # Superseded by ix_chat_history_session_user
+        "DROP INDEX IF EXISTS ix_chat_history_session_id",
+    ):
+        connection.execute(text(statement))
+
+
+def _summary_high_water_mark(connection):
+    _add_column(connection, "chat_history", "summarized_message_id", "INTEGER")
+
+
+def _backfill_sort_keys(connection):
+    # Keyset pagination can't page past NULL sort keys
+    connection.execute(text("UPDATE document SET upload_date = CURRENT_TIMESTAMP WHERE upload_date IS NULL"))
+    connection.execute(text(
+        "UPDATE chat_history SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL"
+    ))
+
+
+def _add_column(connection, table: str, column: str, definition: str):
+    """Add a column unless it exists (fresh databases get it from the initial schema)"""
+    if column not in {existing["name"] for existing in inspect(connection).get_columns(table)}:
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+
+
+# Append new migrations at the end; never edit or renumber applied ones
+MIGRATIONS = [
+    Migration(1, "Initial schema", _initial_schema),
+    Migration(2, "Composite indexes for hot query paths", _hot_path_indexes),
+    Migration(3, "Track messages folded into chat summaries", _summary_high_water_mark),
+    Migration(4, "Backfill NULL listing sort keys", _backfill_sort_keys),
+]
+
+
+class SchemaMigrator:
+    """
+    Applies MIGRATIONS in order and records them in the ``schema_version`` table.
+
+    Each migration runs in its own transaction. On PostgreSQL an advisory
+    lock serializes processes that start at the same time (web workers,
+    ingestion workers), so each migration is applied exactly once.
+    """
+
+    # Arbitrary application-wide advisory lock key
+    LOCK_KEY = 7_316_047_102
+
+    def __init__(self, engine=None):
+        self.engine = engine or db.engine
+        self.logger = logging.getLogger(__name__)
+
+    def current_version(self) -> int:
+        """Highest applied migration, 0 for an unmanaged database"""
+        with self.engine.connect() as connection:
+            return self._current_version(connection)
+
+    def pending(self) -> List[Migration]:
+        """Migrations not applied yet"""
+        current = self.current_version()
+        return [migration for migration in MIGRATIONS if migration.version > current]
+
+    def upgrade(self) -> List[int]:
+        """Apply pending migrations; returns the versions applied"""
+        applied = []
+        with self.engine.connect() as connection:
+            self._lock(connection)
+            try:
+                with connection.begin():
+                    connection.execute(text(
+                        "CREATE TABLE IF NOT EXISTS schema_version ("
+                        "version INTEGER PRIMARY KEY, "
+                        "description VARCHAR(200) NOT NULL, "
+                        "applied_at TIMESTAMP NOT NULL)"
+                    ))
+                # Read after taking the lock, so migrations applied meanwhile are seen
+                current = self._current_version(connection)
+                connection.commit()
+
+                for migration in MIGRATIONS:
+                    if migration.version <= current:
+                        continue
+                    with connection.begin():
+                        migration.apply(connection)
+                        connection.execute(
+                            text("INSERT INTO schema_version (version, description, applied_at) VALUES (:version, :description, :applied_at)"),
+                            {"version": migration.version, "description": migration.description, "applied_at": datetime.utcnow()}
+                        )
+                    applied.append(migration.version)
+                    self.logger.info(f"Applied schema migration {migration.version}: {migration.description}")
+            finally:
+                self._unlock(connection)
+        return applied
+
+    def _current_version(self, connection) -> int:
+        if not inspect(connection).has_table("schema_version"):
+            return 0
+        return connection.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+    def _lock(self, connection):
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": self.LOCK_KEY})
+            connection.commit()
+
+    def _unlock(self, connection):
+        if connection.dialect.name == "postgresql":
+            connection.rollback()
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.LOCK_KEY})
+            connection.commit()
@@ -64,6 +64,12 @@ class Document(db.Model):
     
     # Relationships
     chunks = db.relationship('DocumentChunk', backref='document', lazy='dynamic', cascade='all, delete-orphan')
+    ingestion_jobs = db.relationship('IngestionJob', backref='document', lazy='dynamic', cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        # Keyset pagination of a user's documents, newest first
+        db.Index('ix_document_user_upload_date', 'user_id', 'upload_date', 'id'),
+    )
     
     def __repr__(self):
         return f'<Document {self.original_filename}>'
@@ -78,22 +84,82 @@ class DocumentChunk(db.Model):
     # Foreign keys
     document_id = db.Column(db.Integer, db.ForeignKey('document.id'), nullable=False)
     
+    __table_args__ = (
+        # A document's chunks in order; also serves lookups by document_id alone
+        db.Index('ix_document_chunk_document_index', 'document_id', 'chunk_index'),
+    )
+    
     def __repr__(self):
         return f'<DocumentChunk {self.id} from Document {self.document_id}>'
 
+class LexicalPosting(db.Model):
+    """Inverted index entry: how often a term occurs in a document chunk."""
+    id = db.Column(db.Integer, primary_key=True)
+    term = db.Column(db.String(100), nullable=False)
+    term_frequency = db.Column(db.Integer, nullable=False)
+    chunk_length = db.Column(db.Integer, nullable=False)  # Terms in the chunk, for BM25 length normalization
+    
+    # Foreign keys
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id', ondelete='CASCADE'), nullable=False, index=True)
+    chunk_id = db.Column(db.Integer, db.ForeignKey('document_chunk.id', ondelete='CASCADE'), nullable=False, index=True)
+    
+    __table_args__ = (
+        db.Index('ix_lexical_posting_user_term', 'user_id', 'term'),
+    )
+    
+    def __repr__(self):
+        return f'<LexicalPosting {self.term!r} in Chunk {self.chunk_id}>'
+
+class IngestionJob(db.Model):
+    """Persistent queue entry for background document ingestion."""
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, running, completed, failed
+    stage = db.Column(db.String(30), nullable=True)  # Last pipeline stage reached
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)  # Not picked up before this time
+    lease_expires_at = db.Column(db.DateTime, nullable=True)  # Running jobs are reclaimed after this
+    
+    # Foreign keys
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    
+    def __repr__(self):
+        return f'<IngestionJob {self.id} for Document {self.document_id} ({self.status})>'
+
+class CollectionState(db.Model):
+    """Tracks changes to a user's vector collection so caches can be invalidated."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)  # Incremented on every add/delete
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CollectionState user {self.user_id} v{self.version}>'
+
 class ChatHistory(db.Model):
     """Model for storing chat history."""
     id = db.Column(db.Integer, primary_key=True)
-    session_id = db.Column(db.String(100), nullable=False, index=True)
+    session_id = db.Column(db.String(100), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
-    summary = db.Column(db.Text, nullable=True)
+    summary = db.Column(db.Text, nullable=True)  # Rolling summary of messages older than the context window
+    summarized_message_id = db.Column(db.Integer, nullable=True)  # Last message folded into the summary
     
     # Relationships
     messages = db.relationship('ChatMessage', backref='chat_history', lazy='dynamic', cascade='all, delete-orphan')
     
+    __table_args__ = (
+        # Session lookups, always scoped to the owner
+        db.Index('ix_chat_history_session_user', 'session_id', 'user_id'),
+        # Keyset pagination of a user's conversations, most recently updated first
+        db.Index('ix_chat_history_user_active_updated', 'user_id', 'is_active', 'updated_at', 'id'),
+    )
+    
     def __repr__(self):
         return f'<ChatHistory {self.id} for User {self.user_id}>'
 
@@ -108,6 +174,11 @@ class ChatMessage(db.Model):
     # Additional metadata
     related_documents = db.Column(db.Text, nullable=True)  # JSON string of document IDs used for response
     
+    __table_args__ = (
+        # A conversation's messages in order, newest ones read first
+        db.Index('ix_chat_message_history_timestamp', 'chat_history_id', 'timestamp', 'id'),
+    )
+    
     def __repr__(self):
         sender = "User" if self.is_user else "AI"
         return f'<ChatMessage {self.id} from {sender}>'
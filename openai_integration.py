@@ -1,11 +1,18 @@
 import json
 import os
+import asyncio
 import logging
+import weakref
 import numpy as np
 
 # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
 # do not change this unless explicitly requested by the user
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+from config import Config
+from http_pool import get_http_client, new_async_http_client
+from concurrency import deadline as call_deadline
+from embedding_cache import EmbeddingCache
+from embedding_scheduler import requested_dimensions, embedding_id
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +20,13 @@ logger = logging.getLogger(__name__)
 class OpenAIService:
     """
     Service for interacting with OpenAI API for text generation and embeddings.
+
+    Every method has an async counterpart (``agenerate_response``,
+    ``arag_prompt_with_context``, ``asummarize_chat``) for asyncio callers, so
+    independent calls can be awaited together with ``asyncio.gather``. Sync
+    calls share one pooled HTTP client per process; under eventlet they run on
+    green sockets and overlap across green threads (see ``concurrency.fan_out``).
+    All calls accept a ``deadline`` in seconds.
     """
 
     def __init__(self):
@@ -33,9 +47,9 @@ class OpenAIService:
                 # Initialize with timeout and proper error handling
                 self.client = OpenAI(
                     api_key=self.api_key,
-                    timeout=120.0,  # 120 second timeout for API calls
+                    timeout=float(Config.OPENAI_TIMEOUT),  # Seconds per API call
                     max_retries=3,  # Retry failed requests three times
-                    request_timeout=60  # Request timeout in seconds
+                    http_client=get_http_client()  # Connection pool shared across the process
                 )
                 logger.info("OpenAI service initialized successfully")
             except Exception as e:
@@ -43,13 +57,22 @@ class OpenAIService:
                 self.client = None
 
         # Update to the correct embedding dimension for text-embedding-3-large
-        self.embedding_dimension = 3072  # Latest OpenAI embedding model dimension
+        self.embedding_dimension = Config.EMBEDDING_REQUEST_DIMENSIONS  # Shortened if configured
+        self.embedding_model = Config.EMBEDDING_MODEL
+        self.embedding_cache_id = embedding_id(self.embedding_model)
+
+        # Shared with VectorStore so identical text is only embedded once
+        self.embedding_cache = EmbeddingCache()
+
+        # Async clients, one per event loop since connection pools are bound to a loop
+        self._async_clients = weakref.WeakKeyDictionary()
 
     def generate_response(self,
                           prompt,
                           max_tokens=1024,
                           temperature=0.7,
-                          system_prompt=None):
+                          system_prompt=None,
+                          deadline=None):
         """
         Generate a response using OpenAI's GPT-4o model.
 
@@ -58,6 +81,7 @@ class OpenAIService:
             max_tokens (int): Maximum number of tokens to generate
             temperature (float): Sampling temperature (0.0-1.0)
             system_prompt (str): Optional system prompt for the model
+            deadline (float): Optional time limit for the call in seconds
 
         Returns:
             str: Generated response
@@ -70,65 +94,129 @@ class OpenAIService:
                 )
                 return "Error: OpenAI service is not properly configured. Please check your API key."
 
-            if not prompt or not isinstance(prompt, str):
-                logger.warning(f"Invalid prompt type: {type(prompt)}")
-                prompt = str(prompt) if prompt else "Hello"
+            request = self._build_response_request(prompt, max_tokens, temperature, system_prompt)
+            return self._complete(request, deadline)
 
-            # Validate and sanitize parameters
-            max_tokens = min(max(1, int(max_tokens)),
-                             4000)  # Keep tokens in reasonable range
-            temperature = min(max(0.0, float(temperature)),
-                              1.0)  # Keep temperature in valid range
+        except Exception as e:
+            logger.error(f"Error generating response with OpenAI: {str(e)}",
+                         exc_info=True)
+            return f"I'm sorry, I encountered an error while processing your request. Please try again later."
 
-            # Build message array
-            messages = []
+    async def agenerate_response(self,
+                                 prompt,
+                                 max_tokens=1024,
+                                 temperature=0.7,
+                                 system_prompt=None,
+                                 deadline=None):
+        """Async version of generate_response."""
+        try:
+            if not self.api_key:
+                logger.error("OpenAI API key not configured")
+                return "Error: OpenAI service is not properly configured. Please check your API key."
 
-            # Add system prompt if provided
-            if system_prompt:
-                if isinstance(system_prompt, str) and system_prompt.strip():
-                    messages.append({
-                        "role": "system",
-                        "content": system_prompt.strip()
-                    })
-                else:
-                    logger.warning("Invalid system prompt format, ignoring")
-            else:
-                # Default system prompt for general assistance
+            request = self._build_response_request(prompt, max_tokens, temperature, system_prompt)
+            return await self._acomplete(request, deadline)
+
+        except Exception as e:
+            logger.error(f"Error generating response with OpenAI: {str(e)}",
+                         exc_info=True)
+            return f"I'm sorry, I encountered an error while processing your request. Please try again later."
+
+    def _build_response_request(self, prompt, max_tokens, temperature, system_prompt):
+        """Build chat completion parameters for generate_response."""
+        if not prompt or not isinstance(prompt, str):
+            logger.warning(f"Invalid prompt type: {type(prompt)}")
+            prompt = str(prompt) if prompt else "Hello"
+
+        # Validate and sanitize parameters
+        max_tokens = min(max(1, int(max_tokens)),
+                         4000)  # Keep tokens in reasonable range
+        temperature = min(max(0.0, float(temperature)),
+                          1.0)  # Keep temperature in valid range
+
+        # Build message array
+        messages = []
+
+        # Add system prompt if provided
+        if system_prompt:
+            if isinstance(system_prompt, str) and system_prompt.strip():
                 messages.append({
-                    "role":
-                    "system",
-                    "content":
-                    "You are a helpful, professional AI assistant for a company knowledge system."
+                    "role": "system",
+                    "content": system_prompt.strip()
                 })
+            else:
+                logger.warning("Invalid system prompt format, ignoring")
+        else:
+            # Default system prompt for general assistance
+            messages.append({
+                "role":
+                "system",
+                "content":
+                "You are a helpful, professional AI assistant for a company knowledge system."
+            })
 
-            # Add user message
-            messages.append({"role": "user", "content": prompt})
+        # Add user message
+        messages.append({"role": "user", "content": prompt})
+
+        return {
+            "model": "gpt-3.5-turbo",  # Using GPT-3.5 Turbo model
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "top_p": 0.95,
+            "presence_penalty": 0.0,
+            "frequency_penalty": 0.0
+        }
+
+    def _complete(self, request, deadline=None):
+        """Run a chat completion on the shared client and return the message text."""
+        client = self.client
+        if deadline:
+            # Retries would outlive the deadline
+            client = client.with_options(timeout=float(deadline), max_retries=0)
 
-            # Make the API call with error handling
-            try:
-                response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",  # Using GPT-3.5 Turbo model
-                    messages=messages,
-                    max_tokens=max_tokens,
-                    temperature=temperature,
-                    top_p=0.95,
-                    presence_penalty=0.0,
-                    frequency_penalty=0.0)
+        try:
+            with call_deadline(deadline):
+                response = client.chat.completions.create(**request)
+        except Exception as api_error:
+            logger.error(f"API call to OpenAI failed: {str(api_error)}")
+            raise api_error
 
-                if not response or not response.choices or len(
-                        response.choices) == 0:
-                    raise ValueError("Empty response received from OpenAI API")
+        return self._message_content(response)
 
-                return response.choices[0].message.content
+    async def _acomplete(self, request, deadline=None):
+        """Async version of _complete, on the current event loop's client."""
+        try:
+            response = await asyncio.wait_for(
+                self._get_async_client().chat.completions.create(**request),
+                timeout=deadline
+            )
+        except Exception as api_error:
+            logger.error(f"API call to OpenAI failed: {str(api_error)}")
+            raise api_error
+
+        return self._message_content(response)
+
+    def _get_async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=self.api_key,
+                timeout=float(Config.OPENAI_TIMEOUT),
+                max_retries=3,
+                http_client=new_async_http_client()
+            )
+            self._async_clients[loop] = client
+        return client
 
-            except Exception as api_error:
-                logger.error(f"API call to OpenAI failed: {str(api_error)}")
-                raise api_error
+    @staticmethod
+    def _message_content(response):
+        if not response or not response.choices or len(
+                response.choices) == 0:
+            raise ValueError("Empty response received from OpenAI API")
 
-        except Exception as e:
-            logger.error(f"Error generating response with OpenAI: {str(e)}",
-                         exc_info=True)
-            return f"I'm sorry, I encountered an error while processing your request. Please try again later."
+        return response.choices[0].message.content
 
     def get_embedding(self, text):
         """
@@ -150,15 +238,21 @@ class OpenAIService:
             # Preprocess text for better embedding quality
             processed_text = self._preprocess_text_for_embedding(text)
 
+            # Reuse a cached vector for identical text if we have one
+            cached = self.embedding_cache.get_many(self.embedding_cache_id, [processed_text])[0]
+            if cached is not None:
+                return cached
+
             # Generate embedding using the most advanced model
             response = self.client.embeddings.create(
                 input=processed_text,
-                model=
-                "text-embedding-3-large",  # Latest model with 3072 dimensions
-                encoding_format="float")
+                model=self.embedding_model,  # Latest model with 3072 dimensions
+                encoding_format="float",
+                **({"dimensions": requested_dimensions()} if requested_dimensions() else {}))
 
-            embedding = response.data[0].embedding
-            return np.array(embedding, dtype=np.float32)
+            embedding = np.array(response.data[0].embedding, dtype=np.float32)
+            self.embedding_cache.put_many(self.embedding_cache_id, [processed_text], [embedding])
+            return embedding
 
         except Exception as e:
             logger.error(f"Error generating embedding with OpenAI: {str(e)}",
@@ -197,7 +291,7 @@ class OpenAIService:
 
         return text
 
-    def rag_prompt_with_context(self, user_query, context, chat_history=None):
+    def rag_prompt_with_context(self, user_query, context, chat_history=None, deadline=None):
         """
         Generate a response using RAG (Retrieval-Augmented Generation) approach.
         Uses OpenAI's GPT-4o to synthesize answers from retrieved document contexts.
@@ -206,6 +300,7 @@ class OpenAIService:
             user_query (str): User's question
             context (str): Retrieved context from documents
             chat_history (list, optional): List of previous messages
+            deadline (float, optional): Time limit for the call in seconds
 
         Returns:
             str: Generated response
@@ -218,111 +313,120 @@ class OpenAIService:
                 )
                 return "Error: OpenAI service is not properly configured for RAG processing."
 
-            # Sanitize inputs
-            if not user_query or not isinstance(user_query, str):
-                user_query = str(
-                    user_query
-                ) if user_query else "Can you help me find information?"
-
-            if not context or not isinstance(context, str):
-                context = str(
-                    context) if context else "No relevant documents found."
-
-            # Prepare message array
-            messages = []
-
-            # System prompt for RAG - Enhanced for better retrieval handling
-            system_prompt = """
-            You are an AI assistant for a company knowledge base search system.
-            Your purpose is to help users find relevant information from company documents.
-
-            Guidelines:
-            1. Answer questions based ONLY on the context provided. If information isn't in the context, say "I don't have enough information about that in the available documents."
-            2. Be specific when citing information. Mention document names when referencing information.
-            3. If the context contains partial or incomplete information, acknowledge this and provide what is available.
-            4. Format your answers for readability when appropriate (bullet points, paragraphs).
-            5. Use a professional, helpful tone appropriate for a corporate environment.
-            6. For multi-part questions, address each part systematically.
-            7. If the user asks about information that contradicts the context, prioritize what's in the context, but acknowledge the discrepancy.
-            """
-
-            messages.append({"role": "system", "content": system_prompt})
-
-            # Add chat history if provided, but only if there's actual history
-            if chat_history and isinstance(chat_history,
-                                           list) and len(chat_history) > 0:
-                # Only include recent history to avoid token limits (last 3-5 messages)
-                recent_history = chat_history[-5:] if len(
-                    chat_history) > 5 else chat_history
-
-                for message in recent_history:
-                    if not isinstance(message, dict):
-                        continue
-
-                    role = "user" if message.get("is_user",
-                                                 False) else "assistant"
-                    content = message.get("content", "")
-
-                    if content and isinstance(content,
-                                              str) and content.strip():
-                        messages.append({
-                            "role": role,
-                            "content": content.strip()
-                        })
-
-            # Format context in a more structured way
-            formatted_context = f"""
-            RETRIEVED DOCUMENT INFORMATION:
-            ```
-            {context}
-            ```
-
-            Answer the user's question using ONLY the information in the retrieved documents above.
-            If the documents don't contain the answer, acknowledge the limitations of the available information.
-            """
-
-            # Add context as a system message for better separation
-            messages.append({"role": "system", "content": formatted_context})
-
-            # Add user query as the final user message
-            messages.append({"role": "user", "content": user_query})
-
-            # Generate response with enhanced parameters and error handling
-            try:
-                response = self.client.chat.completions.create(
-                    model="gpt-4o-mini",  # Using GPT-4o mini model
-                    messages=messages,
-                    max_tokens=1024,
-                    temperature=
-                    0.4,  # Slightly reduced temperature for more focused answers
-                    top_p=0.95,  # Added top_p for better quality
-                    presence_penalty=0.1,  # Slight penalty to reduce repetition
-                    frequency_penalty=0.1  # Slight penalty to reduce repetition
-                )
+            request = self._build_rag_request(user_query, context, chat_history)
+            return self._complete(request, deadline)
 
-                if not response or not response.choices or len(
-                        response.choices) == 0:
-                    raise ValueError("Empty response received from OpenAI API")
+        except Exception as e:
+            logger.error(f"Error processing RAG query with OpenAI: {str(e)}",
+                         exc_info=True)
+            return "I'm sorry, I encountered an error while processing your request. Please try again or refine your question."
 
-                return response.choices[0].message.content
+    async def arag_prompt_with_context(self, user_query, context, chat_history=None, deadline=None):
+        """Async version of rag_prompt_with_context."""
+        try:
+            if not self.api_key:
+                logger.error("OpenAI API key not configured")
+                return "Error: OpenAI service is not properly configured for RAG processing."
 
-            except Exception as api_error:
-                logger.error(
-                    f"RAG API call to OpenAI failed: {str(api_error)}")
-                raise api_error
+            request = self._build_rag_request(user_query, context, chat_history)
+            return await self._acomplete(request, deadline)
 
         except Exception as e:
             logger.error(f"Error processing RAG query with OpenAI: {str(e)}",
                          exc_info=True)
             return "I'm sorry, I encountered an error while processing your request. Please try again or refine your question."
 
-    def summarize_chat(self, messages):
+    def _build_rag_request(self, user_query, context, chat_history=None):
+        """Build chat completion parameters for rag_prompt_with_context."""
+        # Sanitize inputs
+        if not user_query or not isinstance(user_query, str):
+            user_query = str(
+                user_query
+            ) if user_query else "Can you help me find information?"
+
+        if not context or not isinstance(context, str):
+            context = str(
+                context) if context else "No relevant documents found."
+
+        # Prepare message array
+        messages = []
+
+        # System prompt for RAG - Enhanced for better retrieval handling
+        system_prompt = """
+        You are an AI assistant for a company knowledge base search system.
+        Your purpose is to help users find relevant information from company documents.
+
+        Guidelines:
+        1. Answer questions based ONLY on the context provided. If information isn't in the context, say "I don't have enough information about that in the available documents."
+        2. Be specific when citing information. Mention document names when referencing information.
+        3. If the context contains partial or incomplete information, acknowledge this and provide what is available.
+        4. Format your answers for readability when appropriate (bullet points, paragraphs).
+        5. Use a professional, helpful tone appropriate for a corporate environment.
+        6. For multi-part questions, address each part systematically.
+        7. If the user asks about information that contradicts the context, prioritize what's in the context, but acknowledge the discrepancy.
+        """
+
+        messages.append({"role": "system", "content": system_prompt})
+
+        # Add chat history if provided, but only if there's actual history
+        if chat_history and isinstance(chat_history,
+                                       list) and len(chat_history) > 0:
+            # Only include recent history to avoid token limits (last 3-5 messages)
+            recent_history = chat_history[-5:] if len(
+                chat_history) > 5 else chat_history
+
+            for message in recent_history:
+                if not isinstance(message, dict):
+                    continue
+
+                role = "user" if message.get("is_user",
+                                             False) else "assistant"
+                content = message.get("content", "")
+
+                if content and isinstance(content,
+                                          str) and content.strip():
+                    messages.append({
+                        "role": role,
+                        "content": content.strip()
+                    })
+
+        # Format context in a more structured way
+        formatted_context = f"""
+        RETRIEVED DOCUMENT INFORMATION:
+        ```
+        {context}
+        ```
+
+        Answer the user's question using ONLY the information in the retrieved documents above.
+        If the documents don't contain the answer, acknowledge the limitations of the available information.
+        """
+
+        # Add context as a system message for better separation
+        messages.append({"role": "system", "content": formatted_context})
+
+        # Add user query as the final user message
+        messages.append({"role": "user", "content": user_query})
+
+        return {
+            "model": "gpt-4o-mini",  # Using GPT-4o mini model
+            "messages": messages,
+            "max_tokens": 1024,
+            "temperature": 0.4,  # Slightly reduced temperature for more focused answers
+            "top_p": 0.95,  # Added top_p for better quality
+            "presence_penalty": 0.1,  # Slight penalty to reduce repetition
+            "frequency_penalty": 0.1  # Slight penalty to reduce repetition
+        }
+
+    def summarize_chat(self, messages, deadline=None, previous_summary=None):
         """
         Generate a summary of a chat session using OpenAI's chat completions API.
         Creates a concise summary of the key points and topics discussed.
 
         Args:
             messages (list): List of chat messages with format [{'content': str, 'is_user': bool}, ...]
+            deadline (float, optional): Time limit for the call in seconds
+            previous_summary (str, optional): Summary of the conversation so far;
+                ``messages`` then only needs the messages that followed it
 
         Returns:
             str: Summary of the chat, 2-3 sentences long
@@ -335,101 +439,30 @@ class OpenAIService:
                 )
                 return "Chat summary not available. Please configure the OpenAI service properly."
 
-            # Validate message format
-            if not messages or not isinstance(messages,
-                                              list) or len(messages) < 2:
-                logger.warning(
-                    f"Invalid messages format for summarization: {type(messages)}"
-                )
-                return "Not enough messages to generate a meaningful summary."
-
-            # Create a properly formatted chat history for the API with enhanced system prompt
-            api_messages = [{
-                "role":
-                "system",
-                "content":
-                """You are a highly efficient summarization specialist.
-                    Create a concise, informative summary of this conversation between a user and an AI assistant.
-                    Focus on:
-                    - Main topics and themes discussed
-                    - Important questions asked by the user
-                    - Key information provided by the assistant
-                    - Any decisions or conclusions reached
-                    - Action items or next steps if mentioned
-
-                    Your summary should be 2-3 sentences and capture only the most significant points.
-                    Be professional, clear, and focus on substance over style.
-                    Avoid vague language like "various topics" - be specific about what was discussed.
-                    """
-            }]
-
-            # Clean and convert message format to OpenAI's format
-            chat_content = []
-            msg_count = 0
-
-            for msg in messages:
-                if not isinstance(msg, dict):
-                    continue
+            request, problem = self._build_summary_request(messages, previous_summary)
+            if problem:
+                return problem
 
-                # Extract message details
-                is_user = msg.get("is_user", False)
-                content = msg.get("content", "")
+            return self._clean_summary(self._complete(request, deadline))
 
-                # Skip empty messages
-                if not content or not isinstance(content,
-                                                 str) or not content.strip():
-                    continue
-
-                # Add to API messages
-                role = "user" if is_user else "assistant"
-                api_messages.append({"role": role, "content": content.strip()})
-
-                # Add to chat content for length validation
-                chat_content.append(
-                    f"{'User' if is_user else 'Assistant'}: {content.strip()}")
-                msg_count += 1
+        except Exception as e:
+            logger.error(
+                f"Error generating chat summary with OpenAI: {str(e)}",
+                exc_info=True)
+            return "Unable to generate chat summary due to an error. Please try again later."
 
-            # Check if we have enough messages to summarize
-            if msg_count < 2:
-                return "Not enough conversation content to summarize."
+    async def asummarize_chat(self, messages, deadline=None, previous_summary=None):
+        """Async version of summarize_chat."""
+        try:
+            if not self.api_key:
+                logger.error("OpenAI API key not configured")
+                return "Chat summary not available. Please configure the OpenAI service properly."
 
-            # Add a final instruction to get the summary
-            api_messages.append({
-                "role":
-                "user",
-                "content":
-                "Based on the conversation above, provide a brief, informative summary in 2-3 sentences."
-            })
+            request, problem = self._build_summary_request(messages, previous_summary)
+            if problem:
+                return problem
 
-            # Make the API call with optimized parameters and error handling
-            try:
-                response = self.client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=api_messages,
-                    max_tokens=256,
-                    temperature=
-                    0.3,  # Lower temperature for more focused, consistent summaries
-                    top_p=0.95,
-                    presence_penalty=0.0,
-                    frequency_penalty=0.0)
-
-                if not response or not response.choices or len(
-                        response.choices) == 0:
-                    raise ValueError("Empty response received from OpenAI API")
-
-                # Get the summary from the response
-                summary = response.choices[0].message.content.strip()
-
-                # Validate the summary
-                if not summary:
-                    return "Unable to generate a summary for this conversation."
-
-                return summary
-
-            except Exception as api_error:
-                logger.error(
-                    f"Summary API call to OpenAI failed: {str(api_error)}")
-                raise api_error
+            return self._clean_summary(await self._acomplete(request, deadline))
 
         except Exception as e:
             logger.error(
@@ -437,6 +470,105 @@ class OpenAIService:
                 exc_info=True)
             return "Unable to generate chat summary due to an error. Please try again later."
 
+    def _build_summary_request(self, messages, previous_summary=None):
+        """Build chat completion parameters for summarize_chat.
+
+        Returns a (request, problem) pair; ``problem`` is the message to return
+        instead when there is not enough conversation to summarize.
+        """
+        # With a previous summary, a single new message is enough to update it
+        min_messages = 1 if previous_summary else 2
+
+        # Validate message format
+        if not messages or not isinstance(messages,
+                                          list) or len(messages) < min_messages:
+            logger.warning(
+                f"Invalid messages format for summarization: {type(messages)}"
+            )
+            return None, "Not enough messages to generate a meaningful summary."
+
+        # Create a properly formatted chat history for the API with enhanced system prompt
+        api_messages = [{
+            "role":
+            "system",
+            "content":
+            """You are a highly efficient summarization specialist.
+                Create a concise, informative summary of this conversation between a user and an AI assistant.
+                Focus on:
+                - Main topics and themes discussed
+                - Important questions asked by the user
+                - Key information provided by the assistant
+                - Any decisions or conclusions reached
+                - Action items or next steps if mentioned
+
+                Your summary should be 2-3 sentences and capture only the most significant points.
+                Be professional, clear, and focus on substance over style.
+                Avoid vague language like "various topics" - be specific about what was discussed.
+                """
+        }]
+
+        # Start from the summary so far instead of the whole conversation
+        if previous_summary:
+            api_messages.append({
+                "role": "system",
+                "content": f"Summary of the conversation so far: {previous_summary}"
+            })
+
+        # Clean and convert message format to OpenAI's format
+        msg_count = 0
+
+        for msg in messages:
+            if not isinstance(msg, dict):
+                continue
+
+            # Extract message details
+            is_user = msg.get("is_user", False)
+            content = msg.get("content", "")
+
+            # Skip empty messages
+            if not content or not isinstance(content,
+                                             str) or not content.strip():
+                continue
+
+            # Add to API messages
+            role = "user" if is_user else "assistant"
+            api_messages.append({"role": role, "content": content.strip()})
+            msg_count += 1
+
+        # Check if we have enough messages to summarize
+        if msg_count < min_messages:
+            return None, "Not enough conversation content to summarize."
+
+        # Add a final instruction to get the summary
+        if previous_summary:
+            instruction = "Update the summary of the conversation so far with the messages above, in 2-3 sentences."
+        else:
+            instruction = "Based on the conversation above, provide a brief, informative summary in 2-3 sentences."
+        api_messages.append({
+            "role":
+            "user",
+            "content":
+            instruction
+        })
+
+        return {
+            "model": "gpt-4o",
+            "messages": api_messages,
+            "max_tokens": 256,
+            "temperature": 0.3,  # Lower temperature for more focused, consistent summaries
+            "top_p": 0.95,
+            "presence_penalty": 0.0,
+            "frequency_penalty": 0.0
+        }, None
+
+    @staticmethod
+    def _clean_summary(summary):
+        # Validate the summary
+        summary = (summary or "").strip()
+        if not summary:
+            return "Unable to generate a summary for this conversation."
+        return summary
+
     def _mock_get_embedding(self, text):
         """Generate a mock embedding for development purposes."""
         # Generate a deterministic but seemingly random embedding based on the text
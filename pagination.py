@@ -0,0 +1,59 @@
+import json
+import base64
+import binascii
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import DateTime, literal, tuple_
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor can't be decoded."""
+
+
+def row_cursor(row, columns) -> str:
+    """Opaque cursor pointing just past ``row`` in a listing ordered by ``columns``"""
+    values = []
+    for column in columns:
+        value = getattr(row, column.key)
+        values.append(value.isoformat() if isinstance(value, datetime) else value)
+    payload = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns) -> List:
+    """Sort key values encoded in ``cursor``, typed like ``columns``"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("wrong number of values")
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(columns, values)
+        ]
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise InvalidCursor(f"Invalid cursor: {str(e)}")
+
+
+def keyset_page(query, columns, cursor: str = None, limit: int = 20) -> Tuple[List, Optional[str]]:
+    """
+    Fetch one page of ``query`` in descending order of ``columns``.
+
+    Instead of skipping ``offset`` rows, the page starts right after the row
+    the cursor points to, so with an index matching the filter and ``columns``
+    every page costs the same however deep the user scrolls. The last column
+    must be unique (the primary key) to break ties. Rows with a NULL sort key
+    are left out: they can't be compared, so no cursor could page past them.
+    Returns the rows and the cursor of the next page, or None on the last page.
+    """
+    limit = max(1, limit)
+    query = query.filter(*[column.isnot(None) for column in columns])
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        query = query.filter(
+            tuple_(*columns) < tuple_(*[literal(value, column.type) for column, value in zip(columns, values)])
+        )
+
+    rows = query.order_by(*[column.desc() for column in columns]).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, row_cursor(rows[-1], columns)
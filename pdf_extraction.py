@@ -0,0 +1,47 @@
+# PDF page extraction, kept free of app imports so it can run in child processes
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List
+import PyPDF2
+
+logger = logging.getLogger(__name__)
+
+
+def extract_page_range(file_path: str, start: int, stop: int) -> List[str]:
+    """Extract text of pages [start, stop) from a PDF"""
+    with open(file_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def iter_pdf_pages(file_path: str, workers: int = 1, pages_per_task: int = 10,
+                   parallel_min_pages: int = 50) -> Iterator[str]:
+    """Yield the text of each page in order, as soon as it is extracted.
+
+    Large PDFs are split into page ranges that are extracted by a process pool.
+    At most ``2 * workers`` ranges are in flight, so memory stays bounded and the
+    caller can chunk and embed early pages while later ones are still parsed.
+    """
+    with open(file_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        page_count = len(reader.pages)
+
+        if workers <= 1 or page_count < parallel_min_pages:
+            for page in reader.pages:
+                yield page.extract_text() or ""
+            return
+
+    ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+    logger.info(f"Extracting {page_count} PDF pages with {workers} processes")
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        pending = deque()
+        next_range = 0
+        while next_range < len(ranges) or pending:
+            while next_range < len(ranges) and len(pending) < workers * 2:
+                start, stop = ranges[next_range]
+                pending.append(executor.submit(extract_page_range, file_path, start, stop))
+                next_range += 1
+            yield from pending.popleft().result()
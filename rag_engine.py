@@ -1,28 +1,127 @@
 
 import logging
-from typing import Dict, List
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_core.prompts import PromptTemplate
+from langchain_core.retrievers import BaseRetriever
 from langchain.chains.conversational_retrieval.base import ConversationalRetrievalChain
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI 
-from langchain.memory import ConversationBufferMemory
-from langchain_community.vectorstores import Chroma
+from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
+from langchain.chains.question_answering.stuff_prompt import CHAT_PROMPT
+from langchain_openai import ChatOpenAI 
 from vector_store import VectorStore
-from models import ChatHistory
+from http_pool import get_http_client
+from concurrency import fan_out
+from answer_cache import AnswerCache
+from lexical_index import LexicalIndex
+from models import ChatHistory, Document as DocumentRecord
+from app import db
+from config import Config
+
+class DenseRetriever(BaseRetriever):
+    """Vector search over the user's collection in the configured backend."""
+
+    vector_store: Any
+    user_id: int
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.vector_store.similarity_search(query, self.user_id, limit=self.k)
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuses dense (vector) and lexical (BM25) results with reciprocal rank fusion.
+
+    Queries that consist of exact identifiers (contract numbers, codes, dates)
+    and have a lexical hit containing all of them skip the dense search, which
+    also saves the query embedding call. Other queries run both searches at
+    once with ``fan_out``.
+    """
+
+    dense_retriever: BaseRetriever
+    lexical_index: Any
+    user_id: int
+    collection_version: int = 0
+    k: int = 4
+    candidates: int = 20
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        if self._identifiers(query):
+            lexical_ranking = self._lexical_ranking(query)
+            if lexical_ranking and self._is_exact_match(query, lexical_ranking[0]):
+                return lexical_ranking[:self.k]
+            dense_ranking = self.dense_retriever.invoke(query)
+        else:
+            # The lexical search runs in the database, the dense one at the embedding API and the index
+            lexical_ranking, dense_ranking = fan_out([
+                lambda: self._lexical_ranking(query),
+                lambda: self.dense_retriever.invoke(query)
+            ])
+
+        scores, documents = {}, {}
+        for ranking in (dense_ranking, lexical_ranking):
+            for rank, doc in enumerate(ranking):
+                chunk_id = doc.metadata["chunk_id"]
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+                documents.setdefault(chunk_id, doc)
+
+        best = sorted(scores, key=scores.get, reverse=True)[:self.k]
+        return [documents[chunk_id] for chunk_id in best]
+
+    def _lexical_ranking(self, query: str) -> List[Document]:
+        lexical_hits = self.lexical_index.search(
+            self.user_id, query, limit=self.candidates, collection_version=self.collection_version
+        )
+        lexical_documents = self.lexical_index.get_documents([chunk_id for chunk_id, _ in lexical_hits])
+        return [lexical_documents[chunk_id] for chunk_id, _ in lexical_hits if chunk_id in lexical_documents]
+
+    def _identifiers(self, query: str) -> set:
+        """Identifiers of a short lookup query, which may be answered by the lexical search alone"""
+        terms = self.lexical_index.tokenize(query)
+        if len(set(terms)) > 6:
+            return set()
+        return {term for term in terms if self.lexical_index.is_identifier(term)}
+
+    def _is_exact_match(self, query: str, top_document: Document) -> bool:
+        """Short identifier lookups answered verbatim by the best lexical hit"""
+        identifiers = self._identifiers(query)
+        return bool(identifiers) and identifiers <= set(self.lexical_index.tokenize(top_document.page_content))
+
 
 class RAGEngine:
-    def __init__(self):
-        self.vector_store = VectorStore()
+    def __init__(self, vector_store: VectorStore = None):
+        self.vector_store = vector_store or VectorStore()
         self.logger = logging.getLogger(__name__)
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+        self.embeddings = self.vector_store.embeddings  # Shares the embedding cache
         self.llm = ChatOpenAI(
             model_name="gpt-3.5-turbo",
             temperature=0.7,
-            max_tokens=512
+            max_tokens=512,
+            http_client=get_http_client()  # Shared connection pool
         )
+        # Per-user retrievers and QA chains, least recently used first
+        self.cache_size = Config.RAG_CHAIN_CACHE_SIZE
+        self._chain_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.lexical_index = LexicalIndex()
+        # Opt-in semantic cache of answers to opening questions
+        self.answer_cache_enabled = Config.ANSWER_CACHE_ENABLED
+        self.answer_cache = AnswerCache(self.vector_store)
 
     def process_query(self, query: str, user_id: int, session_id: str, 
-                     chat_context: List[Dict] = None) -> Dict:
-        """Process user query using RAG approach"""
+                     chat_context: List[Dict] = None, conversation_summary: str = None,
+                     message_count: int = None) -> Dict:
+        """Process user query using RAG approach.
+
+        ``chat_context`` is the bounded window of latest messages,
+        ``conversation_summary`` the rolling summary of older ones and
+        ``message_count`` the number of messages in the session, including
+        the current question.
+        """
         if not query or not user_id:
             return {
                 "answer": "I apologize, but I couldn't process your request. Please try again.",
@@ -30,49 +129,37 @@ class RAGEngine:
             }
             
         try:
-            # Get Chroma collection
-            collection_name = f"user_{user_id}_docs"
-            vectorstore = Chroma(
-                collection_name=collection_name,
-                embedding_function=self.embeddings,
-                persist_directory=self.vector_store.persist_directory
-            )
-
-            # Prepare conversation memory
-            memory = ConversationBufferMemory(
-                memory_key="chat_history",
-                output_key="answer",
-                return_messages=True
-            )
+            # Reuse the user's cached QA chain; history is passed per call
+            entry = self._get_cached_entry(user_id)
+            qa_chain = entry["chain"]
 
-            if chat_context:
-                for msg in chat_context[-5:]:  # Last 5 messages
-                    memory.chat_memory.add_user_message(msg["content"]) \
-                        if msg["is_user"] else \
-                        memory.chat_memory.add_ai_message(msg["content"])
+            use_answer_cache = self._can_use_answer_cache(message_count)
+            if use_answer_cache:
+                cached = self.answer_cache.lookup(user_id, query, entry["version"])
+                if cached:
+                    return cached
 
-            # Create QA chain
-            qa_chain = ConversationalRetrievalChain.from_llm(
-                llm=self.llm,
-                retriever=vectorstore.as_retriever(),
-                memory=memory,
-                return_source_documents=True
-            )
+            chat_history = []
+            if conversation_summary:
+                chat_history.append(SystemMessage(content=f"Summary of the earlier conversation: {conversation_summary}"))
+            for msg in self._prior_turns(query, chat_context):
+                chat_history.append(
+                    HumanMessage(content=msg["content"]) if msg["is_user"]
+                    else AIMessage(content=msg["content"])
+                )
 
             # Get response
-            response = qa_chain.invoke({"question": query})
+            response = qa_chain.invoke({"question": query, "chat_history": chat_history})
 
-            return {
+            result = {
                 "answer": response["answer"],
                 "metadata": {
-                    "sources": [
-                        {
-                            "document_id": doc.metadata["document_id"],
-                            "chunk_id": doc.metadata["chunk_id"]
-                        } for doc in response["source_documents"]
-                    ]
+                    "sources": self._format_sources(response["source_documents"])
                 }
             }
+            if use_answer_cache:
+                self.answer_cache.store(user_id, query, result, entry["version"])
+            return result
 
         except Exception as e:
             self.logger.error(f"Error in RAG processing: {str(e)}", exc_info=True)
@@ -81,6 +168,171 @@ class RAGEngine:
                 "metadata": {"error": str(e)}
             }
 
+    def stream_query(self, query: str, user_id: int, session_id: str,
+                     chat_context: List[Dict] = None, conversation_summary: str = None,
+                     message_count: int = None) -> Iterator[Dict]:
+        """Process user query using RAG approach, yielding results as they become available.
+
+        Yields a ``sources`` event once retrieval finishes, ``token`` events while
+        the LLM generates, and a final ``done`` event shaped like the result of
+        ``process_query``.
+        """
+        if not query or not user_id:
+            yield {
+                "type": "done",
+                "answer": "I apologize, but I couldn't process your request. Please try again.",
+                "metadata": {"error": "Invalid input parameters"}
+            }
+            return
+
+        try:
+            entry = self._get_cached_entry(user_id)
+            retriever = entry["retriever"]
+
+            use_answer_cache = self._can_use_answer_cache(message_count)
+            if use_answer_cache:
+                cached = self.answer_cache.lookup(user_id, query, entry["version"])
+                if cached:
+                    yield {"type": "sources", "sources": cached["metadata"]["sources"]}
+                    yield {"type": "token", "content": cached["answer"]}
+                    yield {"type": "done", **cached}
+                    return
+
+            # Rephrase follow-up questions into a standalone question, as the chain does;
+            # an opening question has nothing to be rephrased against
+            chat_history = self._format_chat_history(self._prior_turns(query, chat_context), conversation_summary)
+            question = query
+            if chat_history:
+                question = self.llm.invoke(
+                    CONDENSE_QUESTION_PROMPT.format(chat_history=chat_history, question=query)
+                ).content
+
+            source_documents = retriever.invoke(question)
+            sources = self._format_sources(source_documents)
+            yield {"type": "sources", "sources": sources}
+
+            messages = CHAT_PROMPT.format_messages(
+                context="\n\n".join(doc.page_content for doc in source_documents),
+                question=question
+            )
+
+            answer_parts = []
+            for chunk in self.llm.stream(messages):
+                if chunk.content:
+                    answer_parts.append(chunk.content)
+                    yield {"type": "token", "content": chunk.content}
+
+            result = {
+                "answer": "".join(answer_parts),
+                "metadata": {"sources": sources}
+            }
+            if use_answer_cache:
+                self.answer_cache.store(user_id, query, result, entry["version"])
+            yield {"type": "done", **result}
+
+        except Exception as e:
+            self.logger.error(f"Error in streaming RAG processing: {str(e)}", exc_info=True)
+            yield {
+                "type": "done",
+                "answer": "I apologize, but I encountered an error while processing your query. Please try again.",
+                "metadata": {"error": str(e)}
+            }
+
+    def _can_use_answer_cache(self, message_count: int = None) -> bool:
+        """Cached answers are only safe for questions that open a conversation.
+
+        Follow-up questions depend on earlier turns, so they always go through
+        the full chain. The count covers the whole session, not the trimmed
+        window, and already includes the current question; without it the
+        cache is skipped.
+        """
+        return self.answer_cache_enabled and message_count is not None and message_count <= 1
+
+    def invalidate_user(self, user_id: int):
+        """Drop the cached retriever and chain for a user"""
+        with self._cache_lock:
+            self._chain_cache.pop(user_id, None)
+
+    def _get_cached_entry(self, user_id: int) -> Dict:
+        """Get the user's retriever and QA chain, rebuilding them if the collection changed"""
+        version = self.vector_store.get_collection_version(user_id)
+
+        with self._cache_lock:
+            entry = self._chain_cache.get(user_id)
+            if entry and entry["version"] == version:
+                self._chain_cache.move_to_end(user_id)
+                return entry
+
+        # The collection may have been changed by another process (e.g. an
+        # ingestion worker), also while the user had no cached entry
+        self.vector_store.ensure_current(user_id, version)
+
+        retriever = DenseRetriever(
+            vector_store=self.vector_store,
+            user_id=user_id,
+            k=Config.HYBRID_CANDIDATES if Config.HYBRID_SEARCH_ENABLED else Config.RETRIEVAL_TOP_K
+        )
+        if Config.HYBRID_SEARCH_ENABLED:
+            retriever = HybridRetriever(
+                dense_retriever=retriever,
+                lexical_index=self.lexical_index,
+                user_id=user_id,
+                collection_version=version,
+                k=Config.RETRIEVAL_TOP_K,
+                candidates=Config.HYBRID_CANDIDATES,
+                rrf_k=Config.HYBRID_RRF_K
+            )
+        entry = {
+            "version": version,
+            "retriever": retriever,
+            "chain": ConversationalRetrievalChain.from_llm(
+                llm=self.llm,
+                retriever=retriever,
+                return_source_documents=True
+            )
+        }
+
+        with self._cache_lock:
+            self._chain_cache[user_id] = entry
+            self._chain_cache.move_to_end(user_id)
+            while len(self._chain_cache) > self.cache_size:
+                self._chain_cache.popitem(last=False)
+
+        return entry
+
+    @staticmethod
+    def _prior_turns(query: str, chat_context: List[Dict] = None) -> List[Dict]:
+        """Messages before the current question, which ``chat_context`` ends with"""
+        chat_context = chat_context or []
+        if chat_context and chat_context[-1]["is_user"] and chat_context[-1]["content"] == query:
+            return chat_context[:-1]
+        return chat_context
+
+    def _format_chat_history(self, chat_context: List[Dict] = None, conversation_summary: str = None) -> str:
+        """Format earlier messages the way ConversationalRetrievalChain does; empty if there are none"""
+        lines = [f"system: Summary of the earlier conversation: {conversation_summary}"] if conversation_summary else []
+        lines.extend(
+            f"{'Human' if msg['is_user'] else 'Assistant'}: {msg['content']}"
+            for msg in chat_context or []
+        )
+        return "\n".join(lines)
+
+    def _format_sources(self, source_documents) -> List[Dict]:
+        """Extract source references from retrieved documents, with the documents' file names"""
+        document_ids = {doc.metadata["document_id"] for doc in source_documents}
+        names = dict(
+            db.session.query(DocumentRecord.id, DocumentRecord.original_filename)
+            .filter(DocumentRecord.id.in_(document_ids))
+            .all()
+        ) if document_ids else {}
+        return [
+            {
+                "document_id": doc.metadata["document_id"],
+                "document_name": names.get(doc.metadata["document_id"]),
+                "chunk_id": doc.metadata["chunk_id"]
+            } for doc in source_documents
+        ]
+
     def _handle_no_results(self, query: str) -> Dict:
         """Handle case when no relevant documents are found"""
         return {
@@ -89,20 +341,47 @@ class RAGEngine:
             "metadata": {"sources": []}
         }
 
+    def update_summary(self, summary: str, messages) -> str:
+        """Fold chat messages into a running conversation summary"""
+        transcript = "\n".join(
+            f"{'User' if msg.is_user else 'Assistant'}: {msg.content}" for msg in messages
+        )
+        prompt = PromptTemplate.from_template(
+            """Update the summary of a conversation with the messages that follow it.
+            Keep facts, names, numbers, questions and conclusions a later answer may refer to.
+
+            Summary so far:
+            {summary}
+
+            New messages:
+            {messages}
+
+            Reply with the updated summary only, in at most 200 words."""
+        )
+        response = self.llm.invoke(prompt.format(summary=summary or "(none)", messages=transcript))
+        return response.content.strip()
+
     def generate_session_summary(self, session_id: str) -> str:
-        """Generate a summary of the chat session"""
+        """Generate a summary of the chat session.
+
+        Builds on the stored rolling summary, so only the messages after its
+        high-water mark are sent rather than the whole conversation.
+        """
         try:
             chat_history = ChatHistory.query.filter_by(session_id=session_id).first()
-            if not chat_history or not chat_history.messages:
+            if not chat_history:
                 return "No chat history found to summarize."
 
+            from services import get_conversation_memory
             messages = [
                 f"{'User' if msg.is_user else 'Assistant'}: {msg.content}"
-                for msg in chat_history.messages
+                for msg in get_conversation_memory().unsummarized(chat_history)
             ]
 
-            if len(messages) < 2:
+            if not chat_history.summary and len(messages) < 2:
                 return "Not enough conversation to summarize."
+            if not messages:
+                return chat_history.summary
 
             prompt = PromptTemplate.from_template(
                 """Please provide a concise summary of this conversation, focusing on:
@@ -111,15 +390,18 @@ class RAGEngine:
                 - Important information provided
                 - Any decisions or conclusions reached
 
-                Conversation:
+                Summary of the earlier conversation:
+                {summary}
+
+                Latest messages:
                 {messages}
 
                 Keep the summary to 2-3 sentences."""
             )
 
-            formatted_prompt = prompt.format(messages="\n".join(messages))
-            response = self.llm.predict(formatted_prompt)
-            return response.strip()
+            formatted_prompt = prompt.format(summary=chat_history.summary or "(none)", messages="\n".join(messages))
+            response = self.llm.invoke(formatted_prompt)
+            return response.content.strip()
 
         except Exception as e:
             self.logger.error(f"Error generating session summary: {str(e)}", exc_info=True)
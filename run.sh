@@ -8,6 +8,11 @@ mkdir -p vector_db
 
 # Kill any gunicorn processes if running
 pkill -f gunicorn || true
+pkill -f ingestion_worker.py || true
+
+# Start the background ingestion worker
+echo "Starting ingestion worker..."
+python -u ingestion_worker.py &
 
 # Run the application with Python directly to use eventlet properly
 echo "Starting Flask application with SocketIO..."
@@ -0,0 +1,51 @@
+import threading
+
+# Process-wide services, created on first use. Building them imports
+# langchain and opens the vector backend, which would otherwise slow down
+# every worker boot and reload; sharing them means one vector client and one
+# embeddings object (with its cache and rate limiter) per process.
+_vector_store = None
+_rag_engine = None
+_document_processor = None
+_conversation_memory = None
+_lock = threading.RLock()
+
+
+def get_vector_store():
+    """Get the process-wide VectorStore"""
+    global _vector_store
+    with _lock:
+        if _vector_store is None:
+            from vector_store import VectorStore
+            _vector_store = VectorStore()
+        return _vector_store
+
+
+def get_rag_engine():
+    """Get the process-wide RAGEngine"""
+    global _rag_engine
+    with _lock:
+        if _rag_engine is None:
+            from rag_engine import RAGEngine
+            _rag_engine = RAGEngine(get_vector_store())
+        return _rag_engine
+
+
+def get_document_processor():
+    """Get the process-wide DocumentProcessor"""
+    global _document_processor
+    with _lock:
+        if _document_processor is None:
+            from document_processor import DocumentProcessor
+            _document_processor = DocumentProcessor(get_vector_store())
+        return _document_processor
+
+
+def get_conversation_memory():
+    """Get the process-wide ConversationMemory, summarizing with the RAG engine's LLM"""
+    global _conversation_memory
+    with _lock:
+        if _conversation_memory is None:
+            from conversation_memory import ConversationMemory
+            _conversation_memory = ConversationMemory(get_rag_engine().update_summary)
+        return _conversation_memory
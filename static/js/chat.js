@@ -78,14 +78,47 @@ document.addEventListener('DOMContentLoaded', function() {
         addErrorMessage('Unable to connect to the server. Please refresh the page.');
     });
 
+    // AI message currently being streamed token by token
+    let streamingMessage = null;
+    let streamingContent = null;
+
+    function startStreamingMessage() {
+        if (!streamingContent) {
+            typingIndicator.style.display = 'none';
+            streamingMessage = addAIMessage('');
+            streamingContent = streamingMessage.querySelector('.message-content');
+        }
+    }
+
+    // Sources arrive once retrieval finishes, before the first token
+    socket.on('message_sources', function(data) {
+        startStreamingMessage();
+        addSources(streamingMessage, data.sources);
+        scrollToBottom();
+    });
+
+    socket.on('message_chunk', function(data) {
+        startStreamingMessage();
+        streamingContent.textContent += data.content;
+        scrollToBottom();
+    });
+
     socket.on('receive_message', function(data) {
         typingIndicator.style.display = 'none';
-        addAIMessage(data.message);
+        if (data.streamed && streamingContent) {
+            streamingContent.innerHTML = data.message;
+        } else {
+            addSources(addAIMessage(data.message), data.sources);
+        }
+        streamingMessage = null;
+        streamingContent = null;
         scrollToBottom();
     });
 
     socket.on('error', function(data) {
         typingIndicator.style.display = 'none';
+        streamingMessage = null;
+        streamingContent = null;
         addErrorMessage(data.message || 'An error occurred.');
         scrollToBottom();
     });
@@ -136,7 +169,8 @@ document.addEventListener('DOMContentLoaded', function() {
 
         socket.emit('send_message', {
             message: message,
-            session_id: sessionId
+            session_id: sessionId,
+            stream: true
         });
     }
 
@@ -178,6 +212,37 @@ document.addEventListener('DOMContentLoaded', function() {
 
         chatContainer.appendChild(messageElement);
         scrollToBottom();
+        return messageElement;
+    }
+
+    function addSources(messageElement, sources) {
+        const existing = messageElement.querySelector('.sources-list');
+        if (existing) existing.remove();
+
+        // One badge per document, like the sources of stored messages
+        const names = [];
+        (sources || []).forEach(source => {
+            const name = source.document_name || `Document #${source.document_id}`;
+            if (!names.includes(name)) names.push(name);
+        });
+        if (!names.length) return;
+
+        const sourcesList = document.createElement('div');
+        sourcesList.className = 'sources-list';
+        sourcesList.innerHTML = `
+            <small class="text-muted">Sources:</small>
+            <div class="d-flex flex-wrap gap-2 mt-2"></div>
+        `;
+        const badges = sourcesList.querySelector('div');
+        names.forEach(name => {
+            const badge = document.createElement('span');
+            badge.className = 'badge bg-primary bg-opacity-25 sources-badge';
+            badge.innerHTML = '<i class="fas fa-file-alt me-1"></i>';
+            badge.appendChild(document.createTextNode(name));
+            badges.appendChild(badge);
+        });
+
+        messageElement.appendChild(sourcesList);
     }
 
     function addErrorMessage(message) {
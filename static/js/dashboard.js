@@ -81,7 +81,8 @@ document.addEventListener('DOMContentLoaded', function() {
         // Emit message via Socket.IO
         socket.emit('send_message', {
             message: message,
-            session_id: sessionId
+            session_id: sessionId,
+            stream: true
         });
     }
 
@@ -94,12 +95,46 @@ document.addEventListener('DOMContentLoaded', function() {
         addErrorMessage('Unable to connect to the server. Please refresh the page.');
     });
 
+    // AI message currently being streamed token by token
+    let streamingMessage = null;
+    let streamingContent = null;
+
+    function startStreamingMessage() {
+        if (!streamingContent) {
+            // Hide typing indicator once the answer starts
+            if (typingIndicator) {
+                typingIndicator.style.display = 'none';
+            }
+            streamingMessage = addChatMessage('', false);
+            streamingContent = streamingMessage.querySelector('.message-content');
+        }
+    }
+
+    // Sources arrive once retrieval finishes, before the first token
+    socket.on('message_sources', function(data) {
+        startStreamingMessage();
+        addSources(streamingMessage, data.sources);
+        chatContainer.scrollTop = chatContainer.scrollHeight;
+    });
+
+    socket.on('message_chunk', function(data) {
+        startStreamingMessage();
+        streamingContent.textContent += data.content;
+        chatContainer.scrollTop = chatContainer.scrollHeight;
+    });
+
     socket.on('receive_message', function(data) {
         // Hide typing indicator
         if (typingIndicator) {
             typingIndicator.style.display = 'none';
         }
-        addChatMessage(data.message, false);
+        if (data.streamed && streamingContent) {
+            streamingContent.innerHTML = data.message;
+        } else {
+            addSources(addChatMessage(data.message, false), data.sources);
+        }
+        streamingMessage = null;
+        streamingContent = null;
     });
 
     socket.on('error', function(data) {
@@ -107,9 +142,40 @@ document.addEventListener('DOMContentLoaded', function() {
         if (typingIndicator) {
             typingIndicator.style.display = 'none';
         }
+        streamingMessage = null;
+        streamingContent = null;
         addErrorMessage(data.message || 'An error occurred during processing.');
     });
 
+    function addSources(messageElement, sources) {
+        const existing = messageElement.querySelector('.sources-list');
+        if (existing) existing.remove();
+
+        // One badge per document
+        const names = [];
+        (sources || []).forEach(source => {
+            const name = source.document_name || `Document #${source.document_id}`;
+            if (!names.includes(name)) names.push(name);
+        });
+        if (!names.length) return;
+
+        const sourcesList = document.createElement('div');
+        sourcesList.className = 'sources-list';
+        sourcesList.innerHTML = `
+            <small class="text-muted">Sources:</small>
+            <div class="d-flex flex-wrap gap-2 mt-2"></div>
+        `;
+        const badges = sourcesList.querySelector('div');
+        names.forEach(name => {
+            const badge = document.createElement('span');
+            badge.className = 'badge bg-primary bg-opacity-25 sources-badge';
+            badge.innerHTML = '<i class="fas fa-file-alt me-1"></i>';
+            badge.appendChild(document.createTextNode(name));
+            badges.appendChild(badge);
+        });
+        messageElement.appendChild(sourcesList);
+    }
+
     function addChatMessage(message, isUser) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${isUser ? 'user-message' : 'ai-message'} animate__animated animate__fadeInUp`;
@@ -127,6 +193,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
         chatContainer.appendChild(messageDiv);
         chatContainer.scrollTop = chatContainer.scrollHeight;
+        return messageDiv;
     }
 
     function addErrorMessage(message) {
@@ -676,17 +743,19 @@ document.addEventListener('DOMContentLoaded', function() {
                     document.querySelector('.recent-documents') : 
                     document.querySelector('.recent-conversations');
 
-                // Calculate current offset based on number of items
-                const currentItems = container.querySelectorAll(type === 'documents' ? 
+                // Continue after the last item shown (its cursor is an opaque position)
+                const shownItems = container.querySelectorAll(type === 'documents' ? 
                     '.document-item:not(.load-more-container)' : 
-                    '.conversation-preview:not(.load-more-container)').length;
+                    '.conversation-preview:not(.load-more-container)');
+                const lastItem = shownItems[shownItems.length - 1];
+                const cursor = encodeURIComponent(lastItem ? lastItem.getAttribute('data-cursor') || '' : '');
 
                 // Show loading state
                 this.innerHTML = '<i class="fas fa-spinner fa-spin me-1"></i> Loading...';
 
                 if (type === 'documents') {
                     // Load more documents
-                    fetch(`/documents/more?offset=${currentItems}&limit=5`)
+                    fetch(`/documents/more?cursor=${cursor}&limit=5`)
                         .then(response => response.json())
                         .then(data => {
                             if (data.success) {
@@ -723,7 +792,7 @@ document.addEventListener('DOMContentLoaded', function() {
                         });
                 } else {
                     // Load more conversations
-                    fetch(`/chat/more_conversations?offset=${currentItems}&limit=5`)
+                    fetch(`/chat/more_conversations?cursor=${cursor}&limit=5`)
                         .then(response => response.json())
                         .then(data => {
                             if (data.success) {
@@ -802,6 +871,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const element = document.createElement('div');
         element.className = 'document-item document-preview';
         element.setAttribute('data-document-id', doc.id);
+        element.setAttribute('data-cursor', doc.cursor);
 
         element.innerHTML = `
             <div class="document-icon document-icon-${doc.file_type}">
@@ -832,6 +902,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const element = document.createElement('div');
         element.className = 'document-item conversation-preview';
         element.setAttribute('data-session-id', convo.session_id);
+        element.setAttribute('data-cursor', convo.cursor);
 
         element.innerHTML = `
             <div class="document-icon document-icon-chat">
@@ -0,0 +1,5 @@
+import os
+
+# Config reads the environment on import; tests run without eventlet and on in-memory SQLite
+os.environ.setdefault("DISABLE_EVENTLET_MONKEY_PATCH", "1")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
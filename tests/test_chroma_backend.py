@@ -0,0 +1,29 @@
+import threading
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("flask_sqlalchemy")
+pytest.importorskip("eventlet")
+
+
+@pytest.fixture
+def backend(tmp_path):
+    import app  # noqa: F401  Models import the app, so it goes first
+    from vector_store import ChromaBackend
+    return ChromaBackend(str(tmp_path))
+
+
+def test_refresh_waits_for_calls_in_flight(backend):
+    backend.add("user_1_docs", ids=["chunk_1"], embeddings=[[1.0, 0.0, 0.0]], metadatas=[{"chunk_id": 1}])
+    generation = type(backend)._generation
+    refreshing = threading.Thread(target=backend.refresh)
+
+    with backend._access.shared():  # A query running in another thread
+        refreshing.start()
+        refreshing.join(0.2)
+        assert refreshing.is_alive()
+        assert type(backend)._generation == generation
+
+    refreshing.join(5)
+    assert type(backend)._generation == generation + 1
+    assert [hit["id"] for hit in backend.query("user_1_docs", [1.0, 0.0, 0.0], 1)] == ["chunk_1"]
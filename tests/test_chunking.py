@@ -0,0 +1,77 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from chunking import TokenChunker
+
+SENTENCE = "Alpha beta gamma delta."
+
+
+def chunk(text, chunk_tokens=100, overlap_tokens=20, max_tokens=128):
+    return list(TokenChunker(chunk_tokens, overlap_tokens, max_tokens).iter_chunks([text]))
+
+
+def test_no_chunk_of_pure_overlap_before_oversized_unit():
+    # The paragraph break carries overlap; the next unit doesn't fit beside it
+    text = " ".join([SENTENCE] * 10) + "\n\n" + "x" * 350 + ".\n"
+    chunks = chunk(text)
+
+    assert len(chunks) == 2
+    assert chunks[0] == " ".join([SENTENCE] * 10)
+    assert chunks[1].startswith("x")
+
+
+def test_no_trailing_chunk_of_pure_overlap():
+    for count in range(10, 60):
+        chunks = chunk(" ".join(f"Sentence {i} goes here." for i in range(count)))
+
+        for previous, current in zip(chunks, chunks[1:]):
+            assert not previous.endswith(current)
+
+
+def test_overlap_repeats_tail_of_previous_chunk():
+    chunks = chunk(" ".join(f"Sentence number {i} is here." for i in range(60)))
+
+    assert len(chunks) > 1
+    for previous, current in zip(chunks, chunks[1:]):
+        first_sentence = current.split(". ")[0]
+        assert first_sentence in previous
+
+
+def test_interleaved_runs_of_one_chunker_are_independent():
+    # One chunker is shared by documents processed in parallel threads
+    chunker = TokenChunker(100, 20, 128)
+    texts = [
+        " ".join(f"Sentence number {i} is here." for i in range(60)),
+        "\n\n".join(f"Paragraph {i} talks about other things." for i in range(40))
+    ]
+
+    runs = [chunker.iter_chunks([text]) for text in texts]
+    results = [[], []]
+    while runs[0] or runs[1]:
+        for index, run in enumerate(runs):
+            if run:
+                chunk_text = next(run, None)
+                if chunk_text is None:
+                    runs[index] = None
+                else:
+                    results[index].append(chunk_text)
+
+    assert results == [chunk(text) for text in texts]
+
+
+def test_shared_chunker_in_parallel_threads():
+    # DocumentProcessor advances its chunker in offload threads, one per document being ingested
+    chunker = TokenChunker(100, 20, 128)
+    texts = [
+        [f"Document {n} sentence {i} is about topic {n}." for i in range(200)]
+        for n in range(8)
+    ]
+
+    def pages(sentences):
+        for start in range(0, len(sentences), 5):
+            time.sleep(0)  # Let the other threads advance their documents
+            yield " ".join(sentences[start:start + 5])
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda sentences: list(chunker.iter_chunks(pages(sentences))), texts))
+
+    assert results == [list(TokenChunker(100, 20, 128).iter_chunks(pages(sentences))) for sentences in texts]
@@ -0,0 +1,21 @@
+import contextvars
+import pytest
+
+pytest.importorskip("eventlet")
+
+from concurrency import fan_out
+
+request_user = contextvars.ContextVar("request_user")
+
+
+def test_fan_out_returns_results_in_order_with_the_callers_context():
+    request_user.set(7)
+    assert fan_out([lambda: request_user.get(), lambda: "dense"]) == [7, "dense"]
+
+
+def test_fan_out_raises_the_first_exception():
+    def fail():
+        raise ValueError("lexical search failed")
+
+    with pytest.raises(ValueError):
+        fan_out([fail, lambda: "dense"])
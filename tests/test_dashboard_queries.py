@@ -0,0 +1,86 @@
+import uuid
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+pytest.importorskip("flask_socketio")
+pytest.importorskip("eventlet")
+
+from sqlalchemy import event
+
+
+@pytest.fixture
+def app():
+    from app import app, db
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def user(app):
+    from app import db
+    from models import User
+    user = User(username="reader", email="reader@example.com")
+    user.set_password("password123")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def add_sessions(user, count, messages=5):
+    from app import db
+    from models import ChatHistory, ChatMessage, Document
+    for i in range(count):
+        chat_history = ChatHistory(session_id=str(uuid.uuid4()), user_id=user.id)
+        db.session.add(chat_history)
+        db.session.flush()
+        for j in range(messages):
+            db.session.add(ChatMessage(chat_history_id=chat_history.id, content=f"Message {j}", is_user=j % 2 == 0))
+        db.session.add(Document(
+            filename=f"doc-{i}.txt", original_filename=f"doc-{i}.txt",
+            file_type="txt", file_size=100, user_id=user.id
+        ))
+    db.session.commit()
+
+
+def page_queries(app, user, url):
+    """Statements run to serve ``url`` to the logged-in user"""
+    from app import db
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user.id)
+        session["_fresh"] = True
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+    assert response.status_code == 200
+    if response.is_json:
+        assert response.get_json()["success"]
+    return statements
+
+
+@pytest.mark.parametrize("url", [
+    "/dashboard",
+    "/chat/more_conversations?limit=10",
+    "/chat/recent_conversations",
+    "/documents/more?limit=10",
+])
+def test_query_count_does_not_grow_with_page_size(app, user, url):
+    add_sessions(user, 1)
+    few = page_queries(app, user, url)
+
+    add_sessions(user, 5)
+    many = page_queries(app, user, url)
+
+    assert len(many) == len(few)
@@ -0,0 +1,44 @@
+import os
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+pytest.importorskip("eventlet")
+pytest.importorskip("docx")
+pytest.importorskip("openpyxl")
+
+
+@pytest.fixture
+def processor_class():
+    import app  # noqa: F401  Models import the app, so it goes first
+    from document_processor import DocumentProcessor
+    return DocumentProcessor
+
+
+def test_snapshot_keeps_the_version_a_job_started_with(processor_class, tmp_path):
+    upload = tmp_path / "1_report.xlsx"
+    upload.write_bytes(b"first version")
+
+    snapshot = processor_class._snapshot_file(str(upload))
+    new_version = tmp_path / "upload.tmp"
+    new_version.write_bytes(b"second version")
+    os.replace(new_version, upload)  # As _save_file swaps in a re-upload
+
+    assert snapshot.endswith(".xlsx")
+    with open(snapshot, "rb") as f:
+        assert f.read() == b"first version"
+
+
+def test_wide_spreadsheet_rows_are_split_with_the_header(processor_class, tmp_path):
+    from app import app
+    path = tmp_path / "wide.csv"
+    path.write_text("id,notes,amount\n1,short,10\n2," + "word " * 300 + ",20\n3,short,30\n")
+
+    with app.app_context():
+        processor = processor_class(vector_store=object())
+        groups = list(processor._iter_spreadsheet_row_groups(str(path), "csv", chunk_size=200))
+
+    assert len(groups) > 3
+    assert all(group.startswith("id | notes | amount\n") for group in groups)
+    assert all(len(group) <= 200 for group in groups)
+    rows = "".join(group.split("\n", 1)[1].replace("\n", "") for group in groups)
+    assert rows.replace(" | ", "").replace(" ", "") == ("1short10" + "2" + "word" * 300 + "20" + "3short30")
@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("numpy")
+pytest.importorskip("flask_sqlalchemy")
+pytest.importorskip("eventlet")
+
+import numpy as np
+
+
+@pytest.fixture
+def backend(tmp_path):
+    import app  # noqa: F401  Models import the app, so it goes first
+    from vector_store import FaissBackend
+    return FaissBackend(str(tmp_path), factory="HNSW32")
+
+
+def vectors(count, seed=0):
+    return np.random.default_rng(seed).random((count, 8), dtype="float32").tolist()
+
+
+def test_adding_an_existing_id_to_hnsw_replaces_it(backend):
+    first, second = vectors(2)
+    backend.add("user_1_docs", ids=["chunk_1"], embeddings=[first], metadatas=[{"version": 1}], documents=["old"])
+    backend.add("user_1_docs", ids=["chunk_1"], embeddings=[second], metadatas=[{"version": 2}], documents=["new"])
+
+    assert list(backend.list_ids("user_1_docs")) == ["chunk_1"]
+    hits = backend.query("user_1_docs", first, 5)
+    assert [(hit["id"], hit["metadata"], hit["document"]) for hit in hits] == [("chunk_1", {"version": 2}, "new")]
+
+
+def test_deleted_hnsw_vectors_are_skipped_and_ids_reusable(backend):
+    embeddings = vectors(3)
+    backend.add("user_1_docs", ids=["a", "b", "c"], embeddings=embeddings, metadatas=[{}, {}, {}])
+    backend.delete("user_1_docs", ids=["b"])
+
+    assert {hit["id"] for hit in backend.query("user_1_docs", embeddings[1], 3)} == {"a", "c"}
+
+    backend.add("user_1_docs", ids=["b"], embeddings=[embeddings[1]], metadatas=[{}])
+    assert backend.query("user_1_docs", embeddings[1], 1)[0]["id"] == "b"
+    assert backend.compact("user_1_docs") == 3
+
+
+def test_dropping_a_missing_collection_leaves_no_files(backend, tmp_path):
+    before = sorted(path.name for path in tmp_path.rglob("*"))
+    backend.drop("user_1_answers")
+    assert sorted(path.name for path in tmp_path.rglob("*")) == before
@@ -0,0 +1,60 @@
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+pytest.importorskip("eventlet")
+
+
+class RecordingBackend:
+    """Stands in for a vector engine and records what VectorStore asks of it"""
+
+    def __init__(self):
+        self.dropped = []
+
+    def add(self, collection, ids, embeddings, metadatas, documents=None, space="l2"):
+        pass
+
+    def defer_writes(self, collection):
+        pass
+
+    def flush(self, collection):
+        return True
+
+    def drop(self, collection):
+        self.dropped.append(collection)
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    from app import app, db
+    from config import Config
+    from vector_store import VectorStore
+    monkeypatch.setattr(Config, "EMBEDDING_CACHE_PATH", str(tmp_path / "embedding_cache.sqlite3"))
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield VectorStore(backend=RecordingBackend())
+        db.session.remove()
+
+
+def test_answers_are_dropped_once_per_document(store, monkeypatch):
+    from config import Config
+    monkeypatch.setattr(Config, "ANSWER_CACHE_ENABLED", True)
+
+    with store.deferred_writes(1):
+        for _ in range(3):  # One version bump per batch of chunks
+            store.bump_collection_version(1)
+
+    assert len(store.backend.dropped) == 1
+    assert store.get_collection_version(1) == 4
+
+
+def test_answers_are_not_dropped_without_the_answer_cache(store, monkeypatch):
+    from config import Config
+    monkeypatch.setattr(Config, "ANSWER_CACHE_ENABLED", False)
+
+    with store.deferred_writes(1):
+        store.bump_collection_version(1)
+    store.bump_collection_version(1)
+
+    assert store.backend.dropped == []
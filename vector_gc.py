@@ -0,0 +1,158 @@
+import os
+import re
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, Optional, Set
+from sqlalchemy import text
+from models import User, Document, DocumentChunk, IngestionJob
+from config import Config
+from app import db
+
+class VectorGarbageCollector:
+    """
+    Reconciles vector collections with the DocumentChunk table.
+
+    Vectors whose chunk row no longer exists are deleted (left behind by
+    documents deleted before the delete route removed vectors, or by failed
+    ingestion cleanups), collections of deleted users are dropped, and the
+    backend compacts each collection to reclaim the space. Users with queued
+    or running ingestion jobs are skipped, since their new vectors are stored
+    just before the chunk rows are committed. Writers that run outside the
+    queue (inline ingestion, re-syncs) are covered by the per-user collection
+    lock taken before the final check.
+
+    Runs from the ingestion workers every VECTOR_GC_INTERVAL_SECONDS, guarded
+    by a PostgreSQL advisory lock so only one process collects at a time, or
+    on demand with ``flask compact-vectors``.
+    """
+
+    _COLLECTION = re.compile(r'^user_(\d+)_(docs|answers)(?:_\d+d)?$')
+    _CHUNK_ID = re.compile(r'^chunk_(\d+)$')
+    # Arbitrary application-wide advisory lock key
+    LOCK_KEY = 7_316_047_101
+    DELETE_BATCH_SIZE = 1000
+
+    def __init__(self, vector_store, interval: int = None):
+        self.vector_store = vector_store
+        self.backend = vector_store.backend
+        self.interval = interval if interval is not None else Config.VECTOR_GC_INTERVAL_SECONDS
+        self.marker_path = os.path.join(Config.VECTOR_DB_PATH, "gc_last_run")
+        self.logger = logging.getLogger(__name__)
+
+    def run_if_due(self) -> Optional[Dict]:
+        """Collect garbage if the last run (by any process) is older than the interval"""
+        if not self.interval or not self._is_due():
+            return None
+
+        with self._exclusive() as acquired:
+            # Another process may have finished a run while we waited
+            if not acquired or not self._is_due():
+                return None
+            try:
+                return self.run()
+            finally:
+                # Failed runs wait for the next interval too
+                with open(self.marker_path, "w") as marker:
+                    marker.write(str(int(time.time())))
+
+    def _is_due(self) -> bool:
+        try:
+            return time.time() - os.path.getmtime(self.marker_path) >= self.interval
+        except FileNotFoundError:
+            return True
+
+    def run(self, user_id: int = None) -> Dict:
+        """Reconcile all collections, or only those of one user"""
+        stats = {"collections": 0, "orphans_deleted": 0, "collections_dropped": 0, "skipped": 0}
+        existing_users = {id for (id,) in db.session.query(User.id)}
+        busy_users = {id for (id,) in db.session.query(IngestionJob.user_id).filter(
+            IngestionJob.status.in_(('pending', 'running'))
+        ).distinct()}
+
+        for collection in self.backend.list_collections():
+            match = self._COLLECTION.match(collection)
+            if not match:
+                continue
+            owner_id, kind = int(match.group(1)), match.group(2)
+            if user_id is not None and owner_id != user_id:
+                continue
+
+            stats["collections"] += 1
+            if owner_id not in existing_users:
+                self.backend.drop(collection)
+                stats["collections_dropped"] += 1
+                self.logger.info(f"Dropped collection {collection} of deleted user {owner_id}")
+                continue
+            if kind != "docs":
+                continue  # Answer caches are dropped whenever documents change
+            if owner_id in busy_users:
+                stats["skipped"] += 1
+                continue
+
+            try:
+                stats["orphans_deleted"] += self._collect(collection, owner_id)
+                self.backend.compact(collection)
+            except Exception as e:
+                db.session.rollback()
+                self.logger.error(f"Garbage collection of {collection} failed: {str(e)}", exc_info=True)
+
+        self.logger.info(
+            f"Vector garbage collection: {stats['orphans_deleted']} orphaned vectors deleted, "
+            f"{stats['collections_dropped']} collections dropped, {stats['skipped']} skipped"
+        )
+        return stats
+
+    def _collect(self, collection: str, user_id: int) -> int:
+        """Delete vectors of one collection that have no chunk row; returns how many"""
+        # Vector ids are listed before chunk rows are read, so rows committed
+        # in between still count as live
+        vector_ids = list(self.backend.list_ids(collection))
+        live = self._live_chunk_ids(user_id)
+        orphans = [vector_id for vector_id in vector_ids if self._is_orphan(vector_id, live)]
+        if not orphans:
+            return 0
+
+        # Wait for in-flight writers (queued, inline or re-sync ingestion) to
+        # commit their chunk rows, then check again right before deleting
+        self.vector_store.lock_collection(user_id, exclusive=True)
+        live = self._live_chunk_ids(user_id)
+        orphans = [vector_id for vector_id in orphans if self._is_orphan(vector_id, live)]
+        if not orphans:
+            db.session.commit()  # Release the lock
+            return 0
+        for start in range(0, len(orphans), self.DELETE_BATCH_SIZE):
+            self.backend.delete(collection, ids=orphans[start:start + self.DELETE_BATCH_SIZE])
+
+        self.vector_store.bump_collection_version(user_id)
+        db.session.commit()
+        self.logger.info(f"Deleted {len(orphans)} orphaned vectors from {collection}")
+        return len(orphans)
+
+    def _live_chunk_ids(self, user_id: int) -> Set[int]:
+        return {
+            chunk_id for (chunk_id,) in db.session.query(DocumentChunk.id)
+            .join(Document, DocumentChunk.document_id == Document.id)
+            .filter(Document.user_id == user_id)
+            .yield_per(10000)
+        }
+
+    def _is_orphan(self, vector_id: str, live: Set[int]) -> bool:
+        match = self._CHUNK_ID.match(vector_id)
+        # Ids in an unknown format are left alone
+        return bool(match) and int(match.group(1)) not in live
+
+    @contextmanager
+    def _exclusive(self):
+        """Hold an advisory lock for the duration of the run, where the database supports it"""
+        if db.engine.dialect.name != "postgresql":
+            yield True
+            return
+
+        with db.engine.connect() as connection:
+            acquired = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.LOCK_KEY}).scalar()
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.LOCK_KEY})
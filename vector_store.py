@@ -1,81 +1,957 @@
-import chromadb
+import os
+import json
+import fcntl
+import sqlite3
 import logging
-from chromadb.config import Settings
-from langchain_openai import OpenAIEmbeddings
-from flask import current_app
+from eventlet import patcher
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+import numpy as np
+from langchain_core.documents import Document as LangchainDocument
+from models import CollectionState
+from config import Config
+from embedding_cache import CachedEmbeddings
+from embedding_scheduler import EmbeddingScheduler, collection_suffix, embedding_id
+from answer_cache import AnswerCache
+from concurrency import offload
+from sqlalchemy import text
+from app import db
+
+# The unpatched module, even when eventlet has monkey-patched threading
+_original_threading = patcher.original("threading")
+
+
+class _ReadWriteLock:
+    """Shared/exclusive lock for OS threads; a waiting writer holds off new readers"""
 
-class VectorStore:
     def __init__(self):
-        """Initialize vector store with ChromaDB"""
+        self._condition = _original_threading.Condition()
+        self._readers = 0
+        self._writers_waiting = 0
+        self._writing = False
+
+    @contextmanager
+    def shared(self):
+        with self._condition:
+            while self._writing or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._condition:
+            self._writers_waiting += 1
+            try:
+                while self._writing or self._readers:
+                    self._condition.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+class VectorBackend:
+    """
+    Interface of the vector index engines behind VectorStore.
+
+    Collections are named (``user_{id}_docs``, ``user_{id}_answers``) and hold
+    vectors under string ids with flat metadata. Distances follow the space the
+    collection was created with: squared L2 for "l2", 1 - cosine similarity
+    for "cosine".
+    """
+
+    def add(self, collection: str, ids: List[str], embeddings, metadatas: List[Dict],
+            documents: List[str] = None, space: str = "l2"):
+        """Add vectors, creating the collection if needed"""
+        raise NotImplementedError
+
+    def query(self, collection: str, embedding, k: int, where: Dict = None) -> List[Dict]:
+        """Return up to k nearest hits as dicts with id, distance, metadata and document"""
+        raise NotImplementedError
+
+    def update_metadata(self, collection: str, ids: List[str], metadatas: List[Dict]):
+        """Replace the metadata of stored vectors"""
+        raise NotImplementedError
+
+    def delete(self, collection: str, ids: List[str] = None, where: Dict = None):
+        """Delete vectors by id or by metadata equality"""
+        raise NotImplementedError
+
+    def drop(self, collection: str):
+        """Delete a whole collection; missing collections are ignored"""
+        raise NotImplementedError
+
+    def list_collections(self) -> List[str]:
+        raise NotImplementedError
+
+    def list_ids(self, collection: str) -> Iterator[str]:
+        """Iterate over the ids stored in a collection"""
+        raise NotImplementedError
+
+    def compact(self, collection: str):
+        """Reclaim space left by deleted vectors, where the engine needs it"""
+
+    def defer_writes(self, collection: str):
+        """Let the engine keep writes to a collection in memory until ``flush``"""
+
+    def flush(self, collection: str) -> bool:
+        """End a ``defer_writes``; persists the collection once the last one ends.
+
+        Returns True if deferred changes were written just now.
+        """
+        return False
+
+    def refresh(self):
+        """Pick up writes made by other processes"""
+
+
+class ChromaBackend(VectorBackend):
+    """ChromaDB, one Chroma collection per collection name.
+
+    Uses the persistent client on ``persist_directory`` unless CHROMA_HOST
+    points to a Chroma server, which deployments with several worker processes
+    should use: the embedded client isn't safe with concurrent writers.
+    """
+
+    # Bumped by refresh(). Clearing Chroma's system cache stops every embedded
+    # client of the process, so each backend reconnects once it sees a new value.
+    _generation = 0
+    # Calls hold it shared; refresh() waits for them and holds it exclusively
+    _access = _ReadWriteLock()
+
+    def __init__(self, persist_directory: str):
+        self.persist_directory = persist_directory
+        self._client_generation = ChromaBackend._generation
+        self._client = self._connect()
+
+    @property
+    def client(self):
+        if self._client_generation != ChromaBackend._generation:
+            self._client_generation = ChromaBackend._generation
+            self._client = self._connect()
+        return self._client
+
+    def _connect(self):
+        import chromadb  # Imported on first use; it's slow and unused with FAISS
+
+        if Config.CHROMA_HOST:
+            return chromadb.HttpClient(host=Config.CHROMA_HOST, port=Config.CHROMA_PORT)
+        return chromadb.PersistentClient(path=self.persist_directory)
+
+    def add(self, collection, ids, embeddings, metadatas, documents=None, space="l2"):
+        with self._access.shared():
+            self._get_or_create(collection, space).add(
+                embeddings=embeddings,
+                documents=documents,
+                metadatas=metadatas,
+                ids=ids
+            )
+
+    def query(self, collection, embedding, k, where=None):
+        with self._access.shared():
+            try:
+                chroma_collection = self.client.get_collection(collection)
+            except Exception:
+                return []  # Nothing stored yet
+
+            results = chroma_collection.query(
+                query_embeddings=[embedding],
+                n_results=k,
+                where=where
+            )
+        if not results["ids"] or not results["ids"][0]:
+            return []
+        return [
+            {"id": id, "distance": distance, "metadata": metadata, "document": document}
+            for id, distance, metadata, document in zip(
+                results["ids"][0], results["distances"][0], results["metadatas"][0], results["documents"][0]
+            )
+        ]
+
+    def update_metadata(self, collection, ids, metadatas):
+        with self._access.shared():
+            self.client.get_collection(collection).update(ids=ids, metadatas=metadatas)
+
+    def delete(self, collection, ids=None, where=None):
+        with self._access.shared():
+            try:
+                chroma_collection = self.client.get_collection(collection)
+            except Exception:
+                return
+            chroma_collection.delete(ids=ids, where=where)
+
+    def drop(self, collection):
+        with self._access.shared():
+            try:
+                self.client.delete_collection(collection)
+            except Exception:
+                pass
+
+    def list_collections(self):
+        # Older Chroma versions return Collection objects, newer ones names
+        with self._access.shared():
+            return [getattr(collection, "name", collection) for collection in self.client.list_collections()]
+
+    def list_ids(self, collection, page_size=10000):
+        offset = 0
+        while True:
+            # Not held while the caller consumes a page, which may take long
+            with self._access.shared():
+                ids = self.client.get_collection(collection).get(include=[], limit=page_size, offset=offset)["ids"]
+            if not ids:
+                return
+            yield from ids
+            offset += len(ids)
+
+    def refresh(self):
+        """Reopen the client so writes made by other processes become visible.
+
+        Chroma keeps a per-process view of each collection's index, so vectors
+        added by an ingestion worker only show up after the client is reopened.
+        This is process-wide: all embedded clients are reopened, after the
+        calls in flight on them have finished. A Chroma server is always current.
+        """
+        from chromadb.api.client import SharedSystemClient
+
+        if Config.CHROMA_HOST:
+            return
+        with self._access.exclusive():
+            SharedSystemClient.clear_system_cache()
+            ChromaBackend._generation += 1
+
+    def _get_or_create(self, collection, space):
+        # Existing collections keep the settings they were created with
+        try:
+            return self.client.get_collection(collection)
+        except Exception:
+            return self.client.get_or_create_collection(name=collection, metadata={"hnsw:space": space})
+
+
+class FaissBackend(VectorBackend):
+    """
+    FAISS indexes stored as files under ``<vector_db>/faiss``, one per collection.
+
+    Each collection has an ``.index`` file (IDMap2 around the configured index
+    factory, e.g. "HNSW32", "HNSW32,SQfp16" or "IVF1024,PQ64") and a SQLite
+    sidecar mapping FAISS ids to string ids, metadata and documents. Factories
+    that need training start out flat and are rebuilt once
+    FAISS_TRAIN_MIN_VECTORS vectors are stored.
+
+    Index files are replaced atomically and opened memory-mapped for queries;
+    a replaced file is picked up by every process on its next query. Between
+    ``defer_writes`` and ``flush`` (e.g. all batches of one document) the
+    index is kept in memory and written once at the end instead of after
+    every batch; changes are also remembered, so if another process replaces
+    the file meanwhile they are applied again on top of its version. HNSW
+    cannot remove vectors, so deletions there only remove the sidecar row; the
+    vector stays in the index as a tombstone, is dropped from results since
+    it has no row, and is gone once the collection is compacted.
+
+    With quantized storage (SQ8, SQfp16, PQ) the float32 vectors are also kept
+    in a ``.vectors`` file on disk. Queries take FAISS_RERANK_FACTOR times more
+    candidates from the compact index and re-rank them with the exact vectors,
+    which are read memory-mapped, so only the candidates' pages are touched.
+    """
+
+    READER_CACHE_SIZE = 32
+    REBUILD_BATCH_SIZE = 10000
+
+    def __init__(self, persist_directory: str, factory: str = None):
+        import faiss
+        self.faiss = faiss
+        self.directory = os.path.join(persist_directory, "faiss")
+        os.makedirs(self.directory, exist_ok=True)
+        self.factory = factory or Config.FAISS_INDEX_FACTORY
+        self.logger = logging.getLogger(__name__)
+        # collection -> (index file mtime, index opened for queries), least recently used first
+        self._readers = OrderedDict()
+        # collection -> index being modified while writes are deferred, with
+        # the version of the file it is based on and the changes not written yet
+        self._writers = {}
+        # collection -> number of open defer_writes() calls
+        self._deferred = {}
+        # Real OS locks: writes run in eventlet.tpool threads, where green
+        # locks don't exclude anything. ``_lock`` guards the dicts above and
+        # is only held briefly, since green threads take it too; writers
+        # hold their collection's lock instead.
+        self._lock = _original_threading.RLock()
+        self._collection_locks = {}
+
+    def add(self, collection, ids, embeddings, metadatas, documents=None, space="l2"):
+        if not ids:
+            return
+        with self._write_lock(collection), self._connect(collection) as connection:
+            settings = self._get_settings(connection)
+            if not settings:
+                settings = self._create_settings(connection, space, len(embeddings[0]))
+            vectors = self._as_matrix(embeddings, settings)
+            if vectors.shape[1] != int(settings["dimension"]):
+                raise ValueError(
+                    f"Collection {collection} stores {settings['dimension']}-dimensional vectors, got {vectors.shape[1]}"
+                )
+
+            index = self._writable_index(collection, settings)
+
+            # Adding an existing id replaces its vector
+            replaced = self._find(connection, ids=ids)
+            if replaced and self._remove(connection, index, replaced):
+                self._record(collection, replaced)
+            # Rows tombstoned by older versions still hold their ids
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                connection.execute(
+                    f"DELETE FROM entries WHERE deleted = 1 AND id IN ({','.join('?' * len(batch))})", batch
+                )
+
+            next_id = int(settings["next_id"])
+            faiss_ids = np.arange(next_id, next_id + len(ids), dtype="int64")
+            documents = documents or [None] * len(ids)
+            connection.executemany(
+                "INSERT INTO entries (faiss_id, id, metadata, document) VALUES (?, ?, ?, ?)",
+                [
+                    (int(faiss_id), id, json.dumps(metadata), document)
+                    for faiss_id, id, metadata, document in zip(faiss_ids, ids, metadatas, documents)
+                ]
+            )
+            self._set_setting(connection, "next_id", next_id + len(ids))
+            if settings["float_vectors"] == "1":
+                self._write_vectors(collection, next_id, vectors)
+
+            index.add_with_ids(vectors, faiss_ids)
+            self._record(collection, faiss_ids, vectors)
+            rebuilt = settings["built_factory"] != settings["factory"] and index.ntotal >= Config.FAISS_TRAIN_MIN_VECTORS
+            if rebuilt:
+                index = self._rebuild(collection, connection, index, settings, settings["factory"])
+
+            # Sidecar first: ids it knows without vectors are harmless, the reverse could reuse ids
+            connection.commit()
+            if rebuilt:
+                # Written right away so other processes don't keep adding to the untrained index
+                self._write_index(collection, index)
+            else:
+                self._store_index(collection, index)
+
+    def query(self, collection, embedding, k, where=None):
+        if not os.path.exists(self._path(collection, ".sqlite3")):
+            return []
+        with self._connect(collection) as connection:
+            settings = self._get_settings(connection)
+            index = self._get_reader(collection)
+            if not settings or index is None or index.ntotal == 0:
+                return []
+
+            vector = self._as_matrix([embedding], settings)
+            rerank = settings["float_vectors"] == "1"
+            fetch = k * (Config.FAISS_RERANK_FACTOR if rerank else 1) * (4 if where else 1)
+            while True:
+                distances, labels = index.search(vector, min(fetch, index.ntotal))
+                labels, distances = labels[0], distances[0]
+                if rerank:
+                    labels, distances = self._rerank(collection, settings, vector[0], labels)
+                hits = self._resolve(connection, labels, distances, settings, where)
+                # Tombstones and filters can eat into the results; widen the search
+                if len(hits) >= k or fetch >= index.ntotal:
+                    return hits[:k]
+                fetch *= 4
+
+    def update_metadata(self, collection, ids, metadatas):
+        with self._write_lock(collection), self._connect(collection) as connection:
+            connection.executemany(
+                "UPDATE entries SET metadata = ? WHERE id = ? AND deleted = 0",
+                [(json.dumps(metadata), id) for id, metadata in zip(ids, metadatas)]
+            )
+            connection.commit()
+
+    def delete(self, collection, ids=None, where=None):
+        if not os.path.exists(self._path(collection, ".sqlite3")):
+            return
+        with self._write_lock(collection), self._connect(collection) as connection:
+            settings = self._get_settings(connection)
+            faiss_ids = self._find(connection, ids=ids, where=where)
+            if not settings or not faiss_ids:
+                return
+            index = self._writable_index(collection, settings)
+            if self._remove(connection, index, faiss_ids):
+                self._record(collection, faiss_ids)
+                connection.commit()
+                self._store_index(collection, index)
+            else:
+                connection.commit()
+
+    def drop(self, collection):
+        if not os.path.exists(self._path(collection, ".sqlite3")):
+            return  # Never created; taking the write lock would leave a lock file behind
+        with self._write_lock(collection):
+            for suffix in (".index", ".vectors", ".sqlite3", ".sqlite3-wal", ".sqlite3-shm"):
+                try:
+                    os.remove(self._path(collection, suffix))
+                except FileNotFoundError:
+                    pass
+            with self._lock:
+                self._readers.pop(collection, None)
+                self._writers.pop(collection, None)
+
+    def list_collections(self):
+        return sorted(name[:-len(".sqlite3")] for name in os.listdir(self.directory) if name.endswith(".sqlite3"))
+
+    def list_ids(self, collection):
+        if not os.path.exists(self._path(collection, ".sqlite3")):
+            return
+        with self._connect(collection) as connection:
+            for (id,) in connection.execute("SELECT id FROM entries WHERE deleted = 0"):
+                yield id
+
+    def compact(self, collection) -> int:
+        """Rebuild a collection without tombstoned vectors; returns the number of live vectors"""
+        if not os.path.exists(self._path(collection, ".sqlite3")):
+            return 0
+        with self._write_lock(collection), self._connect(collection) as connection:
+            settings = self._get_settings(connection)
+            if not settings:
+                return 0
+            index = self._writable_index(collection, settings)
+            index = self._rebuild(collection, connection, index, settings, settings["built_factory"])
+            connection.commit()
+            self._write_index(collection, index)
+            return index.ntotal
+
+    def refresh(self):
+        # Readers reopen replaced index files on their own
+        with self._lock:
+            self._readers.clear()
+
+    def defer_writes(self, collection):
+        with self._lock:
+            self._deferred[collection] = self._deferred.get(collection, 0) + 1
+
+    def flush(self, collection):
+        with self._write_lock(collection):
+            with self._lock:
+                remaining = self._deferred.get(collection, 0) - 1
+                if remaining > 0:
+                    self._deferred[collection] = remaining
+                    return False
+                self._deferred.pop(collection, None)
+            try:
+                writer = self._writers.get(collection)
+                if not writer or not writer["pending"]:
+                    return False
+                with self._connect(collection) as connection:
+                    settings = self._get_settings(connection)
+                self._write_index(collection, self._writable_index(collection, settings))
+                return True
+            finally:
+                self._writers.pop(collection, None)
+
+    def _path(self, collection: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{collection}{suffix}")
+
+    @contextmanager
+    def _write_lock(self, collection: str):
+        """Serialize writers across threads and processes"""
+        with self._lock:
+            collection_lock = self._collection_locks.setdefault(collection, _original_threading.Lock())
+        with collection_lock, open(self._path(collection, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _connect(self, collection: str):
+        connection = sqlite3.connect(self._path(collection, ".sqlite3"), timeout=30)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "faiss_id INTEGER PRIMARY KEY, "
+                "id TEXT UNIQUE NOT NULL, "
+                "metadata TEXT NOT NULL, "
+                "document TEXT, "
+                "deleted INTEGER NOT NULL DEFAULT 0)"
+            )
+            connection.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            yield connection
+        finally:
+            connection.close()
+
+    def _get_settings(self, connection) -> Dict[str, str]:
+        return dict(connection.execute("SELECT key, value FROM settings").fetchall())
+
+    def _set_setting(self, connection, key: str, value):
+        connection.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _create_settings(self, connection, space: str, dimension: int) -> Dict[str, str]:
+        probe = self._new_index(dimension, space, self.factory)
+        quantized = "SQ" in self.factory or "PQ" in self.factory
+        settings = {
+            "space": space,
+            "dimension": str(dimension),
+            "factory": self.factory,
+            "built_factory": self.factory if probe.is_trained else "Flat",
+            "float_vectors": "1" if quantized and Config.FAISS_RERANK_FACTOR else "0",
+            "next_id": "1"
+        }
+        for key, value in settings.items():
+            self._set_setting(connection, key, value)
+        return settings
+
+    def _new_index(self, dimension: int, space: str, factory: str):
+        metric = self.faiss.METRIC_INNER_PRODUCT if space == "cosine" else self.faiss.METRIC_L2
+        return self.faiss.index_factory(dimension, f"IDMap2,{factory}", metric)
+
+    def _as_matrix(self, embeddings, settings) -> np.ndarray:
+        vectors = np.ascontiguousarray(np.asarray(embeddings, dtype="float32"))
+        if settings["space"] == "cosine":
+            self.faiss.normalize_L2(vectors)
+        return vectors
+
+    def _load_index(self, collection: str, settings):
+        """Load the full index for modification"""
+        path = self._path(collection, ".index")
+        if not os.path.exists(path):
+            return self._new_index(int(settings["dimension"]), settings["space"], settings["built_factory"])
+        return self.faiss.read_index(path)
+
+    def _writable_index(self, collection: str, settings):
+        """The index to modify: the one kept in memory, unless another process replaced the file since"""
+        writer = self._writers.get(collection)
+        version = self._index_version(collection)
+        if writer and writer["version"] == version:
+            return writer["index"]
+
+        index = self._load_index(collection, settings)
+        pending = writer["pending"] if writer else []
+        for faiss_ids, vectors in pending:
+            if vectors is None:
+                index.remove_ids(faiss_ids)
+            else:
+                index.add_with_ids(vectors, faiss_ids)
+        if self._deferred.get(collection):
+            self._writers[collection] = {"index": index, "version": version, "pending": pending}
+        return index
+
+    def _record(self, collection: str, faiss_ids, vectors: np.ndarray = None):
+        """Remember an added (or, without vectors, removed) batch until the index is written"""
+        writer = self._writers.get(collection)
+        if writer:
+            writer["pending"].append((np.asarray(faiss_ids, dtype="int64"), vectors))
+
+    def _store_index(self, collection: str, index):
+        """Write a modified index, or keep it in memory while writes are deferred"""
+        writer = self._writers.get(collection)
+        if writer:
+            writer["index"] = index
+        else:
+            self._write_index(collection, index)
+
+    def _write_index(self, collection: str, index):
+        path = self._path(collection, ".index")
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        self.faiss.write_index(index, temp_path)
+        os.replace(temp_path, path)
+        if self._deferred.get(collection):
+            self._writers[collection] = {"index": index, "version": self._index_version(collection), "pending": []}
+
+    def _index_version(self, collection: str):
+        """Identifies the current index file; changes whenever a writer replaces it"""
+        try:
+            stat = os.stat(self._path(collection, ".index"))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _get_reader(self, collection: str):
+        """Get the index for queries, reopening it when another writer replaced the file"""
+        path = self._path(collection, ".index")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            cached = self._readers.get(collection)
+            if cached and cached[0] == mtime:
+                self._readers.move_to_end(collection)
+                return cached[1]
+
+        index = None
+        if Config.FAISS_USE_MMAP:
+            try:
+                index = self.faiss.read_index(path, self.faiss.IO_FLAG_MMAP | self.faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError as e:
+                self.logger.debug(f"Index {collection} can't be memory-mapped, loading it: {str(e)}")
+        if index is None:
+            index = self.faiss.read_index(path)
+        self._set_search_parameters(index)
+
+        with self._lock:
+            self._readers[collection] = (mtime, index)
+            self._readers.move_to_end(collection)
+            while len(self._readers) > self.READER_CACHE_SIZE:
+                self._readers.popitem(last=False)
+        return index
+
+    def _write_vectors(self, collection: str, first_id: int, vectors: np.ndarray):
+        """Store float32 vectors at the rows of their FAISS ids"""
+        path = self._path(collection, ".vectors")
+        with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+            f.seek((first_id - 1) * vectors.shape[1] * 4)
+            f.write(vectors.tobytes())
+
+    def _read_vectors(self, collection: str, settings, faiss_ids) -> np.ndarray:
+        vectors = np.memmap(self._path(collection, ".vectors"), dtype="float32", mode="r")
+        vectors = vectors.reshape(-1, int(settings["dimension"]))
+        return np.asarray(vectors[np.asarray(faiss_ids, dtype="int64") - 1])
+
+    def _rerank(self, collection: str, settings, query: np.ndarray, labels: np.ndarray):
+        """Order candidates by their exact distance to the query"""
+        candidates = labels[labels >= 0]
+        if not len(candidates):
+            return candidates, np.empty(0, dtype="float32")
+        exact = self._read_vectors(collection, settings, candidates)
+        if settings["space"] == "cosine":
+            scores = exact @ query
+            order = np.argsort(-scores)
+        else:
+            scores = ((exact - query) ** 2).sum(axis=1)
+            order = np.argsort(scores)
+        return candidates[order], scores[order]
+
+    def _set_search_parameters(self, index):
+        parameters = self.faiss.ParameterSpace()
+        for name, value in (("efSearch", Config.FAISS_EF_SEARCH), ("nprobe", Config.FAISS_NPROBE)):
+            try:
+                parameters.set_index_parameter(index, name, value)
+            except RuntimeError:
+                pass  # Not applicable to this index type
+
+    def _find(self, connection, ids: List[str] = None, where: Dict = None) -> List[int]:
+        """FAISS ids of live entries matching string ids or metadata equality"""
+        if ids is not None:
+            faiss_ids = []
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                faiss_ids.extend(row[0] for row in connection.execute(
+                    f"SELECT faiss_id FROM entries WHERE deleted = 0 AND id IN ({','.join('?' * len(batch))})",
+                    batch
+                ))
+            return faiss_ids
+
+        conditions = " AND ".join(f"json_extract(metadata, '$.{key}') = ?" for key in where)
+        return [row[0] for row in connection.execute(
+            f"SELECT faiss_id FROM entries WHERE deleted = 0 AND {conditions}",
+            list(where.values())
+        )]
+
+    def _remove(self, connection, index, faiss_ids: List[int]) -> bool:
+        """Remove entries; returns False if their vectors stay in the index as tombstones"""
+        connection.executemany("DELETE FROM entries WHERE faiss_id = ?", [(faiss_id,) for faiss_id in faiss_ids])
+        try:
+            index.remove_ids(np.asarray(faiss_ids, dtype="int64"))
+        except RuntimeError:
+            # HNSW doesn't support removal; without a row the vector is skipped in results
+            return False
+        return True
+
+    def _resolve(self, connection, labels, distances, settings, where: Dict = None) -> List[Dict]:
+        """Turn FAISS results into hits, dropping tombstones and filtered entries"""
+        found = [(int(label), float(distance)) for label, distance in zip(labels, distances) if label >= 0]
+        if not found:
+            return []
+        rows = {
+            row[0]: row[1:] for row in connection.execute(
+                f"SELECT faiss_id, id, metadata, document FROM entries "
+                f"WHERE deleted = 0 AND faiss_id IN ({','.join('?' * len(found))})",
+                [label for label, _ in found]
+            )
+        }
+
+        hits = []
+        for label, distance in found:
+            if label not in rows:
+                continue
+            id, metadata, document = rows[label]
+            metadata = json.loads(metadata)
+            if where and any(metadata.get(key) != value for key, value in where.items()):
+                continue
+            if settings["space"] == "cosine":
+                distance = 1.0 - distance  # Inner product of normalized vectors
+            hits.append({"id": id, "distance": distance, "metadata": metadata, "document": document})
+        return hits
+
+    def _rebuild(self, collection: str, connection, index, settings, factory: str):
+        """Build a fresh index of ``factory`` type from the live vectors of ``index``"""
+        live_ids = np.asarray(
+            [row[0] for row in connection.execute("SELECT faiss_id FROM entries WHERE deleted = 0 ORDER BY faiss_id")],
+            dtype="int64"
+        )
+        if settings["float_vectors"] == "1":
+            # Exact vectors rather than lossy reconstructions
+            get_vectors = lambda ids: self._read_vectors(collection, settings, ids)
+        else:
+            ivf = self.faiss.try_extract_index_ivf(index.index)
+            if ivf is not None:
+                ivf.make_direct_map()
+            get_vectors = index.reconstruct_batch
+
+        new_index = self._new_index(int(settings["dimension"]), settings["space"], factory)
+        if not new_index.is_trained and len(live_ids) < Config.FAISS_TRAIN_MIN_VECTORS:
+            # Too few vectors left to train on
+            factory = "Flat"
+            new_index = self._new_index(int(settings["dimension"]), settings["space"], factory)
+        if not new_index.is_trained:
+            sample_size = min(len(live_ids), Config.FAISS_TRAIN_MIN_VECTORS * 4)
+            sample = np.random.default_rng(0).choice(live_ids, size=sample_size, replace=False)
+            new_index.train(get_vectors(np.sort(sample)))
+
+        for start in range(0, len(live_ids), self.REBUILD_BATCH_SIZE):
+            batch = live_ids[start:start + self.REBUILD_BATCH_SIZE]
+            new_index.add_with_ids(get_vectors(batch), batch)
+
+        connection.execute("DELETE FROM entries WHERE deleted = 1")
+        self._set_setting(connection, "built_factory", factory)
+        settings["built_factory"] = factory
+        self.logger.info(f"Rebuilt FAISS index as {factory} with {new_index.ntotal} vectors")
+        return new_index
+
+
+VECTOR_BACKENDS = {
+    "chroma": ChromaBackend,
+    "faiss": FaissBackend,
+}
+
+
+def create_backend(name: str = None, persist_directory: str = None) -> VectorBackend:
+    """Create the configured vector backend"""
+    name = name or Config.VECTOR_BACKEND
+    if name not in VECTOR_BACKENDS:
+        raise ValueError(f"Unknown vector backend: {name}")
+    return VECTOR_BACKENDS[name](persist_directory or Config.VECTOR_DB_PATH)
+
+
+class VectorStore:
+    # Collection versions written by this process, keyed by user_id
+    _local_versions = {}
+    # Collection versions the backend view of this process includes, keyed by user_id
+    _seen_versions = {}
+    # Users with deferred_writes in progress, and how many
+    _deferring_users = {}
+    # Arbitrary application-wide namespace of the per-user collection locks
+    COLLECTION_LOCK_NAMESPACE = 7316
+
+    def __init__(self, backend: VectorBackend = None):
+        """Initialize vector store with the configured backend"""
         self.persist_directory = "./vector_db"
-        self.client = chromadb.PersistentClient(path=self.persist_directory)
+        self.backend = backend or create_backend(persist_directory=self.persist_directory)
         self.logger = logging.getLogger(__name__)
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+        self.embeddings = CachedEmbeddings(
+            EmbeddingScheduler(model=Config.EMBEDDING_MODEL),
+            model=embedding_id(Config.EMBEDDING_MODEL)
+        )
 
+    @staticmethod
+    def collection_name(user_id) -> str:
+        return f"user_{user_id}_docs{collection_suffix()}"
 
     def add_document_chunks(self, chunks, metadata_list, user_id):
         """Add document chunks to vector store"""
         try:
-            # Get or create collection for user
-            collection_name = f"user_{user_id}_docs"
-            collection = self.client.get_or_create_collection(
-                name=collection_name,
-                metadata={"user_id": user_id}
-            )
-
-            # Generate embeddings and add to collection
+            # Generate embeddings and add to the user's collection
             texts = [chunk.chunk_text for chunk in chunks]
             embeddings = self.embeddings.embed_documents(texts)
 
-            # Add to ChromaDB
-            collection.add(
+            # Until the chunk rows commit, keep the garbage collector away
+            self.lock_collection(user_id)
+
+            # Index updates are C-level work that doesn't yield to eventlet
+            offload(
+                self.backend.add,
+                self.collection_name(user_id),
+                ids=[f"chunk_{chunk.id}" for chunk in chunks],
                 embeddings=embeddings,
-                documents=texts,
                 metadatas=metadata_list,
-                ids=[f"chunk_{chunk.id}" for chunk in chunks]
+                documents=texts
             )
 
+            self.bump_collection_version(user_id)
             return True
 
         except Exception as e:
             self.logger.error(f"Error adding chunks to vector store: {str(e)}")
             return False
 
-    def similarity_search(self, query, user_id, limit=5):
-        """Search for similar documents"""
+    def similarity_search(self, query, user_id, limit=5) -> List[LangchainDocument]:
+        """Search for similar chunks, best first"""
         try:
-            # Get user's collection
-            collection_name = f"user_{user_id}_docs"
-            collection = self.client.get_collection(collection_name)
-
             # Get query embedding
             query_embedding = self.embeddings.embed_query(query)
 
-            # Search
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=limit
-            )
-
-            return results
+            hits = offload(self.backend.query, self.collection_name(user_id), query_embedding, limit)
+            return [
+                LangchainDocument(page_content=hit["document"] or "", metadata=hit["metadata"])
+                for hit in hits
+            ]
 
         except Exception as e:
             self.logger.error(f"Error in similarity search: {str(e)}")
-            return None
+            return []
 
     def delete_document(self, document_id, user_id):
         """Delete document chunks from store"""
         try:
-            collection_name = f"user_{user_id}_docs"
-            collection = self.client.get_collection(collection_name)
-
             # Delete chunks by document_id in metadata
-            collection.delete(
+            offload(
+                self.backend.delete,
+                self.collection_name(user_id),
                 where={"document_id": document_id}
             )
 
+            self.bump_collection_version(user_id)
             return True
 
         except Exception as e:
             self.logger.error(f"Error deleting document: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+    @contextmanager
+    def deferred_writes(self, user_id):
+        """Group the index writes made inside, e.g. all batches of one document.
+
+        Backends that rewrite whole index files (FAISS) then write once at the
+        end instead of once per batch. The collection version is bumped again
+        once they are written, since answers cached meanwhile didn't see them.
+        Cached answers are dropped once at the end rather than after every batch.
+        """
+        collection = self.collection_name(user_id)
+        self.backend.defer_writes(collection)
+        VectorStore._deferring_users[user_id] = VectorStore._deferring_users.get(user_id, 0) + 1
+        try:
+            yield
+        finally:
+            try:
+                if offload(self.backend.flush, collection):
+                    self.bump_collection_version(user_id)
+                    db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                self.logger.error(f"Error writing vector index of user {user_id}: {str(e)}")
+            finally:
+                VectorStore._deferring_users[user_id] -= 1
+                if not VectorStore._deferring_users[user_id]:
+                    del VectorStore._deferring_users[user_id]
+            self.invalidate_answers(user_id)
+
+    def update_chunk_metadata(self, metadata_list, user_id):
+        """Update metadata (e.g. positions) of chunks whose vectors are unchanged"""
+        try:
+            offload(
+                self.backend.update_metadata,
+                self.collection_name(user_id),
+                ids=[f"chunk_{metadata['chunk_id']}" for metadata in metadata_list],
+                metadatas=metadata_list
+            )
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Error updating chunk metadata: {str(e)}")
+            return False
+
+    def delete_chunks(self, chunk_ids, user_id):
+        """Delete individual chunks from store"""
+        try:
+            offload(
+                self.backend.delete,
+                self.collection_name(user_id),
+                ids=[f"chunk_{chunk_id}" for chunk_id in chunk_ids]
+            )
+
+            self.bump_collection_version(user_id)
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Error deleting chunks: {str(e)}")
+            return False
+
+    def get_collection_version(self, user_id) -> int:
+        """Get the current version of a user's collection"""
+        state = CollectionState.query.get(user_id)
+        return state.version if state else 0
+
+    def bump_collection_version(self, user_id) -> int:
+        """Record a change to a user's collection.
+
+        The new version is flushed in the caller's transaction, so it becomes
+        visible to other processes together with the change itself.
+        """
+        # Taken before the row lock, in the same order as the garbage collector
+        self.lock_collection(user_id)
+        state = CollectionState.query.filter_by(user_id=user_id).with_for_update().first()
+        if not state:
+            state = CollectionState(user_id=user_id, version=0)
+            db.session.add(state)
+        state.version += 1
+        db.session.flush()
+        VectorStore._local_versions[user_id] = state.version
+
+        # Answers produced against the old collection are no longer valid
+        if not VectorStore._deferring_users.get(user_id):
+            self.invalidate_answers(user_id)
+        return state.version
+
+    def invalidate_answers(self, user_id):
+        """Drop the user's cached answers, if the answer cache is in use"""
+        if Config.ANSWER_CACHE_ENABLED:
+            AnswerCache.invalidate(self.backend, user_id)
+
+    def lock_collection(self, user_id, exclusive: bool = False):
+        """Lock a user's collection until the current transaction ends.
+
+        Writers take the lock shared before adding vectors whose chunk rows
+        are not committed yet. The vector garbage collector takes it
+        exclusively, so it never sees those vectors as orphans. Only
+        PostgreSQL has advisory locks; elsewhere this does nothing.
+        """
+        if db.engine.dialect.name != "postgresql":
+            return
+        function = "pg_advisory_xact_lock" if exclusive else "pg_advisory_xact_lock_shared"
+        db.session.execute(
+            text(f"SELECT {function}(:namespace, :user_id)"),
+            {"namespace": self.COLLECTION_LOCK_NAMESPACE, "user_id": user_id}
+        )
+
+    def is_local_version(self, user_id, version) -> bool:
+        """Check whether the given collection version was written by this process"""
+        return VectorStore._local_versions.get(user_id) == version
+
+    def refresh(self):
+        """Make writes made by other processes visible to this one"""
+        # Waits for backend calls in flight in other threads
+        offload(self.backend.refresh)
+
+    def ensure_current(self, user_id, version):
+        """Refresh the backend unless this process already sees ``version`` of the user's collection.
+
+        Refreshing is process-wide, so the versions of all collections are
+        recorded just before it; users whose collection hasn't changed since
+        then need no refresh of their own, whether or not they have been seen.
+        """
+        if version == VectorStore._seen_versions.get(user_id, 0) or self.is_local_version(user_id, version):
+            return
+        versions = dict(db.session.query(CollectionState.user_id, CollectionState.version).all())
+        self.refresh()
+        VectorStore._seen_versions = versions
+        self.logger.info(f"Refreshed vector backend for collection version {version} of user {user_id}")